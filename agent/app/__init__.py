@@ -2,4 +2,9 @@
 Text Summarization Agent - FastAPI service for text summarization using Llama model
 """
 
-__version__ = "1.0.0" 
\ No newline at end of file
+__version__ = "1.0.0"
+
+from dotenv import load_dotenv
+
+# Read .env once, before any module looks at the environment
+load_dotenv()
@@ -0,0 +1,245 @@
+"""
+Pool of Ollama backends with least-loaded routing and health checks.
+
+Requests go to the healthy backend that has the model loaded and the lowest
+``(outstanding + 1) * latency`` score, where latency is a moving average of
+that backend's observed response times. Each backend has a circuit breaker:
+after repeated failures it is taken out of rotation, and once the breaker's
+open period has passed a single trial request or health probe decides
+whether it comes back. When every backend's circuit is open, requests fail
+fast instead of waiting on a dead server.
+"""
+
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from .utils.http import http_clients
+from .resilience import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_model_name(name: str) -> str:
+    """
+    Normalize a model name so that tag variants compare equal.
+
+    Ollama treats an untagged name as ``:latest``, so ``llama3`` and
+    ``llama3:latest`` refer to the same model while ``llama3:8b`` does not.
+    """
+    name = name.strip()
+    if ":" not in name.rsplit("/", 1)[-1]:
+        name = f"{name}:latest"
+    return name
+
+
+class ModelNotFoundError(Exception):
+    """
+    Raised when the requested model is not available on any Ollama backend.
+    """
+
+
+class Backend:
+    def __init__(self, url: str, failure_threshold: int = 3, ejection_time: float = 30.0):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.latency: Optional[float] = None
+        self.breaker = CircuitBreaker(failure_threshold, ejection_time)
+        # None until the first successful probe; then the models it has loaded
+        self.models: Optional[Set[str]] = None
+        self.requests = 0
+        self.failures = 0
+        self.last_probe = 0.0
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or normalize_model_name(model) in self.models
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state == CircuitBreaker.CLOSED
+
+    def available(self) -> bool:
+        return self.breaker.can_attempt()
+
+    def score(self, default_latency: float) -> float:
+        return (self.outstanding + 1) * (self.latency or default_latency)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "circuit": self.breaker.state,
+            "outstanding": self.outstanding,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "open_for": round(self.breaker.open_for(), 1),
+            "models": sorted(self.models) if self.models is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class BackendPool:
+    def __init__(
+        self,
+        urls: List[str],
+        probe_interval: float = 10.0,
+        failure_threshold: int = 3,
+        ejection_time: float = 30.0,
+        probe_timeout: float = 5.0
+    ):
+        if not urls:
+            raise ValueError("At least one Ollama backend URL is required")
+        self.backends = [Backend(url, failure_threshold, ejection_time) for url in urls]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "BackendPool":
+        urls = os.getenv("OLLAMA_API_URLS") or os.getenv("OLLAMA_API_URL", "http://localhost:11434")
+        return cls(
+            urls=[url.strip() for url in urls.split(",") if url.strip()],
+            probe_interval=float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10")),
+            failure_threshold=int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3")),
+            ejection_time=float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+        )
+
+    def _default_latency(self) -> float:
+        observed = [b.latency for b in self.backends if b.latency is not None]
+        return sum(observed) / len(observed) if observed else 1.0
+
+    def choose(self, model: str, exclude: Optional[Set[str]] = None) -> Backend:
+        """
+        Pick the least-loaded healthy backend that serves the model.
+
+        Backends in ``exclude`` are only reused when nothing else is available.
+        Raises CircuitOpenError if every serving backend's circuit is open.
+        """
+        exclude = exclude or set()
+        serving = [b for b in self.backends if b.serves(model)]
+        if not serving:
+            raise ModelNotFoundError(f"No backend has model {model} loaded")
+
+        available = [b for b in serving if b.available()]
+        if not available:
+            retry_after = min(b.breaker.open_for() for b in serving)
+            raise CircuitOpenError(
+                f"All Ollama backends serving {model} are unavailable",
+                retry_after=max(1, math.ceil(retry_after))
+            )
+        candidates = [b for b in available if b.url not in exclude] or available
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        else:
+            default_latency = self._default_latency()
+            best = min(b.score(default_latency) for b in candidates)
+            # Spread ties randomly so idle backends share the load
+            chosen = random.choice([b for b in candidates if b.score(default_latency) <= best])
+        chosen.breaker.on_attempt()
+        return chosen
+
+    @asynccontextmanager
+    async def track(self, backend: Backend) -> AsyncIterator[Backend]:
+        """
+        Count a request as outstanding on the backend and record its outcome.
+        """
+        backend.outstanding += 1
+        backend.requests += 1
+        started = time.monotonic()
+        try:
+            yield backend
+        except (asyncio.CancelledError, ModelNotFoundError):
+            # Neither says anything about the backend's health
+            backend.breaker.release_trial()
+            raise
+        except Exception:
+            self.record_failure(backend)
+            raise
+        else:
+            self.record_success(backend, time.monotonic() - started, readmit=True)
+        finally:
+            backend.outstanding -= 1
+
+    def record_success(self, backend: Backend, latency: Optional[float] = None, readmit: bool = False) -> None:
+        """
+        Record a successful call or probe.
+
+        A probe only closes an open circuit once its open period has passed,
+        to avoid flapping; a served request closes it immediately.
+        """
+        if latency is not None:
+            backend.latency = latency if backend.latency is None else 0.7 * backend.latency + 0.3 * latency
+        if not readmit and backend.breaker.state == CircuitBreaker.OPEN:
+            return
+        if backend.breaker.record_success():
+            logger.info(f"Re-admitting Ollama backend {backend.url}")
+
+    def record_failure(self, backend: Backend) -> None:
+        backend.failures += 1
+        if backend.breaker.record_failure():
+            logger.warning(
+                f"Ejecting Ollama backend {backend.url} after {backend.breaker.consecutive_failures} consecutive failures"
+            )
+
+    def mark_model_missing(self, backend: Backend, model: str) -> None:
+        if backend.models is not None:
+            backend.models.discard(normalize_model_name(model))
+
+    async def probe(self, backend: Backend) -> Optional[Dict[str, Any]]:
+        """
+        Fetch api/tags from one backend, updating its health and model list.
+        """
+        client = http_clients.get("ollama")
+        backend.last_probe = time.monotonic()
+        try:
+            response = await client.get(f"{backend.url}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            logger.warning(f"Health probe failed for Ollama backend {backend.url}: {str(e)}")
+            self.record_failure(backend)
+            return None
+        models = set()
+        for entry in data.get("models", []):
+            for key in ("name", "model"):
+                if entry.get(key):
+                    models.add(normalize_model_name(entry[key]))
+        backend.models = models
+        self.record_success(backend)
+        return data
+
+    async def fetch_tags(self) -> Dict[str, Any]:
+        """
+        Probe every backend and return the union of their models in api/tags shape.
+        """
+        results = await asyncio.gather(*(self.probe(b) for b in self.backends))
+        if all(result is None for result in results):
+            raise Exception("No Ollama backend answered api/tags")
+        names = set()
+        for backend in self.backends:
+            names.update(backend.models or ())
+        return {"models": [{"name": name} for name in sorted(names)]}
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            await asyncio.gather(*(self.probe(b) for b in self.backends), return_exceptions=True)
+
+    def start(self) -> None:
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [b.stats() for b in self.backends]
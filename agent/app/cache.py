@@ -0,0 +1,355 @@
+"""
+Two-tier response cache for LLM generations.
+
+Entries are content-addressed by model, prompt and the merged generation
+parameters. A bounded in-memory LRU serves hot entries; a SQLite file keeps
+them across restarts and machine stops.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, prompt: str, params: Dict[str, Any]) -> str:
+    """
+    Build a stable key from the model, the prompt and the generation params.
+    """
+    material = json.dumps(
+        {"model": model, "prompt": prompt, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_entries: int = 512,
+        max_memory_bytes: int = 8 * 1024 * 1024,
+        max_disk_bytes: int = 64 * 1024 * 1024,
+        default_ttl: float = 3600.0,
+        ttls: Optional[Dict[str, float]] = None
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+
+        # key -> (value, expires_at, size)
+        self._memory: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._db_failed = False
+        # Running totals of the disk tier, kept up to date by our own writes
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        self._counted_at = 0.0
+        self.recount_interval = 300.0
+        # Disk hits whose last_access is not written yet: key -> access time
+        self._pending_access: Dict[str, float] = {}
+        self._access_flushed = time.monotonic()
+        self.access_batch = 64
+        self.access_flush_interval = 30.0
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """
+        Build a cache from RESPONSE_CACHE_* environment variables.
+        """
+        ttls = {}
+        for endpoint in ("generate", "summarize", "answer", "ask"):
+            value = os.getenv(f"RESPONSE_CACHE_TTL_{endpoint.upper()}")
+            if value:
+                ttls[endpoint] = float(value)
+        return cls(
+            db_path=os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite3") or None,
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")),
+            max_memory_bytes=int(os.getenv("RESPONSE_CACHE_MAX_MEMORY_BYTES", str(8 * 1024 * 1024))),
+            max_disk_bytes=int(os.getenv("RESPONSE_CACHE_MAX_DISK_BYTES", str(64 * 1024 * 1024))),
+            default_ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            ttls=ttls
+        )
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    # Memory tier
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, expires_at, size = entry
+        if expires_at <= time.time():
+            self._memory_pop(key)
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_pop(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def _memory_set(self, key: str, value: str, expires_at: float) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+        self._memory_pop(key)
+        self._memory[key] = (value, expires_at, size)
+        self._memory_bytes += size
+        while self._memory and (
+            len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes
+        ):
+            oldest = next(iter(self._memory))
+            self._memory_pop(oldest)
+            self.counters["evictions"] += 1
+
+    # Disk tier
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None or self._db_failed or not self.db_path:
+            return self._db
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " endpoint TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            db.commit()
+            self._recount(db)
+            self._db = db
+            logger.info(f"Opened response cache at {self.db_path}")
+        except Exception as e:
+            # Fall back to memory only rather than failing requests
+            self._db_failed = True
+            logger.warning(f"Disabling on-disk response cache ({self.db_path}): {str(e)}")
+        return self._db
+
+    def _recount(self, db: sqlite3.Connection) -> None:
+        self._disk_entries, self._disk_bytes = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        self._counted_at = time.monotonic()
+
+    def _delete(self, db: sqlite3.Connection, where: str, params: tuple) -> int:
+        """
+        Delete the matching rows and take them off the running totals.
+        """
+        count, size = db.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE {where}", params
+        ).fetchone()
+        if count:
+            db.execute(f"DELETE FROM responses WHERE {where}", params)
+            self._disk_entries -= count
+            self._disk_bytes -= size
+        return count
+
+    def _flush_access(self, db: sqlite3.Connection) -> None:
+        """
+        Write the batched last_access times of disk hits.
+        """
+        if self._pending_access:
+            db.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._access_flushed = time.monotonic()
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return None
+            now = time.time()
+            row = db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._delete(db, "key = ?", (key,))
+                db.commit()
+                return None
+            # Only eviction order depends on last_access, so it is written in batches
+            self._pending_access[key] = now
+            if (
+                len(self._pending_access) >= self.access_batch
+                or time.monotonic() - self._access_flushed >= self.access_flush_interval
+            ):
+                self._flush_access(db)
+                db.commit()
+            return row[0], row[1]
+
+    def _disk_set(self, key: str, endpoint: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return
+            now = time.time()
+            size = len(value.encode("utf-8"))
+            self._flush_access(db)
+            self._delete(db, "key = ?", (key,))
+            db.execute(
+                "INSERT INTO responses (key, endpoint, value, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, value, size, expires_at, now)
+            )
+            self._disk_entries += 1
+            self._disk_bytes += size
+            # Other worker processes write to the same file, so recount now and then
+            if self._disk_bytes > self.max_disk_bytes or time.monotonic() - self._counted_at >= self.recount_interval:
+                self._recount(db)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._delete(db, "expires_at <= ?", (now,))
+            if self._disk_bytes > self.max_disk_bytes:
+                # Evict least recently used rows until we are under budget
+                evict = []
+                total = self._disk_bytes
+                for row_key, row_size in db.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+                    if total <= self.max_disk_bytes:
+                        break
+                    evict.append((row_key,))
+                    total -= row_size
+                db.executemany("DELETE FROM responses WHERE key = ?", evict)
+                self._disk_entries -= len(evict)
+                self._disk_bytes = total
+                self.counters["evictions"] += len(evict)
+            db.commit()
+
+    def _disk_stats(self) -> Dict[str, Any]:
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return {"enabled": False}
+            return {
+                "enabled": True,
+                "entries": self._disk_entries,
+                "bytes": self._disk_bytes,
+                "max_bytes": self.max_disk_bytes,
+            }
+
+    # Public API
+
+    async def get(self, key: str, endpoint: str = "generate", bypass: bool = False) -> Optional[str]:
+        """
+        Look up a cached response, promoting disk hits into memory.
+        """
+        if bypass:
+            self.counters["bypassed"] += 1
+            return None
+        if self.ttl_for(endpoint) <= 0:
+            return None
+
+        value = self._memory_get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+
+        try:
+            row = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            row = None
+        if row is not None:
+            value, expires_at = row
+            self._memory_set(key, value, expires_at)
+            self.counters["disk_hits"] += 1
+            return value
+
+        self.counters["misses"] += 1
+        return None
+
+    async def peek(self, key: str) -> Optional[str]:
+        """
+        Read an entry from disk without counting a miss, e.g. while another
+        worker process is generating it.
+        """
+        try:
+            row = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        value, expires_at = row
+        self._memory_set(key, value, expires_at)
+        self.counters["disk_hits"] += 1
+        return value
+
+    async def set(self, key: str, value: str, endpoint: str = "generate") -> None:
+        """
+        Store a response in both tiers using the endpoint's TTL.
+        """
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._memory_set(key, value, expires_at)
+        self.counters["stores"] += 1
+        try:
+            await asyncio.to_thread(self._disk_set, key, endpoint, value, expires_at)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    async def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            "memory": {
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_memory_bytes,
+            },
+            "disk": await asyncio.to_thread(self._disk_stats),
+        }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._flush_access(self._db)
+                self._db.commit()
+                self._db.close()
+                self._db = None
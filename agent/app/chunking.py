@@ -0,0 +1,101 @@
+"""
+Split long text into chunks that fit the model's context window.
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+
+# Word pieces, short digit groups and single symbols roughly track how
+# llama tokenizers split text: common words are one token, long words several
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+# Characters per token inside long words
+CHARS_PER_TOKEN = 5
+# Texts up to this size are memoized; larger ones are counted in slices
+_CACHE_MAX_CHARS = 16384
+
+
+@lru_cache(maxsize=4096)
+def _count_tokens(text: str) -> int:
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        tokens += (len(piece) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast token estimate used for sizing chunks and prompts.
+
+    Counts are memoized, so re-estimating the same prompt parts is cheap.
+    """
+    if not text:
+        return 0
+    if len(text) <= _CACHE_MAX_CHARS:
+        return max(1, _count_tokens(text))
+    # Cut on whitespace so no word is split across slices
+    total, start = 0, 0
+    while start < len(text):
+        end = start + _CACHE_MAX_CHARS
+        if end < len(text):
+            space = text.rfind(" ", start, end)
+            end = space + 1 if space > start else end
+        total += _count_tokens(text[start:end])
+        start = end
+    return max(1, total)
+
+
+def _split_sentences(paragraph: str) -> List[str]:
+    return [s for s in re.split(r'(?<=[.!?])\s+', paragraph.strip()) if s]
+
+
+def _split_words(sentence: str, max_tokens: int) -> List[str]:
+    pieces, current, current_tokens = [], [], 0
+    for word in sentence.split():
+        word_tokens = estimate_tokens(word)
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most ``max_tokens`` (estimated).
+
+    Paragraph boundaries are preferred, then sentence boundaries; a single
+    sentence longer than the budget is split on words.
+    """
+    units = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append((paragraph, "\n\n"))
+            continue
+        for sentence in _split_sentences(paragraph):
+            if estimate_tokens(sentence) <= max_tokens:
+                units.append((sentence, " "))
+            else:
+                units.extend((piece, " ") for piece in _split_words(sentence, max_tokens))
+
+    # Token counts are additive across units, so keep a running total
+    chunks, current, current_tokens = [], "", 0
+    for unit, separator in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = unit, unit_tokens
+        elif current:
+            current = f"{current}{separator}{unit}"
+            current_tokens += unit_tokens
+        else:
+            current, current_tokens = unit, unit_tokens
+    if current:
+        chunks.append(current)
+    return chunks
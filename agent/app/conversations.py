@@ -0,0 +1,154 @@
+"""
+Per-thread conversation memory for Slack.
+
+Stores the ``context`` token array Ollama returns after each turn, so a
+follow-up in the same thread sends only the new question and Ollama
+continues from the encoded history instead of re-reading the whole thread.
+Threads are evicted least-recently-used first, expire after a TTL, and the
+total number of stored tokens is capped. ``export`` and ``restore`` move a
+thread's state through the shared state, so a follow-up answered by another
+worker process continues the same conversation.
+"""
+
+import os
+import json
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Conversation:
+    def __init__(self, context: Optional[List[int]], last_exchange: Optional[Tuple[str, str]] = None):
+        # 4 bytes per token instead of a list of Python ints
+        self.context = array("i", context) if context else None
+        # Used when a turn was served from the response cache and has no context
+        self.last_exchange = last_exchange
+        self.turns = 1
+        self.updated_at = time.monotonic()
+
+    @property
+    def tokens(self) -> int:
+        return len(self.context) if self.context is not None else 0
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        max_threads: int = 500,
+        ttl: float = 3600.0,
+        max_total_tokens: int = 2_000_000,
+        max_context_tokens: int = 1536
+    ):
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.max_total_tokens = max_total_tokens
+        # Longer histories no longer fit the context window; the thread starts over
+        self.max_context_tokens = max_context_tokens
+        self._threads: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._total_tokens = 0
+        self.counters = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0, "reset": 0}
+
+    @classmethod
+    def from_env(cls) -> "ConversationStore":
+        max_ctx = int(os.getenv("LLM_MAX_CTX", "2048"))
+        return cls(
+            max_threads=int(os.getenv("SLACK_THREAD_MEMORY_MAX_THREADS", "500")),
+            ttl=float(os.getenv("SLACK_THREAD_MEMORY_TTL", "3600")),
+            max_total_tokens=int(os.getenv("SLACK_THREAD_MEMORY_MAX_TOKENS", "2000000")),
+            max_context_tokens=int(os.getenv("SLACK_THREAD_MAX_CONTEXT_TOKENS", str(max_ctx * 3 // 4)))
+        )
+
+    def _remove(self, key: str) -> Optional[Conversation]:
+        conversation = self._threads.pop(key, None)
+        if conversation is not None:
+            self._total_tokens -= conversation.tokens
+        return conversation
+
+    def get(self, key: str) -> Optional[Conversation]:
+        conversation = self._threads.get(key)
+        if conversation is None:
+            self.counters["misses"] += 1
+            return None
+        if time.monotonic() - conversation.updated_at > self.ttl:
+            self._remove(key)
+            self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+        self._threads.move_to_end(key)
+        self.counters["hits"] += 1
+        return conversation
+
+    def put(
+        self,
+        key: str,
+        context: Optional[List[int]],
+        last_exchange: Optional[Tuple[str, str]] = None
+    ) -> None:
+        """
+        Record the state after a turn, replacing the previous state of the thread.
+        """
+        previous = self._remove(key)
+        if context and len(context) > self.max_context_tokens:
+            self.counters["reset"] += 1
+            return
+        conversation = Conversation(context, last_exchange)
+        if previous is not None:
+            conversation.turns = previous.turns + 1
+        self._insert(key, conversation)
+
+    def export(self, key: str) -> Optional[str]:
+        """
+        The stored state of a thread as JSON, or None if it has none.
+        """
+        conversation = self._threads.get(key)
+        if conversation is None:
+            return None
+        return json.dumps({
+            "context": conversation.context.tolist() if conversation.context is not None else None,
+            "last_exchange": conversation.last_exchange,
+            "turns": conversation.turns,
+        })
+
+    def restore(self, key: str, value: Optional[str]) -> Optional[Conversation]:
+        """
+        Replace the state of a thread with an exported one (None forgets it) and return it.
+        """
+        self._remove(key)
+        if value is None:
+            self.counters["misses"] += 1
+            return None
+        data = json.loads(value)
+        last_exchange = data.get("last_exchange")
+        conversation = Conversation(data.get("context"), tuple(last_exchange) if last_exchange else None)
+        conversation.turns = data.get("turns", 1)
+        self._insert(key, conversation)
+        self.counters["hits"] += 1
+        return conversation
+
+    def _insert(self, key: str, conversation: Conversation) -> None:
+        self._threads[key] = conversation
+        self._total_tokens += conversation.tokens
+
+        now = time.monotonic()
+        while self._threads and (
+            len(self._threads) > self.max_threads or self._total_tokens > self.max_total_tokens
+        ):
+            oldest_key, oldest = next(iter(self._threads.items()))
+            self._remove(oldest_key)
+            self.counters["expired" if now - oldest.updated_at > self.ttl else "evicted"] += 1
+
+    def discard(self, key: str) -> None:
+        self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threads": len(self._threads),
+            "max_threads": self.max_threads,
+            "tokens": self._total_tokens,
+            "max_tokens": self.max_total_tokens,
+            **self.counters
+        }
@@ -1,24 +1,59 @@
-import httpx
-from ..utils.config import get_settings
+from typing import Any, Dict, List, Optional, Tuple
+from ..llama import llama
 
-async def process_with_llama(content: str) -> str:
+# Fields of a search result shown to the model
+CONTEXT_FIELDS = ("title", "description", "category", "location", "duration")
+
+
+def format_activities(activities: List[Dict[str, Any]]) -> str:
     """
-    Process the input content with Llama3 using Ollama.
+    Render search results as a numbered list for the prompt.
+    """
+    lines = []
+    for number, activity in enumerate(activities, 1):
+        details = ", ".join(
+            f"{field}: {activity[field]}" for field in CONTEXT_FIELDS[2:] if activity.get(field)
+        )
+        line = f"{number}. {activity.get('title') or 'Untitled'}"
+        if activity.get("description"):
+            line += f" - {activity['description']}"
+        if details:
+            line += f" ({details})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def build_prompt(content: str, activities: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the MCP prompt, with the retrieved activities as context.
+
+    Activities that do not fit the context window are trimmed, keeping the
+    parts most relevant to the message.
     """
-    settings = get_settings()
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{settings.ollama_api_url}/api/generate",
-                json={
-                    "model": "llama3",
-                    "prompt": content,
-                    "stream": False
-                }
+    def build(context: str) -> str:
+        if context:
+            return (
+                "You are an activity planning assistant. Use the activities below when they are relevant "
+                "and refer to them by name.\n\n"
+                f"Activities:\n{context}\n\n"
+                f"Message: {content}"
             )
-            response.raise_for_status()
-            return response.json().get("response", "")
-        except httpx.HTTPError as e:
-            print(f"Llama API error: {str(e)}")
-            return "Error processing with language model" 
\ No newline at end of file
+        return f"You are an activity planning assistant.\n\nMessage: {content}"
+
+    context = format_activities(activities) if activities else ""
+    return llama.budget.fit(build, context, llama.default_params["num_predict"], query=content)
+
+
+async def process_with_llama(
+    content: str,
+    activities: Optional[List[Dict[str, Any]]] = None,
+    priority: str = "ask"
+) -> str:
+    """
+    Process the input content with Llama3 using Ollama.
+
+    Goes through the shared LlamaAPI, so the request is scheduled, cached,
+    coalesced and routed across backends like every other generation.
+    """
+    prompt, params = build_prompt(content, activities)
+    return await llama.generate(prompt=prompt, cache_endpoint="generate", priority=priority, **params)
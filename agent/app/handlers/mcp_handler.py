@@ -1,29 +1,118 @@
 from fastapi import APIRouter, HTTPException, Depends
-from ..models import MCPMessage, MCPResponse
+from ..models import MCPMessage, MCPResponse, MCPBatchRequest
 from ..handlers.search import search_activities
 from ..handlers.llama import process_with_llama
-from typing import Optional
+from ..llama import llama
+from ..scheduler import LLMOverloadedError
+from ..utils.metrics import STAGE_LATENCY
+from typing import Any, Dict, List, Optional
+import os
+import asyncio
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Seconds the prompt waits for search results before going ahead without them
+SEARCH_TIMEOUT = float(os.getenv("MCP_SEARCH_TIMEOUT", "2.0"))
+# Search results injected into the prompt
+CONTEXT_RESULTS = int(os.getenv("MCP_CONTEXT_RESULTS", "5"))
+# Messages of one batch processed at once, unless the request asks for fewer
+BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+
+async def _search_for_context(content: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Search results for the prompt, or None if search is slow or failing.
+    """
+    try:
+        return await asyncio.wait_for(search_activities(content), timeout=SEARCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Search took longer than {SEARCH_TIMEOUT}s, answering without activities")
+    except Exception as e:
+        logger.warning(f"Search failed, answering without activities: {str(e)}")
+    return None
+
+async def run_pipeline(message: MCPMessage, priority: str = "ask") -> MCPResponse:
+    """
+    Answer one MCP message.
+
+    A request the scheduler would reject fails before any search is made.
+    The top search results then go into the prompt as context and are
+    returned as the message's activities. The prompt needs them, so the
+    search (bounded by ``MCP_SEARCH_TIMEOUT``) comes before the wait for a
+    scheduler slot; only the model check runs alongside it.
+    """
+    llama.scheduler.check_admission(priority)
+    search = asyncio.create_task(_search_for_context(message.content))
+    try:
+        with STAGE_LATENCY.time(stage="mcp_prepare"):
+            await llama.models.ensure_available(llama.model)
+            search_results = await search
+    finally:
+        search.cancel()
+
+    llama_response = await process_with_llama(
+        message.content, activities=(search_results or [])[:CONTEXT_RESULTS], priority=priority
+    )
+
+    return MCPResponse(
+        message_id=message.message_id,
+        response=llama_response,
+        status="success",
+        activities=search_results,
+        metadata={
+            "source": "activity-agent",
+            "processed_with": llama.model,
+            "context_activities": min(len(search_results or []), CONTEXT_RESULTS),
+            "search_available": search_results is not None
+        }
+    )
 
 @router.post("/process", response_model=MCPResponse)
 async def process_message(message: MCPMessage):
     try:
-        # Process message with Llama
-        llama_response = await process_with_llama(message.content)
-        
-        # Search for relevant activities
-        search_results = await search_activities(message.content)
-        
-        return MCPResponse(
-            message_id=message.message_id,
-            response=llama_response,
-            status="success",
-            activities=search_results,
-            metadata={
-                "source": "activity-agent",
-                "processed_with": "llama3"
-            }
-        )
+        return await run_pipeline(message)
+    except LLMOverloadedError as e:
+        raise e.http_exception()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/process/batch")
+async def process_batch(request: MCPBatchRequest):
+    """
+    Answer many MCP messages with bounded concurrency.
+
+    Results come back in request order. A message that fails gets a
+    response with ``status: "failed"`` and the error in its metadata instead
+    of failing the whole batch.
+    """
+    if not request.messages:
+        raise HTTPException(status_code=400, detail={"error": "No messages to process"})
+
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process_one(message: MCPMessage) -> MCPResponse:
+        try:
+            async with semaphore:
+                return await run_pipeline(message, priority="batch")
+        except Exception as e:
+            logger.error(f"Batch message {message.message_id} failed: {str(e)}")
+            error: Dict[str, Any] = {"error": str(e)}
+            if isinstance(e, LLMOverloadedError):
+                error["retry_after"] = e.retry_after
+            return MCPResponse(
+                message_id=message.message_id,
+                response="",
+                status="failed",
+                metadata={"source": "activity-agent", **error}
+            )
+
+    results = await asyncio.gather(*(process_one(message) for message in request.messages))
+    succeeded = sum(1 for result in results if result.status == "success")
+    return {
+        "results": results,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded
+    }
@@ -1,28 +1,51 @@
 import httpx
-from typing import List, Dict, Any
+import logging
+from typing import List, Dict, Any, Optional
 from ..utils.config import get_settings
+from ..utils.http import http_clients
+from ..utils.metrics import STAGE_LATENCY, UPSTREAM_REQUESTS
+from ..search_index import activity_index
 
-async def search_activities(query: str) -> List[Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+async def search_activities(
+    query: str,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 10
+) -> List[Dict[str, Any]]:
     """
-    Search for activities using the search API.
+    Search for activities.
+
+    Served from the in-process index once it has synced; until then the
+    remote search API is queried, and its errors (``httpx.HTTPError``) are
+    raised to the caller.
     """
+    with STAGE_LATENCY.time(stage="search_local"):
+        results = activity_index.search(query, limit=limit, filters=filters)
+    if results is not None:
+        return results
+
     settings = get_settings()
-    
-    async with httpx.AsyncClient() as client:
-        try:
+    client = http_clients.get("search")
+
+    try:
+        with STAGE_LATENCY.time(stage="search"):
             response = await client.get(
-                "https://api.search.service/v1/search",
+                f"{activity_index.base_url}/search",
                 params={
                     "q": query,
-                    "type": "activity"
+                    "type": "activity",
+                    **(filters or {})
                 },
                 headers={
                     "Authorization": f"Bearer {settings.search_api_key}"
                 }
             )
-            response.raise_for_status()
-            return response.json().get("results", [])
-        except httpx.HTTPError as e:
-            # Log the error and return empty results
-            print(f"Search API error: {str(e)}")
-            return [] 
\ No newline at end of file
+        response.raise_for_status()
+        UPSTREAM_REQUESTS.inc(upstream="search", outcome="success")
+        return response.json().get("results", [])[:limit]
+    except httpx.HTTPError as e:
+        UPSTREAM_REQUESTS.inc(upstream="search", outcome="error")
+        logger.error(f"Search API error: {str(e)}")
+        # Let callers tell an outage apart from a search with no matches
+        raise
@@ -13,7 +13,8 @@ async def test_llama_connection():
     """
     try:
         response = await llama.generate(
-            prompt="Say 'Hello! I am working!' if you can read this message."
+            prompt="Say 'Hello! I am working!' if you can read this message.",
+            bypass_cache=True
         )
         return {
             "status": "success",
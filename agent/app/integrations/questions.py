@@ -4,12 +4,38 @@ Question answering integration using Llama.
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse, PlainTextResponse
 from ..llama import llama
-from ..models import QuestionResponse
+from ..scheduler import LLMOverloadedError
+from ..models import QuestionResponse, QuestionRequest
+from ..utils.sse import token_events, sse_response
+from typing import Dict, Optional, Tuple
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+
+def build_prompt(question: str, context: Optional[str], format_: str) -> Tuple[str, Dict[str, int]]:
+    """
+    Build the prompt used by the /ask endpoints.
+
+    Context that does not fit the context window is reduced to the parts most
+    relevant to the question. Returns the prompt and its num_ctx/num_predict.
+    """
+    def build(content: str) -> str:
+        if content:
+            return (
+                f"Given this context: {content}\n\n"
+                f"Please answer this question: {question}\n\n"
+                f"If the context doesn't contain enough information, use your knowledge to provide a complete answer."
+            )
+        return (
+            f"Please answer this question: {question}\n\n"
+            f"Provide a {'detailed' if format_ == 'detailed' else 'concise'} answer."
+        )
+
+    return llama.budget.fit(build, context or "", llama.default_params["num_predict"], query=question)
+
+
 @router.post("/ask", response_model=QuestionResponse)
 async def handle_ask(request: Request):
     data = await request.json()
@@ -22,25 +48,18 @@ async def handle_ask(request: Request):
         question = data.get("question")
         context = data.get("context")
         format_ = data.get("format", "detailed")
+        bypass_cache = bool(data.get("bypass_cache", False))
 
         if not question:
             raise HTTPException(status_code=400, detail="Missing 'question' in request.")
 
         # Build prompt
-        if context:
-            prompt = (
-                f"Given this context: {context}\n\n"
-                f"Please answer this question: {question}\n\n"
-                f"If the context doesn't contain enough information, use your knowledge to provide a complete answer."
-            )
-        else:
-            prompt = (
-                f"Please answer this question: {question}\n\n"
-                f"Provide a {'detailed' if format_ == 'detailed' else 'concise'} answer."
-            )
+        prompt, params = build_prompt(question, context, format_)
 
         # Get response from Llama
-        response = await llama.generate(prompt=prompt)
+        response = await llama.generate(
+            prompt=prompt, cache_endpoint="ask", bypass_cache=bypass_cache, priority="ask", **params
+        )
 
         return {
             "status": "success",
@@ -50,6 +69,44 @@ async def handle_ask(request: Request):
                 "context_provided": context is not None
             }
         }
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise e.http_exception()
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.post("/ask/stream")
+async def handle_ask_stream(request: QuestionRequest):
+    """
+    Stream an answer as Server-Sent Events.
+
+    Tokens arrive as ``data: {"token": ...}`` frames; the final ``done`` event
+    carries the full answer and the same fields as ``/ask``.
+    """
+    if not request.question:
+        raise HTTPException(status_code=400, detail="Missing 'question' in request.")
+
+    # Reject before the stream starts if the question queue is full
+    try:
+        llama.scheduler.check_admission("ask")
+    except LLMOverloadedError as e:
+        raise e.http_exception()
+
+    prompt, params = build_prompt(request.question, request.context, request.format)
+
+    async def on_complete(answer: str):
+        return {
+            "status": "success",
+            "answer": answer,
+            "metadata": {
+                "format": request.format,
+                "context_provided": request.context is not None
+            }
+        }
+
+    tokens = llama.generate_stream(
+        prompt=prompt, cache_endpoint="ask", bypass_cache=request.bypass_cache, priority="ask", **params
+    )
+    return sse_response(token_events(tokens, on_complete))
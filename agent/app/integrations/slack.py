@@ -3,23 +3,56 @@ Slack integration for the summarization service.
 """
 
 import os
+import time
+import random
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-import httpx
-from dotenv import load_dotenv
-
-# Load environment variables from .env
-load_dotenv()
+from collections import deque
+from typing import Deque, Dict, Any, List, Optional, Tuple, Union
+from ..utils.http import http_clients
+from ..utils.logs import current_request_id, request_id_var
+from ..utils.shared_state import SharedState, SharedTokenBucket, shared_state
+from ..utils.metrics import (
+    STAGE_LATENCY,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_IN_FLIGHT,
+    SLACK_DELIVERIES,
+    SLACK_DELIVERY_LAG
+)
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)  # or DEBUG for local testing
+
+class SlackAPIError(Exception):
+    """
+    Slack answered with ``ok: false``; retrying the same call will not help.
+    """
+
+    def __init__(self, error: str):
+        super().__init__(f"Slack API error: {error}")
+        self.error = error
+
+
+class SlackRateLimitedError(Exception):
+    """
+    Slack answered 429; ``retry_after`` is the wait it asked for, in seconds.
+    """
+
+    def __init__(self, method: str, retry_after: float):
+        super().__init__(f"Slack rate limited {method}, retry after {retry_after}s")
+        self.retry_after = retry_after
+
 
 class SlackClient:
     def __init__(self):
         self.token = os.getenv("SLACK_BOT_TOKEN")
-        self.base_url = "https://slack.com/api"
+        self.base_url = os.getenv("SLACK_API_URL", "https://slack.com/api")
         if not self.token:
-            raise ValueError("SLACK_BOT_TOKEN environment variable is required")
+            # Checked again on each call, so the rest of the app still starts
+            logger.warning("SLACK_BOT_TOKEN is not set; Slack calls will fail")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.token)
 
     async def post_message(
         self, channel: str, text: str, thread_ts: Optional[str] = None
@@ -40,25 +73,57 @@ class SlackClient:
         if thread_ts:
             payload["thread_ts"] = thread_ts
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/chat.postMessage",
-                headers={
-                    "Authorization": f"Bearer {self.token}",
-                    "Content-Type": "application/json"
-                },
-                json=payload,
-                timeout=10
-            )
+        data = await self._call("chat.postMessage", payload)
+        logger.info(f"Message posted to Slack channel: {channel}")
+        return data
+
+    async def update_message(self, channel: str, ts: str, text: str) -> Dict[str, Any]:
+        """
+        Replace the text of a previously posted message.
+
+        :param channel: Slack channel ID the message was posted to
+        :param ts: Timestamp of the message to update
+        :param text: New message text
+        :return: Slack API JSON response
+        """
+        return await self._call("chat.update", {"channel": channel, "ts": ts, "text": text})
+
+    async def _call(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call a Slack Web API method and raise on an error response.
+        """
+        if not self.token:
+            raise ValueError("SLACK_BOT_TOKEN environment variable is required")
+        client = http_clients.get("slack")
+        try:
+            with STAGE_LATENCY.time(stage="slack_post"), UPSTREAM_IN_FLIGHT.track_inprogress(upstream="slack"):
+                response = await client.post(
+                    f"{self.base_url}/{method}",
+                    headers={
+                        "Authorization": f"Bearer {self.token}",
+                        "Content-Type": "application/json"
+                    },
+                    json=payload,
+                    timeout=10
+                )
+            if response.status_code == 429:
+                UPSTREAM_REQUESTS.inc(upstream="slack", outcome="rate_limited")
+                raise SlackRateLimitedError(method, float(response.headers.get("Retry-After", "1")))
             response.raise_for_status()
             data = response.json()
+        except SlackRateLimitedError:
+            raise
+        except Exception:
+            UPSTREAM_REQUESTS.inc(upstream="slack", outcome="error")
+            raise
 
-            if not data.get("ok"):
-                logger.error(f"Slack API error: {data.get('error')}")
-                raise Exception(f"Slack API error: {data.get('error')}")
+        if not data.get("ok"):
+            UPSTREAM_REQUESTS.inc(upstream="slack", outcome="api_error")
+            logger.error(f"Slack API error: {data.get('error')}")
+            raise SlackAPIError(data.get("error"))
 
-            logger.info(f"Message posted to Slack channel: {channel}")
-            return data
+        UPSTREAM_REQUESTS.inc(upstream="slack", outcome="success")
+        return data
 
     async def post_summary(
         self, channel: str, original_text: str, summary: str, thread_ts: Optional[str] = None
@@ -72,12 +137,300 @@ class SlackClient:
         :param thread_ts: Optional thread timestamp for threading
         :return: Slack API JSON response
         """
-        message = (
-            f"*Original Text Length:* {len(original_text.split())} words\n"
-            f"*Summary Length:* {len(summary.split())} words\n\n"
-            f"*Summary:*\n{summary}"
+        return await self.post_message(channel, summary_message(original_text, summary), thread_ts)
+
+    async def post_summary_digest(
+        self, channel: str, entries: List[Tuple[str, str]], per_message: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Post many summaries as a few digest messages instead of one post each.
+
+        :param channel: Slack channel ID
+        :param entries: (original_text, summary) pairs
+        :param per_message: Summaries combined into one Slack message
+        :return: Slack API JSON responses, one per digest message
+        """
+        return [
+            await self.post_message(channel, message)
+            for message in summary_digest_messages(entries, per_message)
+        ]
+
+
+def summary_message(original_text: str, summary: str) -> str:
+    return (
+        f"*Original Text Length:* {len(original_text.split())} words\n"
+        f"*Summary Length:* {len(summary.split())} words\n\n"
+        f"*Summary:*\n{summary}"
+    )
+
+
+def summary_digest_messages(entries: List[Tuple[str, str]], per_message: int = 10) -> List[str]:
+    messages = []
+    for start in range(0, len(entries), per_message):
+        batch = entries[start:start + per_message]
+        sections = [
+            f"*{start + i + 1}.* ({len(original.split())} → {len(summary.split())} words)\n{summary}"
+            for i, (original, summary) in enumerate(batch)
+        ]
+        messages.append(
+            f"*Summaries {start + 1}-{start + len(batch)} of {len(entries)}:*\n\n" + "\n\n".join(sections)
+        )
+    return messages
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` calls per second on average, with bursts of up to ``burst``.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def pause(self, seconds: float) -> None:
+        """
+        Hand out no tokens for ``seconds`` (e.g. after a Retry-After).
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = min(self._tokens, 0.0)
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._blocked_until and self._tokens >= 1:
+                self._tokens -= 1
+                return
+            wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            await asyncio.sleep(wait)
+
+
+class _Delivery:
+    __slots__ = ("method", "payload", "queued_at", "attempts", "rate_limited", "request_id")
+
+    def __init__(self, method: str, payload: Dict[str, Any]):
+        self.method = method
+        self.payload = payload
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+        self.rate_limited = 0
+        # Request that queued the message, for the logs and X-Request-ID
+        self.request_id = current_request_id()
+
+
+class SlackDeliveryQueue:
+    """
+    Fire-and-forget outbound Slack messages, delivered off the request path.
+
+    Each channel has its own FIFO drained by one task, so messages to a
+    channel keep their order while channels proceed independently. Sends are
+    paced by a per-channel and a workspace-wide token bucket (Slack allows
+    about one message per second per channel, with short bursts). A 429
+    pauses the channel for its Retry-After; other failures are retried with
+    capped exponential backoff, and Slack API errors are not retried.
+
+    With ``shared`` state the buckets are shared by all worker processes, so
+    the rates hold for the whole machine rather than per worker.
+    """
+
+    def __init__(
+        self,
+        client: SlackClient,
+        channel_rate: float = 1.0,
+        channel_burst: float = 3.0,
+        global_rate: float = 5.0,
+        global_burst: float = 10.0,
+        max_queued: int = 1000,
+        max_attempts: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        max_rate_limited: int = 10,
+        shared: Optional[SharedState] = None
+    ):
+        """
+        :param client: Client used to make the calls
+        :param channel_rate: Messages per second per channel
+        :param channel_burst: Messages a quiet channel may send back to back
+        :param global_rate: Messages per second across all channels
+        :param global_burst: Burst across all channels
+        :param max_queued: Messages waiting across all channels before new ones are dropped
+        :param max_attempts: Attempts per message for network and server errors
+        :param base_backoff: First retry delay in seconds, doubled per attempt
+        :param max_backoff: Longest retry delay in seconds
+        :param max_rate_limited: 429 answers a message may get before it is dropped
+        :param shared: State shared with other worker processes, if any
+        """
+        self.client = client
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_rate_limited = max_rate_limited
+        self.shared = shared
+        self._global_bucket = (
+            SharedTokenBucket(shared, "slack", global_rate, global_burst)
+            if shared is not None else TokenBucket(global_rate, global_burst)
+        )
+        self._buckets: Dict[str, Union[TokenBucket, SharedTokenBucket]] = {}
+        self._queues: Dict[str, Deque[_Delivery]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.counters = {"queued": 0, "delivered": 0, "retried": 0, "rate_limited": 0, "failed": 0, "dropped": 0}
+
+    @classmethod
+    def from_env(cls, client: SlackClient) -> "SlackDeliveryQueue":
+        return cls(
+            client,
+            channel_rate=float(os.getenv("SLACK_CHANNEL_RATE", "1.0")),
+            channel_burst=float(os.getenv("SLACK_CHANNEL_BURST", "3")),
+            global_rate=float(os.getenv("SLACK_GLOBAL_RATE", "5.0")),
+            global_burst=float(os.getenv("SLACK_GLOBAL_BURST", "10")),
+            max_queued=int(os.getenv("SLACK_DELIVERY_QUEUE_SIZE", "1000")),
+            max_attempts=int(os.getenv("SLACK_DELIVERY_MAX_ATTEMPTS", "5")),
+            max_backoff=float(os.getenv("SLACK_DELIVERY_MAX_BACKOFF", "30")),
+            shared=shared_state
+        )
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def enqueue(self, method: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queue a Slack API call without waiting. Returns False if the queue is full.
+        """
+        if self.depth >= self.max_queued:
+            self.counters["dropped"] += 1
+            SLACK_DELIVERIES.inc(outcome="dropped")
+            logger.warning(f"Slack delivery queue is full, dropping {method} to {payload.get('channel')}")
+            return False
+        channel = payload["channel"]
+        self._queues.setdefault(channel, deque()).append(_Delivery(method, payload))
+        self.counters["queued"] += 1
+        task = self._tasks.get(channel)
+        if task is None or task.done():
+            self._tasks[channel] = asyncio.create_task(self._drain(channel), name=f"slack-delivery-{channel}")
+        return True
+
+    def post_message(self, channel: str, text: str, thread_ts: Optional[str] = None) -> bool:
+        payload = {"channel": channel, "text": text, "unfurl_links": False}
+        if thread_ts:
+            payload["thread_ts"] = thread_ts
+        return self.enqueue("chat.postMessage", payload)
+
+    def post_summary(self, channel: str, original_text: str, summary: str, thread_ts: Optional[str] = None) -> bool:
+        return self.post_message(channel, summary_message(original_text, summary), thread_ts)
+
+    def post_summary_digest(self, channel: str, entries: List[Tuple[str, str]], per_message: int = 10) -> int:
+        """
+        Queue digest messages for many summaries; returns how many were queued.
+        """
+        return sum(
+            1 for message in summary_digest_messages(entries, per_message) if self.post_message(channel, message)
         )
-        return await self.post_message(channel, message, thread_ts)
+
+    def _bucket(self, channel: str) -> Union[TokenBucket, SharedTokenBucket]:
+        bucket = self._buckets.get(channel)
+        if bucket is None:
+            if self.shared is not None:
+                bucket = SharedTokenBucket(self.shared, f"slack:{channel}", self.channel_rate, self.channel_burst)
+            else:
+                bucket = TokenBucket(self.channel_rate, self.channel_burst)
+            self._buckets[channel] = bucket
+        return bucket
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _drain(self, channel: str) -> None:
+        queue = self._queues[channel]
+        bucket = self._bucket(channel)
+        while queue:
+            delivery = queue[0]
+            request_id_var.set(delivery.request_id)
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                await self.client._call(delivery.method, delivery.payload)
+            except SlackRateLimitedError as e:
+                delivery.rate_limited += 1
+                self.counters["rate_limited"] += 1
+                SLACK_DELIVERIES.inc(outcome="rate_limited")
+                if delivery.rate_limited >= self.max_rate_limited:
+                    self._finish(queue, delivery, "failed", f"rate limited {delivery.rate_limited} times")
+                    continue
+                logger.warning(f"Slack rate limited {channel}, pausing for {e.retry_after}s")
+                await bucket.pause(e.retry_after)
+                continue
+            except SlackAPIError as e:
+                self._finish(queue, delivery, "failed", str(e))
+                continue
+            except Exception as e:
+                delivery.attempts += 1
+                if delivery.attempts >= self.max_attempts:
+                    self._finish(queue, delivery, "failed", str(e))
+                    continue
+                delay = self._backoff(delivery.attempts)
+                self.counters["retried"] += 1
+                SLACK_DELIVERIES.inc(outcome="retried")
+                logger.warning(f"Slack delivery to {channel} failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self._finish(queue, delivery, "delivered")
+            SLACK_DELIVERY_LAG.observe(time.monotonic() - delivery.queued_at)
+
+        # Nothing left for this channel
+        if self._queues.get(channel) is queue and not queue:
+            del self._queues[channel]
+            self._tasks.pop(channel, None)
+
+    def _finish(self, queue: Deque[_Delivery], delivery: _Delivery, outcome: str, error: Optional[str] = None) -> None:
+        queue.popleft()
+        self.counters[outcome] += 1
+        SLACK_DELIVERIES.inc(outcome=outcome)
+        if error:
+            logger.error(f"Giving up on Slack {delivery.method} to {delivery.payload.get('channel')}: {error}")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        Give queued messages up to ``timeout`` seconds to go out, then cancel the rest.
+        """
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.depth:
+            logger.warning(f"Dropping {self.depth} queued Slack messages on shutdown")
+        self._tasks.clear()
+        self._queues.clear()
+
+    def oldest_lag(self) -> float:
+        now = time.monotonic()
+        heads = [now - queue[0].queued_at for queue in self._queues.values() if queue]
+        return max(heads) if heads else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "channels": len(self._queues),
+            "oldest_lag": round(self.oldest_lag(), 3),
+            **self.counters
+        }
 
 # Global instance for convenient use in other modules
 slack_client = SlackClient()
+# Outbound queue for messages nobody waits on
+slack_delivery = SlackDeliveryQueue.from_env(slack_client)
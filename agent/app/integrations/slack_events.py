@@ -2,35 +2,74 @@
 Slack Events API handler for WhatsBot.
 """
 from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi.responses import JSONResponse
 from ..llama import llama
-from ..integrations.slack import slack_client
+from ..integrations.slack import SlackRateLimitedError, slack_client
+from ..utils.ttl import TTLSet
+from ..utils.shared_state import shared_state
+from ..utils.workers import WorkerPool
+from ..conversations import Conversation, ConversationStore
+import os
+import time
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Placeholder shown while the answer is being generated
+PLACEHOLDER_TEXT = ":hourglass_flowing_sand: Thinking..."
+# Minimum seconds between chat.update edits while streaming
+STREAM_UPDATE_INTERVAL = float(os.getenv("SLACK_STREAM_UPDATE_INTERVAL", "1.0"))
+
 @router.post("/slack/events")
 async def handle_slack_events(request: Request):
     """
     Handle incoming Slack events, particularly app_mention events.
+
+    Events are acknowledged immediately and processed by the worker pool so
+    the response stays inside Slack's 3-second deadline. Retries of events we
+    already accepted are dropped.
     """
     try:
         body = await request.json()
-        
+
         # Handle Slack URL verification
         if body.get("type") == "url_verification":
             return {"challenge": body["challenge"]}
-            
+
         # Process events
         event = body.get("event", {})
         event_type = event.get("type")
-        
-        if event_type == "app_mention":
-            return await handle_app_mention(event)
-            
-        return {"status": "ignored", "event_type": event_type}
-        
+
+        if event_type != "app_mention":
+            return {"status": "ignored", "event_type": event_type}
+
+        retry_num = request.headers.get("X-Slack-Retry-Num")
+        retry_reason = request.headers.get("X-Slack-Retry-Reason")
+        event_id = body.get("event_id") or f"{event.get('channel')}:{event.get('ts')}"
+
+        # A timeout retry means we already received the original delivery
+        if retry_num and retry_reason == "http_timeout":
+            dedupe_stats["retries_dropped"] += 1
+            logger.info(f"Dropping Slack retry {retry_num} for {event_id} ({retry_reason})")
+            return JSONResponse({"status": "duplicate"}, headers={"X-Slack-No-Retry": "1"})
+
+        if not await _first_delivery(event_id):
+            dedupe_stats["duplicates_dropped"] += 1
+            logger.info(f"Dropping duplicate Slack event {event_id} (retry {retry_num})")
+            return JSONResponse({"status": "duplicate"}, headers={"X-Slack-No-Retry": "1"})
+
+        if not event_workers.submit(event):
+            # Let Slack retry later instead of losing the event
+            await _forget_delivery(event_id)
+            raise HTTPException(status_code=503, detail="Event queue is full")
+
+        return {"status": "accepted", "event_id": event_id}
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing Slack event: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -38,36 +77,155 @@ async def handle_slack_events(request: Request):
 async def handle_app_mention(event: Dict[str, Any]):
     """
     Handle when @whatsbot is mentioned in a channel.
+
+    Posts a placeholder reply right away and edits it with ``chat.update`` as
+    tokens stream in, so the user sees the answer forming instead of waiting
+    for the whole completion. Follow-ups in the same thread continue from the
+    Ollama context of the previous turn.
     """
     try:
         # Extract the message text, removing the bot mention
         text = event["text"]
         # Remove <@BOTID> from the text
         question = text.split(">", 1)[1].strip() if ">" in text else text.strip()
-        
+        channel = event["channel"]
+        thread_ts = event.get("thread_ts") or event.get("ts")  # Reply in thread if available
+
         if not question:
-            response_text = "Hello! How can I help you today?"
-        else:
-            # Generate response using Llama
-            try:
-                response = await llama.answer_question(
-                    question=question,
-                    format="concise"  # Use concise format for Slack
-                )
-                response_text = response
-            except Exception as e:
-                logger.error(f"Error generating response: {str(e)}")
-                response_text = "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
-
-        # Post response back to Slack
-        await slack_client.post_message(
-            channel=event["channel"],
-            text=response_text,
-            thread_ts=event.get("thread_ts") or event.get("ts")  # Reply in thread if available
+            await slack_client.post_message(
+                channel=channel,
+                text="Hello! How can I help you today?",
+                thread_ts=thread_ts
+            )
+            return {"status": "success", "message": "Response sent to Slack"}
+
+        placeholder = await slack_client.post_message(
+            channel=channel,
+            text=PLACEHOLDER_TEXT,
+            thread_ts=thread_ts
         )
-        
+        message_ts = placeholder["ts"]
+
+        thread_key = f"{channel}:{thread_ts}"
+        conversation = await _load_conversation(thread_key)
+        final: Dict[str, Any] = {}
+
+        response_text = ""
+        last_update = time.monotonic()
+        # No progress edits before this (monotonic) time, after a 429
+        edits_paused_until = 0.0
+        try:
+            async for token in llama.answer_question_stream(
+                question=question,
+                format="concise",  # Use concise format for Slack
+                priority="slack",  # Interactive mentions go ahead of API traffic
+                final=final,
+                history=conversation.context if conversation else None,
+                previous=conversation.last_exchange if conversation else None,
+                scope=channel  # Paraphrased questions are answered per channel
+            ):
+                response_text += token
+                # Throttle edits to stay well inside chat.update rate limits
+                now = time.monotonic()
+                if now - last_update >= STREAM_UPDATE_INTERVAL and now >= edits_paused_until:
+                    edits_paused_until = await _progress_edit(channel, message_ts, f"{response_text} ...")
+                    last_update = time.monotonic()
+            # Without a context (cache hit) the next turn gets this exchange as text
+            await _save_conversation(
+                thread_key,
+                final.get("context"),
+                last_exchange=None if final.get("context") else (question, response_text)
+            )
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            response_text = "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
+
+        # Final edit with the complete answer, once Slack accepts edits again
+        pause = edits_paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await slack_client.update_message(channel, message_ts, response_text)
+
         return {"status": "success", "message": "Response sent to Slack"}
-        
+
     except Exception as e:
         logger.error(f"Error handling app mention: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Event IDs already accepted, used to drop Slack redeliveries
+seen_events = TTLSet(
+    ttl=float(os.getenv("SLACK_EVENT_DEDUPE_TTL", "600")),
+    max_size=int(os.getenv("SLACK_EVENT_DEDUPE_MAX", "10000"))
+)
+dedupe_stats = {"duplicates_dropped": 0, "retries_dropped": 0}
+
+
+async def _first_delivery(event_id: str) -> bool:
+    """
+    Record an event ID; False if this or another worker already accepted it.
+    """
+    if shared_state is not None:
+        return await shared_state.add("slack_events", event_id, seen_events.ttl)
+    return seen_events.add(event_id)
+
+
+async def _forget_delivery(event_id: str) -> None:
+    if shared_state is not None:
+        await shared_state.discard("slack_events", event_id)
+    else:
+        seen_events.discard(event_id)
+
+
+async def _progress_edit(channel: str, ts: str, text: str) -> float:
+    """
+    Show the partial answer. A failed edit only costs the progress display,
+    never the answer; returns the monotonic time before which no further
+    edit should be tried.
+    """
+    try:
+        await slack_client.update_message(channel, ts, text)
+    except SlackRateLimitedError as e:
+        logger.warning(f"Progress edit in {channel} rate limited, pausing edits for {e.retry_after}s")
+        return time.monotonic() + e.retry_after
+    except Exception as e:
+        logger.warning(f"Progress edit in {channel} failed: {str(e)}")
+    return 0.0
+
+
+async def _load_conversation(thread_key: str) -> Optional[Conversation]:
+    if shared_state is not None:
+        # The previous turn may have been answered by another worker
+        return conversations.restore(thread_key, await shared_state.get_value("slack_threads", thread_key))
+    return conversations.get(thread_key)
+
+
+async def _save_conversation(
+    thread_key: str, context: Optional[List[int]], last_exchange: Optional[Tuple[str, str]] = None
+) -> None:
+    conversations.put(thread_key, context, last_exchange)
+    if shared_state is not None:
+        await shared_state.set_value(
+            "slack_threads", thread_key, conversations.export(thread_key),
+            ttl=conversations.ttl, max_entries=conversations.max_threads
+        )
+
+
+# Ollama context per Slack thread, so follow-ups only evaluate the new turn
+conversations = ConversationStore.from_env()
+
+# Workers that run app mentions off the request path
+event_workers = WorkerPool(
+    name="slack-events",
+    handler=handle_app_mention,
+    workers=int(os.getenv("SLACK_EVENT_WORKERS", "4")),
+    queue_size=int(os.getenv("SLACK_EVENT_QUEUE_SIZE", "100"))
+)
+
+
+def event_stats() -> Dict[str, Any]:
+    return {
+        **event_workers.stats(),
+        **dedupe_stats,
+        "tracked_event_ids": len(seen_events),
+        "threads": conversations.stats()
+    }
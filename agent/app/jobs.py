@@ -0,0 +1,631 @@
+"""
+Durable background jobs for long summarizations and questions.
+
+Submitting a job stores it in a local SQLite database (WAL mode) and returns
+its ID right away; workers in the app pick queued jobs up in submission
+order, at most ``concurrency`` at a time across all worker processes sharing
+the database. Clients poll
+``GET /api/v1/jobs/{id}`` or pass a ``callback_url`` that receives the
+finished job as a JSON POST. Jobs that were running in a process that has
+since stopped, or that stopped sending heartbeats, are queued again (on the
+next start, or by another worker process), and finished jobs are deleted
+once their TTL has passed.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import ipaddress
+import sqlite3
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from .llama import llama
+from .models import QuestionRequest, SummarizationRequest
+from .summarizer import run_summarization
+from .integrations.questions import build_prompt
+from .resilience import LatencyTracker
+from .scheduler import LLMOverloadedError
+from .utils.http import http_clients
+from .utils.metrics import JOBS, JOB_QUEUE_WAIT, JOB_RUN_TIME
+from .utils.shared_state import process_alive, process_token
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELED = "canceled"
+FINISHED = (SUCCEEDED, FAILED, CANCELED)
+
+_COLUMNS = (
+    "id", "kind", "status", "payload", "result", "error", "callback_url", "callback_status",
+    "attempts", "created_at", "run_after", "started_at", "finished_at"
+)
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        concurrency: int = 2,
+        ttl: float = 86400.0,
+        max_queued: int = 1000,
+        max_attempts: int = 3,
+        callback_attempts: int = 3,
+        poll_interval: float = 1.0,
+        cleanup_interval: float = 300.0,
+        heartbeat_interval: float = 30.0,
+        heartbeat_timeout: float = 120.0,
+        callback_allowed_hosts: Iterable[str] = ()
+    ):
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.max_queued = max_queued
+        # Attempts per job when the LLM is overloaded; other errors fail the job
+        self.max_attempts = max_attempts
+        self.callback_attempts = callback_attempts
+        # If set, callbacks only go to these hosts; otherwise to any public address
+        self.callback_allowed_hosts = {host.lower() for host in callback_allowed_hosts}
+        self.poll_interval = poll_interval
+        self.cleanup_interval = cleanup_interval
+        # Running jobs are touched every heartbeat_interval; one not touched for
+        # heartbeat_timeout is queued again even if its process looks alive
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.handlers: Dict[str, JobHandler] = {}
+        # Recorded on claimed jobs, so other worker processes can tell if we exited
+        self.owner = process_token()
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        # Running jobs canceled through the API, as opposed to by stop()
+        self._cancel_requested: Set[str] = set()
+        self._stopping = False
+        self._callbacks: set = set()
+        self.queue_wait = LatencyTracker(window=500, min_samples=1)
+        self.run_time = LatencyTracker(window=500, min_samples=1)
+        self.counters = {
+            "submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "retried": 0,
+            "canceled": 0, "recovered": 0, "expired": 0, "callbacks_delivered": 0, "callbacks_failed": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        return cls(
+            db_path=os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite3") or None,
+            concurrency=int(os.getenv("JOBS_CONCURRENCY", "2")),
+            ttl=float(os.getenv("JOBS_TTL", "86400")),
+            max_queued=int(os.getenv("JOBS_MAX_QUEUED", "1000")),
+            max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+            callback_attempts=int(os.getenv("JOBS_CALLBACK_ATTEMPTS", "3")),
+            heartbeat_interval=float(os.getenv("JOBS_HEARTBEAT_INTERVAL", "30")),
+            heartbeat_timeout=float(os.getenv("JOBS_HEARTBEAT_TIMEOUT", "120")),
+            callback_allowed_hosts=[
+                host.strip() for host in os.getenv("JOBS_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+            ]
+        )
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self.handlers[kind] = handler
+
+    # Storage
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is not None:
+            return self._db
+        path = self.db_path or ":memory:"
+        if self.db_path and os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Autocommit mode; multi-statement changes use explicit transactions
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " callback_url TEXT,"
+            " callback_status TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " run_after REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, run_after, created_at)")
+        # Process running the job and its last sign of life, added after the first release of this table
+        columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner TEXT", "heartbeat_at REAL"):
+            if column.split()[0] not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+        self._db = db
+        logger.info(f"Opened job queue at {path}")
+        return db
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        with self._db_lock:
+            return self._connect().execute(sql, params).rowcount
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _row(self, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def _insert(self, job_id: str, kind: str, payload: Dict[str, Any], callback_url: Optional[str]) -> bool:
+        with self._db_lock:
+            db = self._connect()
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if queued >= self.max_queued:
+                return False
+            now = time.time()
+            db.execute(
+                "INSERT INTO jobs (id, kind, status, payload, callback_url, created_at, run_after)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload), callback_url, now, now)
+            )
+            return True
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the oldest due queued job as running and return it, unless
+        ``concurrency`` jobs are already running in any process.
+        """
+        with self._db_lock:
+            db = self._connect()
+            # IMMEDIATE takes the write lock up front, so two claimers cannot pick the same job
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = None
+                running = db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (RUNNING,)).fetchone()[0]
+                if running < self.concurrency:
+                    row = db.execute(
+                        f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? AND run_after <= ?"
+                        " ORDER BY created_at LIMIT 1",
+                        (QUEUED, now)
+                    ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1, owner = ?"
+                        " WHERE id = ?",
+                        (RUNNING, now, now, self.owner, row[0])
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        job = self._row(row)
+        if job is not None:
+            job.update(status=RUNNING, started_at=now, attempts=job["attempts"] + 1)
+        return job
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        # Only a job still running here is finished; a cancel or a recovery may have come first
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status = ? AND owner = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, RUNNING, self.owner)
+        )
+
+    def _requeue(self, job_id: str, delay: float) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, started_at = NULL, run_after = ? WHERE id = ? AND status = ? AND owner = ?",
+            (QUEUED, time.time() + delay, job_id, RUNNING, self.owner)
+        )
+
+    def _heartbeat(self) -> int:
+        return self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?", (time.time(), RUNNING, self.owner)
+        )
+
+    def _cancel(self, job_id: str) -> int:
+        return self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELED, "Canceled", time.time(), job_id, QUEUED, RUNNING)
+        )
+
+    def _recover(self) -> int:
+        """
+        Queue again the jobs left running by processes that have exited or
+        stopped sending heartbeats.
+        """
+        stale_before = time.time() - self.heartbeat_timeout
+        with self._db_lock:
+            db = self._connect()
+            owners = [row[0] for row in db.execute("SELECT DISTINCT owner FROM jobs WHERE status = ?", (RUNNING,))]
+            recovered = 0
+            for owner in owners:
+                if owner == self.owner:
+                    continue
+                if owner is not None and process_alive(owner):
+                    condition, params = " AND COALESCE(heartbeat_at, started_at) < ?", (stale_before,)
+                else:
+                    condition, params = "", ()
+                recovered += db.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL WHERE status = ? AND owner IS ?"
+                    + condition,
+                    (QUEUED, RUNNING, owner, *params)
+                ).rowcount
+        return recovered
+
+    def _cleanup(self) -> int:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            expired = db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND created_at < ?",
+                (FAILED, "Expired before it could run", now, QUEUED, now - self.ttl)
+            ).rowcount
+            db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?", (*FINISHED, now - self.ttl)
+            )
+        return expired
+
+    def _status_counts(self) -> Dict[str, int]:
+        return {status: count for status, count in self._query("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+
+    # Public API
+
+    async def check_callback_url(self, url: str) -> None:
+        """
+        Raise ValueError unless ``url`` is an http(s) URL of an allowed host.
+
+        Without ``JOBS_CALLBACK_ALLOWED_HOSTS`` every address the host resolves
+        to must be public, so callbacks cannot reach loopback, private or
+        link-local services (e.g. cloud metadata or Ollama).
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("callback_url must be an http or https URL")
+        host = parts.hostname.lower()
+        if self.callback_allowed_hosts:
+            if host not in self.callback_allowed_hosts:
+                raise ValueError(f"callback_url host {host} is not allowed")
+            return
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port or 443, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError) as e:
+            raise ValueError(f"callback_url host {host} does not resolve: {str(e)}")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+            if not address.is_global or address.is_multicast:
+                raise ValueError(f"callback_url host {host} is not a public address")
+
+    async def submit(self, kind: str, payload: Dict[str, Any], callback_url: Optional[str] = None) -> str:
+        """
+        Store a job and return its ID. Raises LLMOverloadedError (429) if too many
+        are queued, and ValueError for an unknown kind or a rejected callback URL.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        if callback_url is not None:
+            await self.check_callback_url(callback_url)
+        job_id = uuid.uuid4().hex
+        if not await asyncio.to_thread(self._insert, job_id, kind, payload, callback_url):
+            self.counters["rejected"] += 1
+            JOBS.inc(kind=kind, outcome="rejected")
+            raise LLMOverloadedError("Job queue is full", status_code=429, retry_after=30)
+        self.counters["submitted"] += 1
+        JOBS.inc(kind=kind, outcome="submitted")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = await asyncio.to_thread(self._query, f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        return self._row(rows[0] if rows else None)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a queued or running job; finished jobs are left as they are.
+        """
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        if await asyncio.to_thread(self._cancel, job_id):
+            task = self._running.get(job_id)
+            if task is not None:
+                # Tells _run this cancellation came from the API, not from stop()
+                self._cancel_requested.add(job_id)
+                task.cancel()
+            self.counters["canceled"] += 1
+            JOBS.inc(kind=job["kind"], outcome="canceled")
+        return await self.get(job_id)
+
+    # Workers
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Queued work may be waiting for the other workers too
+            self._wakeup.set()
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id, kind = job["id"], job["kind"]
+        wait = job["started_at"] - job["created_at"]
+        self.queue_wait.observe(wait)
+        JOB_QUEUE_WAIT.observe(wait, kind=kind)
+        started = time.perf_counter()
+        task = asyncio.create_task(self.handlers[kind](job["payload"]))
+        self._running[job_id] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            task.cancel()
+            if job_id in self._cancel_requested and not self._stopping:
+                # Canceled through the API; the row is already marked canceled
+                return
+            # The worker itself is shutting down: leave the job for the next start
+            await asyncio.to_thread(self._requeue, job_id, 0)
+            raise
+        except LLMOverloadedError as e:
+            if job["attempts"] < self.max_attempts:
+                self.counters["retried"] += 1
+                JOBS.inc(kind=kind, outcome="retried")
+                logger.warning(f"Job {job_id} deferred {e.retry_after}s: {str(e)}")
+                await asyncio.to_thread(self._requeue, job_id, e.retry_after)
+                return
+            await self._complete(job, FAILED, error=str(e))
+            return
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+            await self._complete(job, FAILED, error=str(e))
+            return
+        finally:
+            self._running.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+            elapsed = time.perf_counter() - started
+            self.run_time.observe(elapsed)
+            JOB_RUN_TIME.observe(elapsed, kind=kind)
+        await self._complete(job, SUCCEEDED, result=result)
+
+    async def _complete(self, job: Dict[str, Any], status: str, result: Any = None, error: Optional[str] = None) -> None:
+        await asyncio.to_thread(self._finish, job["id"], status, result, error)
+        self.counters[status] += 1
+        JOBS.inc(kind=job["kind"], outcome=status)
+        if job["callback_url"]:
+            # Delivered outside the worker so a slow receiver does not hold a slot
+            callback = asyncio.create_task(self._deliver_callback(job["id"], job["callback_url"]))
+            self._callbacks.add(callback)
+            callback.add_done_callback(self._callbacks.discard)
+
+    async def _deliver_callback(self, job_id: str, url: str) -> None:
+        job = await self.get(job_id)
+        client = http_clients.get("webhook")
+        for attempt in range(1, self.callback_attempts + 1):
+            try:
+                # Checked again right before sending, as DNS may have changed since submission
+                await self.check_callback_url(url)
+                response = await client.post(url, json=job_view(job))
+                response.raise_for_status()
+                self.counters["callbacks_delivered"] += 1
+                await asyncio.to_thread(
+                    self._execute, "UPDATE jobs SET callback_status = ? WHERE id = ?", ("delivered", job_id)
+                )
+                return
+            except ValueError as e:
+                logger.warning(f"Not delivering callback for job {job_id}: {str(e)}")
+                break
+            except Exception as e:
+                logger.warning(f"Callback for job {job_id} failed (attempt {attempt}): {str(e)}")
+                if attempt < self.callback_attempts:
+                    await asyncio.sleep(min(30.0, 2 ** attempt))
+        self.counters["callbacks_failed"] += 1
+        await asyncio.to_thread(
+            self._execute, "UPDATE jobs SET callback_status = ? WHERE id = ?", ("failed", job_id)
+        )
+
+    async def _recover_interrupted(self) -> None:
+        recovered = await asyncio.to_thread(self._recover)
+        if recovered:
+            self.counters["recovered"] += recovered
+            logger.info(f"Requeued {recovered} jobs interrupted by a stopped process")
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await asyncio.to_thread(self._heartbeat)
+                # Another worker process may have died or hung with jobs running
+                await self._recover_interrupted()
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {str(e)}")
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                expired = await asyncio.to_thread(self._cleanup)
+                if expired:
+                    self.counters["expired"] += expired
+                    logger.warning(f"Expired {expired} jobs that waited longer than {self.ttl}s")
+            except Exception as e:
+                logger.warning(f"Job cleanup failed: {str(e)}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping = False
+        await self._recover_interrupted()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"jobs-worker-{i}") for i in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop(), name="jobs-cleanup"))
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop(), name="jobs-heartbeat"))
+        logger.info(f"Started {self.concurrency} job workers")
+
+    async def stop(self) -> None:
+        """
+        Stop the workers; running jobs are queued again and resume on the next start.
+        """
+        self._stopping = True
+        for task in [*self._tasks, *self._callbacks]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._callbacks, return_exceptions=True)
+        self._tasks = []
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    async def stats(self) -> Dict[str, Any]:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "jobs": await asyncio.to_thread(self._status_counts),
+            "running": len(self._running),
+            "concurrency": self.concurrency,
+            "queue_wait_p50": rounded(self.queue_wait.percentile(50)),
+            "queue_wait_p95": rounded(self.queue_wait.percentile(95)),
+            "run_time_p50": rounded(self.run_time.percentile(50)),
+            "run_time_p95": rounded(self.run_time.percentile(95)),
+            **self.counters
+        }
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The public representation of a job.
+    """
+    view = {
+        "job_id": job["id"],
+        "type": job["kind"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "attempts": job["attempts"],
+    }
+    if job["status"] == SUCCEEDED:
+        view["result"] = job["result"]
+    if job["error"]:
+        view["error"] = job["error"]
+    if job["callback_url"]:
+        view["callback_status"] = job["callback_status"] or "pending"
+    return view
+
+
+# Job handlers
+
+async def summarize_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = await run_summarization(SummarizationRequest(**payload), priority="batch")
+    return response.dict()
+
+
+async def ask_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    request = QuestionRequest(**payload)
+    prompt, params = build_prompt(request.question, request.context, request.format)
+    answer = await llama.generate(
+        prompt=prompt, cache_endpoint="ask", bypass_cache=request.bypass_cache, priority="batch", **params
+    )
+    return {
+        "status": "success",
+        "answer": answer,
+        "metadata": {"format": request.format, "context_provided": request.context is not None}
+    }
+
+
+# Global queue, started from the FastAPI lifespan
+job_queue = JobQueue.from_env()
+job_queue.register("summarize", summarize_job)
+job_queue.register("ask", ask_job)
+
+JOB_MODELS = {"summarize": SummarizationRequest, "ask": QuestionRequest}
+
+
+# Routes
+
+router = APIRouter()
+
+
+class JobSubmission(BaseModel):
+    """
+    Model for job submissions.
+    """
+    type: str = Field(..., description="Job type: 'summarize' or 'ask'")
+    payload: Dict[str, Any] = Field(..., description="The request, shaped like SummarizationRequest or QuestionRequest")
+    callback_url: Optional[str] = Field(None, description="URL that receives the finished job as a JSON POST")
+
+
+@router.post("", status_code=202)
+async def submit_job(submission: JobSubmission):
+    """
+    Queue a summarization or question and return its job ID immediately.
+    """
+    model = JOB_MODELS.get(submission.type)
+    if model is None:
+        raise HTTPException(status_code=400, detail={"error": f"Unknown job type: {submission.type}"})
+    try:
+        # Validate now so a malformed request fails here instead of in the queue
+        model(**submission.payload)
+    except (ValidationError, TypeError) as e:
+        raise HTTPException(status_code=400, detail={"error": "Invalid payload", "details": str(e)})
+    try:
+        job_id = await job_queue.submit(submission.type, submission.payload, submission.callback_url)
+    except LLMOverloadedError as e:
+        raise e.http_exception()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    return JSONResponse(
+        {"job_id": job_id, "status": QUEUED, "status_url": f"/api/v1/jobs/{job_id}"},
+        status_code=202,
+        headers={"Location": f"/api/v1/jobs/{job_id}"}
+    )
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    Poll a job; ``result`` is included once it has succeeded.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "Job not found"})
+    return job_view(job)
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "Job not found"})
+    return job_view(job)
@@ -4,176 +4,1026 @@ import httpx
 import os
 import time
 import asyncio
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable, Awaitable, AsyncIterator
 import logging
 import json
-from dotenv import load_dotenv
-
-# Load environment variables from .env
-load_dotenv()
+from .utils.http import http_clients
+from .utils.logs import log_payload
+from .backends import BackendPool, ModelNotFoundError, normalize_model_name
+from .cache import ResponseCache, make_cache_key
+from .utils.singleflight import SingleFlight
+from .utils.shared_state import shared_state
+from .scheduler import LLMScheduler, LLMOverloadedError
+from .resilience import DeadlineExceededError, LatencyTracker, current_deadline, deadline_scope, new_deadline
+from .chunking import estimate_tokens, split_text
+from .prompting import PromptBudget
+from .utils.metrics import (
+    STAGE_LATENCY,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_RETRIES,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_HEDGES,
+    record_ollama_timings
+)
 
-# Configure logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG for maximum verbosity
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+
+class ModelRegistry:
+    """
+    Caches the Ollama model list (``api/tags``) so generation does not pay an
+    extra round trip per request.
+
+    Fresh entries are served directly, stale entries are served while a
+    background refresh runs, and missing models or failed lookups are cached
+    for a short negative TTL.
+    """
+
+    def __init__(
+        self,
+        fetch_tags: Callable[[], Awaitable[Dict[str, Any]]],
+        ttl: float = 300.0,
+        negative_ttl: float = 15.0
+    ):
+        self._fetch_tags = fetch_tags
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._models: Optional[Set[str]] = None
+        self._fetched_at = 0.0
+        self._failed_until = 0.0
+        self._missing: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def models(self) -> Set[str]:
+        return set(self._models or ())
+
+    async def refresh(self) -> Set[str]:
+        """
+        Fetch the model list from Ollama, sharing one request between
+        concurrent callers.
+        """
+        async with self._lock:
+            # Another caller refreshed while we were waiting
+            if self._models is not None and time.monotonic() - self._fetched_at < 1.0:
+                return self._models
+            try:
+                data = await self._fetch_tags()
+            except Exception as e:
+                self._failed_until = time.monotonic() + self.negative_ttl
+                logger.warning(f"Failed to refresh model list: {str(e)}")
+                raise
+            models = set()
+            for entry in data.get("models", []):
+                for key in ("name", "model"):
+                    if entry.get(key):
+                        models.add(normalize_model_name(entry[key]))
+            self._models = models
+            self._fetched_at = time.monotonic()
+            self._failed_until = 0.0
+            self._missing.clear()
+            logger.debug("Refreshed model list: %s", models)
+            return models
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+
+        async def _run():
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+
+        self._refresh_task = asyncio.create_task(_run())
+
+    async def ensure_available(self, model: str) -> None:
+        """
+        Raise ModelNotFoundError if the model is known to be unavailable.
+
+        If the model list cannot be fetched and nothing is cached, the check
+        is skipped and generation itself reports the error.
+        """
+        name = normalize_model_name(model)
+        now = time.monotonic()
+
+        missing_until = self._missing.get(name)
+        if missing_until is not None:
+            if now < missing_until:
+                raise ModelNotFoundError(f"Model {model} not found. Available models: {sorted(self.models)}")
+            del self._missing[name]
+
+        if self._models is None:
+            if now < self._failed_until:
+                return
+            try:
+                await self.refresh()
+            except Exception:
+                return
+        elif now - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+
+        if name in self._models:
+            return
+
+        # The model may have been pulled since the last refresh
+        if now - self._fetched_at > self.negative_ttl and now >= self._failed_until:
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+            if name in self._models:
+                return
+
+        self._missing[name] = time.monotonic() + self.negative_ttl
+        raise ModelNotFoundError(f"Model {model} not found. Available models: {sorted(self.models)}")
+
+    def invalidate(self, model: str) -> None:
+        """
+        Drop a model from the cache after Ollama reported it missing.
+        """
+        name = normalize_model_name(model)
+        if self._models is not None:
+            self._models.discard(name)
+        self._missing[name] = time.monotonic() + self.negative_ttl
+
 
 class LlamaAPI:
     def __init__(self):
-        # URL of the Llama API server
-        self.api_url = os.getenv("OLLAMA_API_URL", "http://localhost:11434")
+        # Ollama servers; OLLAMA_API_URLS takes a comma-separated list
+        self.backends = BackendPool.from_env()
+        self.api_url = self.backends.backends[0].url
         # Default model to use
         self.model = os.getenv("OLLAMA_MODEL", "llama3")
         # Number of retries
         self.max_retries = 3
+        # Retries must fit inside the request deadline; each attempt gets at most attempt_timeout
+        self.request_deadline = float(os.getenv("LLM_REQUEST_DEADLINE", "60"))
+        self.attempt_timeout = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+        self.min_attempt_time = 1.0
+        # Hedged requests for short interactive prompts
+        self.hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_max_prompt_chars = int(os.getenv("LLM_HEDGE_MAX_PROMPT_CHARS", "2000"))
+        self.hedge_latency = LatencyTracker()
         # Default parameters for generation
         self.default_params = {
-            "num_ctx": 512,  # Reduced context window
+            "num_ctx": 512,  # Reduced context window; prompt builders size it per request
             "num_predict": 256,  # Limit response length
             "temperature": 0.7,  # Slightly reduced creativity for faster responses
             "top_k": 40,  # Limit token sampling
             "top_p": 0.9,  # Nucleus sampling
             "repeat_penalty": 1.1  # Prevent repetition
         }
-        
-        logger.info(f"Initializing LlamaAPI with URL: {self.api_url} and model: {self.model}")
+        # Cached model list, so generate does not call api/tags every time
+        self.models = ModelRegistry(
+            fetch_tags=self.backends.fetch_tags,
+            ttl=float(os.getenv("OLLAMA_MODEL_CACHE_TTL", "300")),
+            negative_ttl=float(os.getenv("OLLAMA_MODEL_NEGATIVE_TTL", "15"))
+        )
+        # Memory + SQLite cache of completed generations
+        self.cache = ResponseCache.from_env()
+        # Optional cache of answers to paraphrased questions, built by load_semantic_cache
+        self.semantic_cache = None
+        self.embed_model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+        # After the embedding model is reported missing, skip embedding until then (monotonic)
+        self.embed_retry_interval = float(os.getenv("OLLAMA_EMBED_RETRY_INTERVAL", "300"))
+        self._embed_unavailable_until = 0.0
+        # Shares one Ollama request between identical concurrent calls
+        self.inflight = SingleFlight()
+        # Bounded, prioritized access to the backend's parallel slots
+        self.scheduler = LLMScheduler.from_env()
+        # How long Ollama keeps the model (and its prompt cache) loaded, e.g. '30m'
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE")
+        # Trims prompt content and sizes num_ctx to fit the context window
+        self.budget = PromptBudget.from_env()
+        # Map-reduce summarization of documents larger than the context window
+        self.summary_chunk_tokens = int(os.getenv("SUMMARY_CHUNK_TOKENS", "0"))  # 0 = derive from the prompt budget
+        self.summary_map_concurrency = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+        self.summary_partial_words = 60
+        self.summary_max_reduce_depth = 4
 
-    async def _make_request(self, endpoint: str, payload: Dict[str, Any], method: str = "POST") -> Dict[str, Any]:
+        logger.info(
+            f"Initializing LlamaAPI with URLs: {[b.url for b in self.backends.backends]} and model: {self.model}"
+        )
+
+    def load_semantic_cache(self) -> None:
         """
-        Make a request to the Llama API with retries.
+        Build the semantic cache if it is enabled.
+
+        Importing NumPy and reading the saved index is left out of import
+        time; until this has run, questions simply skip the semantic cache.
         """
-        last_error = None
-        for attempt in range(self.max_retries):
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() != "true":
+            return
+        from .semantic_cache import SemanticCache
+        self.semantic_cache = SemanticCache.from_env()
+
+    async def warm_up(self) -> bool:
+        """
+        Load the model on every backend ahead of the first request.
+
+        An empty prompt makes Ollama load the model without generating;
+        ``keep_alive`` (if set) keeps it resident. Also fills the model list
+        cache. Returns True if at least one backend loaded the model.
+        """
+        try:
+            await self.models.refresh()
+        except Exception:
+            # Already logged; loading the model may still work
+            pass
+        client = http_clients.get("ollama")
+        payload: Dict[str, Any] = {"model": self.model, "prompt": "", "stream": False}
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+
+        async def load(url: str) -> bool:
+            started = time.perf_counter()
             try:
-                async with httpx.AsyncClient() as client:
+                response = await client.post(f"{url}/api/generate", json=payload, timeout=self.request_deadline)
+                response.raise_for_status()
+            except Exception as e:
+                logger.warning(f"Warm-up of {self.model} on {url} failed: {str(e)}")
+                return False
+            logger.info(f"Warmed up {self.model} on {url} in {time.perf_counter() - started:.2f}s")
+            return True
+
+        results = await asyncio.gather(*(load(b.url) for b in self.backends.backends))
+        return any(results)
+
+    async def _attempt(
+        self,
+        backend,
+        endpoint: str,
+        payload: Dict[str, Any],
+        method: str,
+        timeout: float
+    ) -> Dict[str, Any]:
+        """
+        Send one request to one backend, bounded by ``timeout`` seconds in total.
+        """
+        client = http_clients.get("ollama")
+        async with self.backends.track(backend):
+            with UPSTREAM_IN_FLIGHT.track_inprogress(upstream="ollama"):
+                try:
                     if method == "POST":
-                        response = await client.post(
-                            f"{self.api_url}/{endpoint}",
-                            json=payload,
-                            timeout=30.0
-                        )
+                        request = client.post(f"{backend.url}/{endpoint}", json=payload, timeout=timeout)
                     else:
-                        response = await client.get(
-                            f"{self.api_url}/{endpoint}",
-                            timeout=30.0
-                        )
-                    
-                    response.raise_for_status()
-                    return response.json()
-            except Exception as e:
-                last_error = e
-                logger.warning(f"Request attempt {attempt + 1} failed: {str(e)}")
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
-                continue
-        
-        raise Exception(f"All requests failed after {self.max_retries} attempts. Last error: {str(last_error)}")
+                        request = client.get(f"{backend.url}/{endpoint}", timeout=timeout)
+                    response = await asyncio.wait_for(request, timeout=timeout)
+                except asyncio.TimeoutError:
+                    raise Exception(f"No response from {backend.url} within {timeout:.1f}s")
+
+            # A missing model will not appear on retry
+            if response.status_code == 404 and "model" in response.text and "not found" in response.text:
+                self.backends.mark_model_missing(backend, payload.get("model", self.model))
+                raise ModelNotFoundError(response.text)
 
-    async def generate(self, prompt: str, **kwargs: Dict[str, Any]) -> str:
+            response.raise_for_status()
+        return response.json()
+
+    async def _hedged_attempt(
+        self,
+        backend,
+        endpoint: str,
+        payload: Dict[str, Any],
+        method: str,
+        timeout: float,
+        tried: Set[str]
+    ) -> Dict[str, Any]:
         """
-        Generate text using the Llama model.
+        Send the request and, if it is slower than the hedge percentile, send a
+        second copy (to another backend when possible). The first answer wins
+        and the other attempt is cancelled.
         """
-        logger.debug(f"Generating response for prompt: {prompt[:100]}...")
-        
+        delay = self.hedge_latency.percentile(self.hedge_percentile)
+        primary = asyncio.ensure_future(self._attempt(backend, endpoint, payload, method, timeout))
+        attempts = {primary}
+        hedged = False
         try:
-            # Check if the model is available
-            models = await self._make_request("api/tags", {}, method="GET")
-            available_models = [m.get("name") for m in models.get("models", [])]
-            logger.info(f"Available models: {available_models}")
-            
-            if f"{self.model}:latest" not in available_models:
-                raise Exception(f"Model {self.model} not found. Available models: {available_models}")
-
-            # Prepare the request with optimized parameters
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                **self.default_params,  # Add default optimization parameters
-                **kwargs  # Allow overriding defaults
-            }
-            logger.debug(f"Sending request with payload: {json.dumps(payload)[:200]}...")
-
-            # Make the request
-            response_data = await self._make_request("api/generate", payload)
-            
-            if not response_data.get("response"):
-                raise Exception(f"No response in output: {response_data}")
-            
-            logger.info("Successfully generated response")
-            return response_data["response"]
-            
-        except Exception as e:
-            logger.error(f"Failed to generate response: {str(e)}")
-            raise Exception(f"Failed to generate response: {str(e)}")
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done:
+                    try:
+                        hedge_backend = self.backends.choose(payload.get("model", self.model), exclude=tried)
+                    except Exception:
+                        hedge_backend = None
+                    if hedge_backend is not None:
+                        tried.add(hedge_backend.url)
+                        hedged = True
+                        UPSTREAM_HEDGES.inc(outcome="fired")
+                        logger.debug(f"Hedging request after {delay:.2f}s to {hedge_backend.url}")
+                        attempts.add(asyncio.ensure_future(
+                            self._attempt(hedge_backend, endpoint, payload, method, timeout - delay)
+                        ))
+
+            last_error: Optional[BaseException] = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            UPSTREAM_HEDGES.inc(outcome="primary_won" if task is primary else "hedge_won")
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
 
-    async def summarize(self, text: str, max_length: int = 150, min_length: int = 50) -> str:
+    async def _make_request(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        method: str = "POST",
+        retries: Optional[int] = None,
+        hedge: bool = False
+    ) -> Dict[str, Any]:
         """
-        Summarize the given text in a concise manner.
+        Make a request to the Llama API with retries.
+
+        Attempts and backoff sleeps must fit inside the current deadline
+        (``LLM_REQUEST_DEADLINE`` unless a caller set a tighter one). Requests
+        fail fast with CircuitOpenError while every backend's circuit is open.
+
+        Args:
+            endpoint: Ollama API path, e.g. 'api/generate'
+            payload: JSON body for POST requests
+            method: 'POST' or 'GET'
+            retries: Maximum number of attempts (default: self.max_retries)
+            hedge: Send a second copy of slow attempts (short interactive prompts)
         """
-        prompt = (
-            "You are a summarization expert. Create clear and concise summaries "
-            "that capture the main points while being easy to understand.\n\n"
-            f"Please summarize the following text in {min_length}-{max_length} words:\n\n"
-            f"{text}\n\n"
-            "Summary:"
+        last_error = None
+        max_retries = retries or self.max_retries
+        model = payload.get("model", self.model)
+        tried: Set[str] = set()
+        with deadline_scope(self.request_deadline) as deadline:
+            for attempt in range(max_retries):
+                remaining = deadline.remaining()
+                if remaining < self.min_attempt_time:
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded after {attempt} attempts. Last error: {str(last_error)}"
+                    )
+                if attempt > 0:
+                    UPSTREAM_RETRIES.inc(upstream="ollama")
+                # Prefer a backend we have not tried yet for this request
+                backend = self.backends.choose(model, exclude=tried)
+                tried.add(backend.url)
+                timeout = min(self.attempt_timeout, remaining)
+                started = time.monotonic()
+                try:
+                    if hedge:
+                        data = await self._hedged_attempt(backend, endpoint, payload, method, timeout, tried)
+                        self.hedge_latency.observe(time.monotonic() - started)
+                    else:
+                        data = await self._attempt(backend, endpoint, payload, method, timeout)
+                    UPSTREAM_REQUESTS.inc(upstream="ollama", outcome="success")
+                    return data
+                except ModelNotFoundError as e:
+                    UPSTREAM_REQUESTS.inc(upstream="ollama", outcome="model_not_found")
+                    # Another backend may still have the model loaded
+                    if not any(b.serves(model) and b.url not in tried for b in self.backends.backends):
+                        raise
+                    last_error = e
+                    continue
+                except Exception as e:
+                    last_error = e
+                    UPSTREAM_REQUESTS.inc(upstream="ollama", outcome="error")
+                    logger.warning(f"Request attempt {attempt + 1} to {backend.url} failed: {str(e)}")
+                    if attempt < max_retries - 1:
+                        backoff = 1 * (attempt + 1)
+                        # Give up now rather than sleep into a retry that cannot finish in time
+                        if deadline.remaining() < backoff + self.min_attempt_time:
+                            raise DeadlineExceededError(
+                                f"Deadline exceeded after {attempt + 1} attempts. Last error: {str(e)}"
+                            )
+                        with STAGE_LATENCY.time(stage="retry_backoff"):
+                            await asyncio.sleep(backoff)
+                    continue
+
+        raise Exception(f"All requests failed after {max_retries} attempts. Last error: {str(last_error)}")
+
+    async def generate(
+        self,
+        prompt: str,
+        cache_endpoint: str = "generate",
+        bypass_cache: bool = False,
+        priority: str = "ask",
+        **kwargs: Dict[str, Any]
+    ) -> str:
+        """
+        Generate text using the Llama model.
+
+        Concurrent calls with the same model, prompt and params share a single
+        Ollama request, also across worker processes.
+
+        Args:
+            prompt: The prompt to complete
+            cache_endpoint: Response cache namespace, selects the cache TTL
+            bypass_cache: Skip the cache lookup (the fresh result is still stored)
+            priority: Scheduler priority class ('slack', 'ask', 'summarize' or 'batch')
+            **kwargs: Generation parameters overriding the defaults
+        """
+        logger.debug("Generating response for prompt: %.100s...", prompt)
+
+        params = {**self.default_params, **kwargs}
+        cache_key = make_cache_key(self.model, prompt, params)
+        cached = await self.cache.get(cache_key, endpoint=cache_endpoint, bypass=bypass_cache)
+        if cached is not None:
+            logger.info("Serving response from cache")
+            return cached
+
+        # One deadline for the whole request, including the waits before Ollama is called
+        with deadline_scope(self.request_timeout(priority)):
+            try:
+                return await self.inflight.do(
+                    cache_key,
+                    lambda: self._generate_uncached(prompt, params, cache_key, cache_endpoint, priority, bypass_cache)
+                )
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to generate response: {str(e)}")
+                raise Exception(f"Failed to generate response: {str(e)}")
+
+    def request_timeout(self, priority: str) -> float:
+        """
+        End-to-end deadline of one request, from entering generate until the
+        answer: waiting for a slot, for another worker and all attempts. Batch
+        work may additionally queue for its class's max wait.
+        """
+        if priority in self.scheduler.max_waits:
+            return self.request_deadline + self.scheduler.max_waits[priority]
+        return self.request_deadline
+
+    async def _claim_generation(self, cache_key: str, cache_endpoint: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Make sure only one worker process generates a given uncached prompt.
+
+        Returns the lease to release once the result is cached, or the result
+        another worker cached while this one waited. Waits at most until the
+        request deadline.
+        """
+        if shared_state is None or not self.cache.db_path or self.cache.ttl_for(cache_endpoint) <= 0:
+            return None, None
+        name = f"generate:{cache_key}"
+        deadline = current_deadline() or new_deadline(self.request_deadline)
+        delay = shared_state.poll_interval
+        with STAGE_LATENCY.time(stage="peer_generation_wait"):
+            while True:
+                holder = await shared_state.try_acquire(name)
+                # Checked after the lease, since a finished peer caches before releasing it
+                try:
+                    cached = await self.cache.peek(cache_key)
+                except BaseException:
+                    if holder is not None:
+                        await shared_state.release(name, holder)
+                    raise
+                if cached is not None:
+                    if holder is not None:
+                        await shared_state.release(name, holder)
+                    logger.info("Serving response generated by another worker")
+                    return None, cached
+                if holder is not None:
+                    return holder, None
+                if deadline.remaining() < self.min_attempt_time:
+                    raise DeadlineExceededError("Deadline exceeded while another worker generated the same prompt")
+                await asyncio.sleep(min(delay, deadline.remaining()))
+                delay = min(delay * 2, shared_state.poll_interval * 10)
+
+    async def _generate_uncached(
+        self,
+        prompt: str,
+        params: Dict[str, Any],
+        cache_key: str,
+        cache_endpoint: str,
+        priority: str,
+        bypass_cache: bool = False
+    ) -> str:
+        """
+        Run one generation against Ollama and store the result in the cache.
+
+        With ``bypass_cache`` the response cache is not read at all, so the
+        result is never one another worker stored.
+        """
+        if bypass_cache:
+            return await self._generate_and_store(prompt, params, cache_key, cache_endpoint, priority)
+        holder, cached = await self._claim_generation(cache_key, cache_endpoint)
+        if cached is not None:
+            return cached
+        try:
+            return await self._generate_and_store(prompt, params, cache_key, cache_endpoint, priority)
+        finally:
+            if holder is not None:
+                await shared_state.release(f"generate:{cache_key}", holder)
+
+    async def _generate_and_store(
+        self,
+        prompt: str,
+        params: Dict[str, Any],
+        cache_key: str,
+        cache_endpoint: str,
+        priority: str
+    ) -> str:
+        # Check if the model is available (cached)
+        with STAGE_LATENCY.time(stage="model_check"):
+            await self.models.ensure_available(self.model)
+
+        # Prepare the request with optimized parameters
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": params  # Defaults merged with per-call overrides
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        log_payload(logger, "Sending request with payload", payload)
+
+        # Hedge only short interactive prompts, where a second copy is cheap
+        hedge = (
+            self.hedge_enabled
+            and priority in ("slack", "ask")
+            and len(prompt) <= self.hedge_max_prompt_chars
         )
-        
+
+        # Make the request once the scheduler admits it
+        try:
+            async with self.scheduler.slot(priority, current_deadline()):
+                with STAGE_LATENCY.time(stage="generate"):
+                    response_data = await self._make_request("api/generate", payload, hedge=hedge)
+        except ModelNotFoundError:
+            self.models.invalidate(self.model)
+            raise
+
+        if not response_data.get("response"):
+            raise Exception(f"No response in output: {response_data}")
+
+        record_ollama_timings(response_data)
+        logger.info("Successfully generated response")
+        await self.cache.set(cache_key, response_data["response"], endpoint=cache_endpoint)
+        return response_data["response"]
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        cache_endpoint: str = "generate",
+        bypass_cache: bool = False,
+        final: Optional[Dict[str, Any]] = None,
+        priority: str = "ask",
+        context: Optional[List[int]] = None,
+        **kwargs: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Generate text using the Llama model, yielding tokens as Ollama streams them.
+
+        Args:
+            prompt: The prompt to complete
+            cache_endpoint: Response cache namespace, selects the cache TTL
+            bypass_cache: Skip the cache lookup (the full result is still stored)
+            final: Optional dict filled with Ollama's final ``done`` chunk, including
+                the ``context`` array that continues the conversation
+            priority: Scheduler priority class ('slack', 'ask', 'summarize' or 'batch')
+            context: ``context`` array from a previous turn; such turns are not cached
+            **kwargs: Generation parameters overriding the defaults
+
+        The request deadline covers the wait for a slot and the whole stream;
+        a stream still running when it passes fails with DeadlineExceededError.
+        """
+        logger.debug("Streaming response for prompt: %.100s...", prompt)
+        # Not set as the current deadline: the caller's context switches at every yield
+        deadline = new_deadline(self.request_timeout(priority))
+
+        params = {**self.default_params, **kwargs}
+        cache_key = make_cache_key(self.model, prompt, params)
+        # The answer to a follow-up depends on the whole conversation
+        use_cache = context is None
+        cached = await self.cache.get(cache_key, endpoint=cache_endpoint, bypass=bypass_cache or not use_cache)
+        if cached is not None:
+            logger.info("Serving streamed response from cache")
+            yield cached
+            return
+
+        with STAGE_LATENCY.time(stage="model_check"):
+            await self.models.ensure_available(self.model)
+
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "options": params
+        }
+        if context:
+            payload["context"] = list(context)
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        parts = []
+        client = http_clients.get("ollama")
+        # Only the wait for each chunk is bounded, not the whole completion
+        timeout = httpx.Timeout(30.0, read=30.0)
+        # The slot is held until the stream finishes
+        async with self.scheduler.slot(priority, deadline):
+            backend = self.backends.choose(self.model)
+            started = time.perf_counter()
+            UPSTREAM_IN_FLIGHT.inc(upstream="ollama")
+            try:
+                async with self.backends.track(backend), client.stream(
+                    "POST", f"{backend.url}/api/generate", json=payload, timeout=timeout
+                ) as response:
+                    if response.status_code >= 400:
+                        body = (await response.aread()).decode("utf-8", errors="replace")
+                        if response.status_code == 404 and "model" in body and "not found" in body:
+                            self.backends.mark_model_missing(backend, self.model)
+                            if not any(b.serves(self.model) for b in self.backends.backends):
+                                self.models.invalidate(self.model)
+                            UPSTREAM_REQUESTS.inc(upstream="ollama", outcome="model_not_found")
+                            raise ModelNotFoundError(body)
+                        raise Exception(f"Streaming request failed with status {response.status_code}: {body}")
+
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise Exception(f"Streaming generation failed: {chunk['error']}")
+                        token = chunk.get("response")
+                        if token:
+                            if not parts:
+                                STAGE_LATENCY.observe(time.perf_counter() - started, stage="first_token")
+                            parts.append(token)
+                            yield token
+                        if chunk.get("done"):
+                            record_ollama_timings(chunk)
+                            if final is not None:
+                                final.update(chunk)
+                            break
+                        if deadline.expired:
+                            raise DeadlineExceededError(
+                                f"Deadline exceeded after streaming {len(parts)} tokens"
+                            )
+                UPSTREAM_REQUESTS.inc(upstream="ollama", outcome="success")
+            except ModelNotFoundError:
+                raise
+            except Exception:
+                UPSTREAM_REQUESTS.inc(upstream="ollama", outcome="error")
+                raise
+            finally:
+                UPSTREAM_IN_FLIGHT.dec(upstream="ollama")
+                STAGE_LATENCY.observe(time.perf_counter() - started, stage="generate_stream")
+
+        text = "".join(parts)
+        if not text:
+            raise Exception("No response in streamed output")
+        logger.info("Successfully streamed response")
+        if use_cache:
+            await self.cache.set(cache_key, text, endpoint=cache_endpoint)
+
+    def _summary_prompt(self, text: str, max_length: int, min_length: int) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the summarization prompt and its generation parameters.
+        """
+        def build(content: str) -> str:
+            return (
+                "You are a summarization expert. Create clear and concise summaries "
+                "that capture the main points while being easy to understand.\n\n"
+                f"Please summarize the following text in {min_length}-{max_length} words:\n\n"
+                f"{content}\n\n"
+                "Summary:"
+            )
+
+        # Adjust response length to the desired summary length
+        prompt, sizing = self.budget.fit(build, text, num_predict=max(100, max_length * 8))
+
         # Add parameters to optimize for summarization
         params = self.default_params.copy()
-        params.update({
-            "num_predict": max(100, max_length * 8),  # Adjust based on desired length
-            "temperature": 0.5  # More focused for summarization
-        })
-        
-        return await self.generate(prompt, **params)
+        params.update(sizing)
+        params["temperature"] = 0.5  # More focused for summarization
+        return prompt, params
 
-    async def answer_question(
+    def _question_prompt(
         self,
         question: str,
-        context: Optional[str] = None,
-        format: str = "detailed"
-    ) -> str:
+        context: Optional[str],
+        format: str,
+        previous: Optional[Tuple[str, str]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
         """
-        Answer a question using the Llama model.
-
-        Args:
-            question: The question to answer
-            context: Optional context to help answer the question
-            format: Response format ('detailed' or 'concise')
+        Build the question answering prompt and its generation parameters.
         """
         # Add a system prompt to encourage concise responses
         system_prompt = (
             "You are a helpful AI assistant. Provide clear, accurate, and concise answers. "
             "Focus on the most important information and avoid unnecessary details."
         )
-        
-        if context:
-            prompt = (
-                f"{system_prompt}\n\n"
-                f"Context: {context}\n\n"
-                f"Question: {question}\n\n"
-                f"Please provide a {'detailed' if format == 'detailed' else 'brief'} answer "
-                f"focusing on the most relevant information."
-            )
-        else:
-            prompt = (
+
+        if previous:
+            # The previous exchange goes ahead of any other context
+            earlier = f"Previous question: {previous[0]}\nPrevious answer: {previous[1]}"
+            context = f"{earlier}\n\n{context}" if context else earlier
+
+        def build(content: str) -> str:
+            if content:
+                return (
+                    f"{system_prompt}\n\n"
+                    f"Context: {content}\n\n"
+                    f"Question: {question}\n\n"
+                    f"Please provide a {'detailed' if format == 'detailed' else 'brief'} answer "
+                    f"focusing on the most relevant information."
+                )
+            return (
                 f"{system_prompt}\n\n"
                 f"Question: {question}\n\n"
                 f"Please provide a {'detailed' if format == 'detailed' else 'brief'} answer "
                 f"focusing on the most relevant information."
             )
 
+        # Even shorter responses for concise format
+        num_predict = 128 if format == "concise" else self.default_params["num_predict"]
+        # Keep the context segments most relevant to the question
+        prompt, sizing = self.budget.fit(build, context or "", num_predict=num_predict, query=question)
+
         # Add parameters to optimize for shorter responses
         params = self.default_params.copy()
+        params.update(sizing)
+        if format == "concise":
+            params["temperature"] = 0.5  # More focused responses
+        return prompt, params
+
+    def _followup_prompt(self, question: str, format: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the prompt for a follow-up turn that continues from an Ollama context.
+
+        The system prompt and earlier turns are already encoded in the context.
+        """
+        prompt = (
+            f"Follow-up question: {question}\n\n"
+            f"Please provide a {'detailed' if format == 'detailed' else 'brief'} answer."
+        )
+        params = self.default_params.copy()
+        # A fixed size keeps the model runner (and its prompt cache) loaded between turns
+        params["num_ctx"] = self.budget.max_ctx
         if format == "concise":
-            params.update({
-                "num_predict": 128,  # Even shorter responses for concise format
-                "temperature": 0.5  # More focused responses
-            })
+            params.update({"num_predict": 128, "temperature": 0.5})
+        return prompt, params
+
+    def _partial_summary_prompt(self, chunk: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the prompt for summarizing one section of a longer document.
+        """
+        def build(content: str) -> str:
+            return (
+                "You are a summarization expert. The text below is one section of a longer document.\n\n"
+                f"Summarize this section in at most {self.summary_partial_words} words, "
+                "keeping names, numbers and key facts:\n\n"
+                f"{content}\n\n"
+                "Summary:"
+            )
+
+        prompt, sizing = self.budget.fit(build, chunk, num_predict=self.summary_partial_words * 2)
+        params = self.default_params.copy()
+        params.update(sizing)
+        params["temperature"] = 0.5
+        return prompt, params
+
+    def _summary_chunk_budget(self, max_length: int = 150, min_length: int = 50) -> int:
+        """
+        Tokens of source text that fit in one summarization prompt.
+
+        Both the per-chunk prompt and the final summary prompt must fit, so
+        condensed text is never trimmed by the prompt budget afterwards.
+        """
+        if self.summary_chunk_tokens:
+            return self.summary_chunk_tokens
+        partial_prompt, partial_params = self._partial_summary_prompt("")
+        final_prompt, final_params = self._summary_prompt("", max_length, min_length)
+        return max(128, min(
+            self.budget.available(partial_prompt, partial_params["num_predict"]),
+            self.budget.available(final_prompt, final_params["num_predict"])
+        ))
+
+    def needs_chunking(self, text: str, max_length: int = 150, min_length: int = 50) -> bool:
+        return estimate_tokens(text) > self._summary_chunk_budget(max_length, min_length)
+
+    async def _condense(
+        self,
+        text: str,
+        bypass_cache: bool = False,
+        priority: str = "summarize",
+        max_length: int = 150,
+        min_length: int = 50
+    ) -> str:
+        """
+        Map-reduce text until it fits in a single summarization prompt.
+
+        Each round splits the text on paragraph/sentence boundaries, summarizes
+        the chunks concurrently and joins the partial summaries.
+        """
+        budget = self._summary_chunk_budget(max_length, min_length)
+        semaphore = asyncio.Semaphore(self.summary_map_concurrency)
+
+        async def summarize_chunk(chunk: str) -> str:
+            prompt, params = self._partial_summary_prompt(chunk)
+            async with semaphore:
+                return await self.generate(
+                    prompt, cache_endpoint="summarize", bypass_cache=bypass_cache, priority=priority, **params
+                )
+
+        depth = 0
+        while estimate_tokens(text) > budget and depth < self.summary_max_reduce_depth:
+            chunks = split_text(text, budget)
+            logger.info(f"Summarizing {len(chunks)} chunks (reduce round {depth + 1})")
+            partials = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+            text = "\n\n".join(p.strip() for p in partials)
+            depth += 1
+        return text
 
-        return await self.generate(prompt, **params)
+    async def summarize(
+        self,
+        text: str,
+        max_length: int = 150,
+        min_length: int = 50,
+        bypass_cache: bool = False,
+        mode: str = "auto",
+        priority: str = "summarize"
+    ) -> str:
+        """
+        Summarize the given text in a concise manner.
+
+        Args:
+            text: The text to summarize
+            max_length: Maximum summary length in words
+            min_length: Minimum summary length in words
+            bypass_cache: Skip the response cache lookup
+            mode: 'single' sends the whole text in one prompt, 'chunked' uses
+                map-reduce, 'auto' chunks only when the text does not fit
+            priority: Scheduler priority class ('summarize' or 'batch')
+        """
+        if mode == "chunked" or (mode == "auto" and self.needs_chunking(text, max_length, min_length)):
+            text = await self._condense(
+                text, bypass_cache=bypass_cache, priority=priority, max_length=max_length, min_length=min_length
+            )
+        prompt, params = self._summary_prompt(text, max_length, min_length)
+        return await self.generate(
+            prompt, cache_endpoint="summarize", bypass_cache=bypass_cache, priority=priority, **params
+        )
+
+    async def summarize_stream(
+        self,
+        text: str,
+        max_length: int = 150,
+        min_length: int = 50,
+        bypass_cache: bool = False,
+        mode: str = "auto"
+    ) -> AsyncIterator[str]:
+        """
+        Stream a summary of the given text token by token.
+
+        Long texts are condensed with map-reduce first; only the final
+        summary is streamed.
+        """
+        if mode == "chunked" or (mode == "auto" and self.needs_chunking(text, max_length, min_length)):
+            text = await self._condense(text, bypass_cache=bypass_cache, max_length=max_length, min_length=min_length)
+        prompt, params = self._summary_prompt(text, max_length, min_length)
+        async for token in self.generate_stream(
+            prompt, cache_endpoint="summarize", bypass_cache=bypass_cache, priority="summarize", **params
+        ):
+            yield token
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed text with the embedding model; None if it is unavailable.
+
+        Embeddings take a scheduler slot at the lowest priority and give up
+        quickly when none frees up, since they only serve the semantic cache.
+        """
+        if time.monotonic() < self._embed_unavailable_until:
+            return None
+        try:
+            async with self.scheduler.slot("embed", current_deadline()):
+                with STAGE_LATENCY.time(stage="embed"):
+                    data = await self._make_request(
+                        "api/embeddings", {"model": self.embed_model, "prompt": text}, retries=1
+                    )
+        except ModelNotFoundError as e:
+            self._embed_unavailable_until = time.monotonic() + self.embed_retry_interval
+            logger.warning(f"Skipping the semantic cache for {self.embed_retry_interval:.0f}s: {str(e)}")
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to embed question for the semantic cache: {str(e)}")
+            return None
+        return data.get("embedding") or None
+
+    async def _semantic_lookup(
+        self,
+        question: str,
+        format: str,
+        scope: str,
+        bypass_cache: bool
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
+        """
+        Embed the question and look for a cached answer to a paraphrase of it.
+
+        Returns the embedding (for storing the new answer) and the cached answer, if any.
+        """
+        vector = await self._embed(question)
+        if vector is None or bypass_cache:
+            return vector, None
+        await self.semantic_cache.refresh()
+        return vector, self.semantic_cache.lookup(vector, self._semantic_scope(format, scope))
+
+    def _semantic_scope(self, format: str, scope: str) -> str:
+        # Answers differ by model and format, so those are part of the scope
+        return f"{self.model}|{format}|{scope}"
+
+    async def answer_question(
+        self,
+        question: str,
+        context: Optional[str] = None,
+        format: str = "detailed",
+        bypass_cache: bool = False,
+        priority: str = "ask",
+        scope: str = "global"
+    ) -> str:
+        """
+        Answer a question using the Llama model.
+
+        Args:
+            question: The question to answer
+            context: Optional context to help answer the question
+            format: Response format ('detailed' or 'concise')
+            bypass_cache: Skip the response cache lookups
+            priority: Scheduler priority class ('slack', 'ask', 'summarize' or 'batch')
+            scope: Semantic cache scope, e.g. a Slack channel
+        """
+        # Only standalone questions are answered from the semantic cache
+        vector = None
+        if self.semantic_cache is not None and not context:
+            vector, answer = await self._semantic_lookup(question, format, scope, bypass_cache)
+            if answer is not None:
+                return answer
+
+        prompt, params = self._question_prompt(question, context, format)
+        answer = await self.generate(
+            prompt, cache_endpoint="answer", bypass_cache=bypass_cache, priority=priority, **params
+        )
+        if vector is not None:
+            await self.semantic_cache.store(vector, question, answer, self._semantic_scope(format, scope))
+        return answer
+
+    async def answer_question_stream(
+        self,
+        question: str,
+        context: Optional[str] = None,
+        format: str = "detailed",
+        bypass_cache: bool = False,
+        priority: str = "ask",
+        final: Optional[Dict[str, Any]] = None,
+        history: Optional[List[int]] = None,
+        previous: Optional[Tuple[str, str]] = None,
+        scope: str = "global"
+    ) -> AsyncIterator[str]:
+        """
+        Stream an answer to a question token by token.
+
+        Args:
+            question: The question to answer
+            context: Optional context to help answer the question
+            format: Response format ('detailed' or 'concise')
+            bypass_cache: Skip the response cache lookups
+            priority: Scheduler priority class ('slack', 'ask', 'summarize' or 'batch')
+            final: Optional dict filled with Ollama's final chunk (see generate_stream)
+            history: Ollama ``context`` array of the conversation so far
+            previous: The last question and answer, when no history is available
+            scope: Semantic cache scope, e.g. a Slack channel
+        """
+        # Only standalone questions are answered from the semantic cache
+        vector = None
+        if self.semantic_cache is not None and not (context or history or previous):
+            vector, answer = await self._semantic_lookup(question, format, scope, bypass_cache)
+            if answer is not None:
+                yield answer
+                return
+
+        if history:
+            prompt, params = self._followup_prompt(question, format)
+        else:
+            prompt, params = self._question_prompt(question, context, format, previous)
+        parts = []
+        async for token in self.generate_stream(
+            prompt,
+            cache_endpoint="answer",
+            bypass_cache=bypass_cache,
+            final=final,
+            priority=priority,
+            context=history,
+            **params
+        ):
+            parts.append(token)
+            yield token
+        if vector is not None:
+            await self.semantic_cache.store(vector, question, "".join(parts), self._semantic_scope(format, scope))
 
 # Create a global instance
 llama = LlamaAPI()
@@ -1,17 +1,102 @@
 # app/main.py
 
-from fastapi import FastAPI
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
 from .summarizer import router as summarizer_router
 from .integrations.slack_test import router as slack_test_router
 from .integrations.llama_test import router as llama_test_router
 from .integrations.questions import router as questions_router
 from .integrations.slack_events import router as slack_events_router
+from .integrations.slack_events import event_workers, event_stats
+from .integrations.slack import slack_client, slack_delivery
+from .handlers.mcp_handler import router as mcp_router
+from .llama import llama
+from .search_index import activity_index
+from .jobs import job_queue, router as jobs_router
+from .startup import startup, process_started_at
+from .utils.http import http_clients
+from .utils.config import get_settings
+from .utils.shared_state import process_alive, shared_state, WEB_CONCURRENCY
+from .utils.logs import configure_logging, start_request, REQUEST_ID_HEADER
+from .utils.metrics import registry, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+
+
+# Once per process, before anything logs from a request
+configure_logging(get_settings().log_level)
+logger = logging.getLogger(__name__)
+
+# With several workers: seconds between publishing this worker's metrics for
+# /metrics in the others, and how long an exited worker's counts stay in the totals
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "15"))
+METRICS_RETENTION = 7 * 86400
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown.
+
+    Only background tasks are started here so the server accepts
+    connections right away; slower initialization runs in the background
+    and gates ``/ready``.
+    """
+    started = time.perf_counter()
+    startup.record("boot", time.time() - process_started_at())
+    event_workers.start()
+    llama.backends.start()
+    if os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true":
+        activity_index.start()
+    await job_queue.start()
+    steps = [("semantic_cache", _load_semantic_cache)]
+    if os.getenv("OLLAMA_WARMUP", "false").lower() == "true":
+        steps.append(("warm_up", llama.warm_up))
+    startup.begin(steps)
+    metrics_publisher = asyncio.create_task(_publish_metrics_loop()) if shared_state is not None else None
+    startup.record("lifespan", time.perf_counter() - started)
+    yield
+    if metrics_publisher is not None:
+        metrics_publisher.cancel()
+        await asyncio.gather(metrics_publisher, return_exceptions=True)
+    await startup.stop()
+    await job_queue.stop()
+    await activity_index.stop()
+    await llama.backends.stop()
+    await event_workers.stop()
+    # Let queued Slack posts go out before the connections close
+    await slack_delivery.stop(timeout=float(os.getenv("SLACK_DELIVERY_DRAIN_TIMEOUT", "5")))
+    # Release pooled upstream connections
+    await http_clients.aclose()
+    llama.cache.close()
+    if llama.semantic_cache is not None:
+        await llama.semantic_cache.save()
+    # Hand any leases this worker still holds back to the others
+    if shared_state is not None:
+        # Keep this worker's final counts in the machine-wide totals
+        await _publish_metrics()
+        shared_state.close()
+
+
+async def _load_semantic_cache() -> None:
+    await asyncio.to_thread(llama.load_semantic_cache)
+    if llama.semantic_cache is not None:
+        # Catch up on the entries other workers have shared
+        await llama.semantic_cache.refresh()
+
 
 app = FastAPI(
     title="WhatsBot",
     description="A Slack bot that can answer questions and summarize text.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -23,6 +108,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Record latency and in-flight requests per route template.
+
+    For streaming responses the latency covers the time until the response starts.
+    """
+    route = _route_template(request)
+    started = time.perf_counter()
+    status = "500"
+    with REQUESTS_IN_FLIGHT.track_inprogress(route=route):
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started, method=request.method, route=route, status=status
+            )
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """
+    Tag logs and outbound calls with the caller's X-Request-ID, or a new one.
+    """
+    request_id = start_request(request.headers.get(REQUEST_ID_HEADER))
+    response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+def _route_template(request: Request) -> str:
+    # Use the path template so metric labels stay bounded
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
 # Include summarizer routes
 app.include_router(
     summarizer_router,
@@ -44,6 +167,20 @@ app.include_router(
     tags=["slack"]
 )
 
+# Include background job routes
+app.include_router(
+    jobs_router,
+    prefix="/api/v1/jobs",
+    tags=["jobs"]
+)
+
+# Include MCP processing routes
+app.include_router(
+    mcp_router,
+    prefix="/api/v1/mcp",
+    tags=["mcp"]
+)
+
 # Include Slack test routes
 app.include_router(
     slack_test_router,
@@ -68,3 +205,146 @@ async def root():
         "service": "whatsbot",
         "version": "1.0.0"
     }
+
+@app.get("/ready", tags=["health"])
+async def ready():
+    """
+    Readiness check: 503 until startup has finished and while no Ollama server is available.
+
+    Unlike ``/``, which only shows the process is alive, this is the check to
+    route traffic on.
+    """
+    checks = {
+        "initialized": startup.ready,
+        "ollama": any(backend.available() for backend in llama.backends.backends),
+        "slack_configured": slack_client.configured
+    }
+    is_ready = checks["initialized"] and checks["ollama"]
+    return JSONResponse(
+        {"status": "ready" if is_ready else "not_ready", "checks": checks, "startup": startup.stats()},
+        status_code=200 if is_ready else 503
+    )
+
+@app.get("/stats", tags=["health"])
+async def stats():
+    """
+    Runtime statistics for the shared components.
+
+    With several worker processes, everything except ``shared_state`` and
+    ``jobs`` describes the worker that answered.
+    """
+    return {
+        "worker": {"pid": os.getpid(), "workers": WEB_CONCURRENCY},
+        # Reads the shared database, which other workers may be holding locked
+        "shared_state": await asyncio.to_thread(shared_state.stats) if shared_state is not None else None,
+        "http_pool": http_clients.stats(),
+        "response_cache": await llama.cache.stats(),
+        "semantic_cache": llama.semantic_cache.stats() if llama.semantic_cache is not None else None,
+        "coalescing": llama.inflight.stats(),
+        "scheduler": llama.scheduler.stats(),
+        "prompt_budget": llama.budget.stats(),
+        "ollama_backends": llama.backends.stats(),
+        "slack_events": event_stats(),
+        "slack_delivery": slack_delivery.stats(),
+        "search_index": activity_index.stats(),
+        "jobs": await job_queue.stats(),
+        "startup": startup.stats()
+    }
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics in the text exposition format.
+    """
+    if shared_state is None:
+        _collect_component_metrics()
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+    # Any worker may get the scrape, so answer for all of them
+    await _publish_metrics()
+    snapshots: Dict[str, Any] = {}
+    live = []
+    for token, snapshot in (await shared_state.values("metrics")).items():
+        worker = token
+        if process_alive(token):
+            # Tokens are boot:pid:start; running workers are labelled by PID
+            worker = token.split(":")[1]
+            live.append(worker)
+        snapshots[worker] = json.loads(snapshot)
+    return PlainTextResponse(registry.render_merged(snapshots, live), media_type="text/plain; version=0.0.4")
+
+async def _publish_metrics() -> None:
+    """
+    Store this worker's metrics in the shared state for /metrics in any worker.
+    """
+    try:
+        _collect_component_metrics(await asyncio.to_thread(shared_state.stats))
+        await shared_state.set_value(
+            "metrics", shared_state.owner, json.dumps(registry.snapshot()),
+            ttl=METRICS_RETENTION, max_entries=1000
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish metrics: {str(e)}")
+
+async def _publish_metrics_loop() -> None:
+    while True:
+        await asyncio.sleep(METRICS_PUBLISH_INTERVAL)
+        await _publish_metrics()
+
+def _collect_component_metrics(shared: Optional[Dict[str, Any]] = None):
+    """
+    Copy point-in-time state of the shared components into gauges.
+
+    ``shared`` is ``shared_state.stats()``, read off the event loop by the caller.
+    """
+    scheduler = llama.scheduler.stats()
+    SCHEDULER_ACTIVE.set(scheduler["active"])
+    for priority_class, queued in scheduler["queued"].items():
+        SCHEDULER_QUEUED.set(queued, priority_class=priority_class)
+    for event, value in llama.cache.counters.items():
+        CACHE_EVENTS.set(value, event=event)
+    for event, value in llama.inflight.counters.items():
+        COALESCING_EVENTS.set(value, event=event)
+    for upstream, pool in http_clients.stats().items():
+        for state in ("active", "idle", "queued"):
+            HTTP_POOL_CONNECTIONS.set(pool[state], upstream=upstream, state=state)
+    SLACK_EVENT_QUEUE.set(event_workers.stats()["queue_depth"])
+    SLACK_DELIVERY_QUEUE.set(slack_delivery.depth)
+    SLACK_DELIVERY_OLDEST.set(slack_delivery.oldest_lag())
+    for backend in llama.backends.stats():
+        BACKEND_HEALTHY.set(1 if backend["healthy"] else 0, backend=backend["url"])
+        BACKEND_OUTSTANDING.set(backend["outstanding"], backend=backend["url"])
+    SEARCH_INDEX_DOCUMENTS.set(len(activity_index.index))
+    for phase, seconds in startup.phases.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    if shared is not None:
+        leases = shared["leases"]
+        for name in ("ollama", "generate"):
+            SHARED_LEASES.set(leases.get(name, 0), name=name)
+
+SCHEDULER_ACTIVE = registry.gauge("whatsbot_llm_scheduler_active", "Generations currently holding a backend slot")
+SCHEDULER_QUEUED = registry.gauge(
+    "whatsbot_llm_scheduler_queued", "Requests waiting for a backend slot", ("priority_class",)
+)
+CACHE_EVENTS = registry.gauge("whatsbot_response_cache_events", "Response cache counters since start", ("event",))
+COALESCING_EVENTS = registry.gauge(
+    "whatsbot_llm_coalescing_events", "Executed vs coalesced LLM calls since start", ("event",)
+)
+HTTP_POOL_CONNECTIONS = registry.gauge(
+    "whatsbot_http_pool_connections", "Upstream connection pool usage", ("upstream", "state")
+)
+SLACK_EVENT_QUEUE = registry.gauge("whatsbot_slack_event_queue_depth", "Slack events waiting for a worker")
+SLACK_DELIVERY_QUEUE = registry.gauge("whatsbot_slack_delivery_queue_depth", "Outbound Slack messages waiting to be sent")
+SLACK_DELIVERY_OLDEST = registry.gauge(
+    "whatsbot_slack_delivery_oldest_seconds", "Age of the oldest outbound Slack message still queued"
+)
+BACKEND_HEALTHY = registry.gauge("whatsbot_ollama_backend_healthy", "1 if the Ollama backend is in rotation", ("backend",))
+BACKEND_OUTSTANDING = registry.gauge(
+    "whatsbot_ollama_backend_outstanding", "Requests outstanding per Ollama backend", ("backend",)
+)
+SEARCH_INDEX_DOCUMENTS = registry.gauge("whatsbot_search_index_documents", "Activities in the local search index")
+STARTUP_SECONDS = registry.gauge(
+    "whatsbot_startup_seconds", "Duration of each startup phase; 'process' is process start until ready", ("phase",)
+)
+SHARED_LEASES = registry.gauge(
+    "whatsbot_shared_leases", "Leases held across all worker processes ('ollama' slots, 'generate' prompts)", ("name",)
+)
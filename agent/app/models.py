@@ -20,6 +20,13 @@ class MCPResponse(BaseModel):
     activities: Optional[List[Dict[str, Any]]] = Field(default=None, description="List of planned activities (if any)")
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="Additional metadata")
 
+class MCPBatchRequest(BaseModel):
+    """
+    Model for batch MCP processing requests.
+    """
+    messages: List[MCPMessage] = Field(..., description="Messages to process")
+    concurrency: Optional[int] = Field(None, description="Maximum messages processed at once")
+
 class SearchResult(BaseModel):
     """
     Model for search result entries.
@@ -37,6 +44,23 @@ class SummarizationRequest(BaseModel):
     max_length: int = Field(150, description="Maximum length of the summary in words")
     min_length: int = Field(50, description="Minimum length of the summary in words")
     format: str = Field("paragraph", description="Format of the summary (paragraph, bullets, etc.)")
+    bypass_cache: bool = Field(False, description="Skip the response cache and generate a fresh summary")
+    mode: str = Field(
+        "auto",
+        description="Summarization mode: single prompt ('single'), map-reduce over chunks ('chunked'), "
+                    "or chunk only when the text exceeds the context window ('auto')"
+    )
+
+class BatchSummarizationRequest(BaseModel):
+    """
+    Model for batch summarization requests.
+
+    Items are validated one by one so a malformed item only fails itself.
+    """
+    items: List[Dict[str, Any]] = Field(..., description="Summarization requests, each shaped like SummarizationRequest")
+    concurrency: Optional[int] = Field(None, description="Maximum items summarized at once")
+    post_to_slack: bool = Field(False, description="Post the summaries to Slack in batched digest messages")
+    slack_channel: str = Field("all-whatsbot", description="Slack channel for the digest messages")
 
 class SummarizationResponse(BaseModel):
     """
@@ -61,6 +85,7 @@ class QuestionRequest(BaseModel):
     question: str = Field(..., description="The question to be answered")
     context: Optional[str] = Field(None, description="Optional context to help answer the question")
     format: str = Field("detailed", description="Format of the answer (detailed or concise)")
+    bypass_cache: bool = Field(False, description="Skip the response cache and generate a fresh answer")
 
 class QuestionResponse(BaseModel):
     """
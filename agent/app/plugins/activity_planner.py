@@ -1,16 +1,61 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+from .schedule_optimizer import ScheduleOptimizer
+from .recommender import ActivityRecommender
 
 class ActivityPlanner:
-    def __init__(self):
+    def __init__(
+        self,
+        optimizer: Optional[ScheduleOptimizer] = None,
+        recommender: Optional[ActivityRecommender] = None
+    ):
         self.activities = []
+        self.optimizer = optimizer or ScheduleOptimizer()
+        self.recommender = recommender or ActivityRecommender()
 
-    def suggest_activities(self, interests: List[str], duration: int, location: str) -> List[Dict[str, Any]]:
+    def load_catalog(self, activities: List[Dict[str, Any]]) -> None:
+        """
+        Set the activity catalog suggestions are ranked from.
+
+        Catalog features are precomputed here and reused by every
+        suggestion until the catalog is loaded again.
+        """
+        self.activities = activities
+        self.recommender.load_catalog(activities)
+
+    def suggest_activities(
+        self,
+        interests: List[str],
+        duration: int,
+        location: str,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
         """
         Suggest activities based on user interests, available duration, and location.
         """
-        # This is a placeholder implementation
-        # In a real application, this would integrate with a recommendation engine
+        return self.suggest_activities_batch(
+            [{"interests": interests, "duration": duration, "location": location}], limit=limit
+        )[0]
+
+    def suggest_activities_batch(self, users: List[Dict[str, Any]], limit: int = 10) -> List[List[Dict[str, Any]]]:
+        """
+        Suggest activities for many users in one pass over the catalog.
+
+        Each user is a dict with ``interests``, ``duration`` and ``location``.
+        Suggestions are catalog entries with ``confidence`` set to their score.
+        """
+        if not self.activities:
+            return [
+                self._placeholder_suggestions(user["interests"], user["duration"], user["location"])
+                for user in users
+            ]
+        return [
+            [{**self.activities[index], "confidence": round(score, 4)} for index, score in ranked]
+            for ranked in self.recommender.recommend(users, limit=limit)
+        ]
+
+    def _placeholder_suggestions(self, interests: List[str], duration: int, location: str) -> List[Dict[str, Any]]:
+        # Without a catalog there is nothing to rank; echo one suggestion per interest
         suggested = []
         for interest in interests:
             suggested.append({
@@ -22,9 +67,17 @@ class ActivityPlanner:
             })
         return suggested
 
-    def optimize_schedule(self, activities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def optimize_schedule(
+        self,
+        activities: List[Dict[str, Any]],
+        start: Optional[datetime] = None,
+        budget_minutes: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
         """
         Optimize the schedule of activities based on various constraints.
+
+        Chooses the subset with the highest total priority x confidence that
+        respects time windows, durations, travel between locations and the
+        time budget, ordered by ``start_time``. See ScheduleOptimizer.
         """
-        # Placeholder for schedule optimization logic
-        return sorted(activities, key=lambda x: x.get("recommended_time", datetime.max)) 
\ No newline at end of file
+        return self.optimizer.optimize(activities, start=start, budget_minutes=budget_minutes) 
\ No newline at end of file
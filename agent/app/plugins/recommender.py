@@ -0,0 +1,251 @@
+"""
+Activity recommendation for ActivityPlanner.
+
+Ranks a catalog of activities for one or many users at once. Catalog
+features are computed once per catalog and kept as arrays:
+
+    interests  term postings (type, category, tags, title) with L2-normalized
+               per-activity weights, gathered into a dense block holding only
+               the terms a batch of users asked for
+    duration   minutes per activity (NaN when unknown)
+    location   location ids plus latitude/longitude in radians (NaN when unknown)
+
+A batch of users is scored as a (users x activities) matrix, interest
+similarity plus duration fit plus location proximity, and the top k per
+user are picked with ``argpartition`` so only those k are sorted.
+
+User fields:
+    interests: List of interest strings
+    duration: Minutes available (activities longer than this are excluded)
+    location: Location name, or (lat, lon)
+"""
+
+import re
+import math
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+# Field weights for interest terms; title words count less than labels
+_TERM_FIELDS = (("type", 1.0), ("category", 1.0), ("tags", 1.0), ("title", 0.5))
+
+
+def _terms(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        value = " ".join(str(v) for v in value)
+    terms = []
+    for token in _TOKEN_RE.findall(str(value).lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def _coordinates(value: Any) -> Optional[Tuple[float, float]]:
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        try:
+            return float(value[0]), float(value[1])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class CatalogFeatures:
+    """
+    Precomputed array features for a catalog of activities.
+    """
+
+    def __init__(self, activities: List[Dict[str, Any]]):
+        self.activities = activities
+        size = len(activities)
+        self.terms: Dict[str, int] = {}
+        self.locations: Dict[str, int] = {}
+        self.duration = np.full(size, np.nan, dtype=np.float32)
+        self.location_ids = np.full(size, -1, dtype=np.int32)
+        self.lat = np.full(size, np.nan, dtype=np.float64)
+        self.lon = np.full(size, np.nan, dtype=np.float64)
+
+        term_ids: List[int] = []
+        item_ids: List[int] = []
+        weights: List[float] = []
+        for i, activity in enumerate(activities):
+            counts: Dict[int, float] = {}
+            for field, field_weight in _TERM_FIELDS:
+                for term in _terms(activity.get(field)):
+                    term_id = self.terms.setdefault(term, len(self.terms))
+                    counts[term_id] = counts.get(term_id, 0.0) + field_weight
+            if counts:
+                norm = math.sqrt(sum(w * w for w in counts.values()))
+                for term_id, w in counts.items():
+                    term_ids.append(term_id)
+                    item_ids.append(i)
+                    weights.append(w / norm)
+
+            if activity.get("duration"):
+                self.duration[i] = float(activity["duration"])
+            location = activity.get("location")
+            if isinstance(location, str) and location:
+                self.location_ids[i] = self.locations.setdefault(location.lower(), len(self.locations))
+            coordinates = _coordinates(activity.get("coordinates"))
+            if coordinates is not None:
+                self.lat[i], self.lon[i] = map(math.radians, coordinates)
+
+        # Postings grouped by term: term t owns items[ptr[t]:ptr[t + 1]]
+        term_array = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_array, kind="stable")
+        self.posting_items = np.asarray(item_ids, dtype=np.int32)[order]
+        self.posting_weights = np.asarray(weights, dtype=np.float32)[order]
+        self.posting_ptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_array, minlength=len(self.terms)), out=self.posting_ptr[1:])
+        self.has_coordinates = ~np.isnan(self.lat)
+
+    def __len__(self) -> int:
+        return len(self.activities)
+
+    def term_block(self, term_ids: Sequence[int]) -> np.ndarray:
+        """
+        Dense (activities x len(term_ids)) weights for the given terms.
+        """
+        block = np.zeros((len(self), len(term_ids)), dtype=np.float32)
+        for column, term_id in enumerate(term_ids):
+            start, end = self.posting_ptr[term_id], self.posting_ptr[term_id + 1]
+            block[self.posting_items[start:end], column] = self.posting_weights[start:end]
+        return block
+
+
+class ActivityRecommender:
+    def __init__(
+        self,
+        interest_weight: float = 0.6,
+        duration_weight: float = 0.2,
+        location_weight: float = 0.2,
+        distance_scale_km: float = 5.0,
+        batch_size: int = 256
+    ):
+        """
+        :param interest_weight: Weight of the interest similarity (0-1)
+        :param duration_weight: Weight of how well the duration fills the time available
+        :param location_weight: Weight of the location match or proximity
+        :param distance_scale_km: Distance at which proximity drops to 1/e
+        :param batch_size: Users scored per matrix block, bounding memory to batch_size x catalog
+        """
+        self.interest_weight = interest_weight
+        self.duration_weight = duration_weight
+        self.location_weight = location_weight
+        self.distance_scale_km = distance_scale_km
+        self.batch_size = batch_size
+        self.features: Optional[CatalogFeatures] = None
+
+    def load_catalog(self, activities: List[Dict[str, Any]]) -> None:
+        """
+        Precompute the catalog features; they are reused until the next load.
+        """
+        self.features = CatalogFeatures(activities)
+        logger.info(f"Recommender catalog loaded: {len(activities)} activities, {len(self.features.terms)} terms")
+
+    def recommend(self, users: List[Dict[str, Any]], limit: int = 10) -> List[List[Tuple[int, float]]]:
+        """
+        Top activities for each user.
+
+        :param users: Dicts with ``interests``, ``duration`` and ``location``
+        :param limit: Activities returned per user
+        :return: Per user, (catalog index, score) pairs with the best first
+        """
+        features = self.features
+        if features is None or len(features) == 0 or not users:
+            return [[] for _ in users]
+        results: List[List[Tuple[int, float]]] = []
+        for offset in range(0, len(users), self.batch_size):
+            scores = self._score(features, users[offset:offset + self.batch_size])
+            results.extend(self._top_k(scores, limit))
+        return results
+
+    def _score(self, features: CatalogFeatures, users: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Score matrix of shape (users, activities); -inf marks excluded activities.
+        """
+        count = len(users)
+
+        # Interests: only the terms this batch asked for become dense columns
+        columns: Dict[int, int] = {}
+        queries: List[Dict[int, float]] = []
+        for user in users:
+            weights: Dict[int, float] = {}
+            for term in _terms(user.get("interests")):
+                term_id = features.terms.get(term)
+                if term_id is not None:
+                    column = columns.setdefault(term_id, len(columns))
+                    weights[column] = weights.get(column, 0.0) + 1.0
+            queries.append(weights)
+        interest = np.zeros((count, len(features)), dtype=np.float32)
+        if columns:
+            query_matrix = np.zeros((count, len(columns)), dtype=np.float32)
+            for row, weights in enumerate(queries):
+                for column, w in weights.items():
+                    query_matrix[row, column] = w
+            norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+            query_matrix /= np.where(norms > 0, norms, 1.0)
+            interest = query_matrix @ features.term_block(list(columns)).T
+
+        # Duration: favour activities that fill the time available, drop those that exceed it
+        available = np.array(
+            [float(user.get("duration") or np.inf) for user in users], dtype=np.float32
+        )[:, None]
+        duration = features.duration[None, :]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fit = np.where(np.isfinite(available), duration / available, 0.5)
+        fit = np.where(np.isnan(duration), 0.5, fit)
+        too_long = duration > available
+
+        # Location: exact match by name, or exponential decay with distance
+        proximity = np.full((count, len(features)), 0.5, dtype=np.float32)
+        for row, user in enumerate(users):
+            location = user.get("location")
+            coordinates = _coordinates(location)
+            if coordinates is not None:
+                proximity[row] = self._proximity(features, coordinates)
+            elif isinstance(location, str) and location:
+                location_id = features.locations.get(location.lower(), -2)
+                proximity[row] = np.where(
+                    features.location_ids < 0, 0.5, (features.location_ids == location_id).astype(np.float32)
+                )
+
+        scores = self.interest_weight * interest + self.duration_weight * fit + self.location_weight * proximity
+        scores[too_long] = -np.inf
+        return scores
+
+    def _proximity(self, features: CatalogFeatures, coordinates: Tuple[float, float]) -> np.ndarray:
+        lat, lon = map(math.radians, coordinates)
+        proximity = np.full(len(features), 0.5, dtype=np.float32)
+        known = features.has_coordinates
+        h = (
+            np.sin((features.lat[known] - lat) / 2) ** 2
+            + math.cos(lat) * np.cos(features.lat[known]) * np.sin((features.lon[known] - lon) / 2) ** 2
+        )
+        distance = 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+        proximity[known] = np.exp(-distance / self.distance_scale_km)
+        return proximity
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, limit: int) -> List[List[Tuple[int, float]]]:
+        k = min(limit, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(int(i), float(s)) for i, s in zip(indices, values) if np.isfinite(s)]
+            for indices, values in zip(top, top_scores)
+        ]
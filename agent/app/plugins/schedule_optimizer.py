@@ -0,0 +1,304 @@
+"""
+Schedule optimization for ActivityPlanner.
+
+Picks and orders a subset of candidate activities that fits a time budget,
+maximizing the total weight (priority x confidence) subject to each
+activity's time window, its duration and the travel time between
+consecutive locations.
+
+When every activity has a fixed start time and no travel is involved (all
+at one location) the problem is weighted interval scheduling, solved
+exactly with a sorted-by-end dynamic program and binary search. Otherwise
+a greedy insertion heuristic builds a route, checking each insertion in
+O(1) with forward time slack, and a ruin-and-recreate local search improves
+it until the time limit.
+
+Activity fields (all optional except ``duration``):
+    duration: Minutes
+    earliest_start / latest_end: Time window (datetime)
+    recommended_time: Fixed start time when no window is given
+    priority, confidence: Multiplied into the weight (default 1.0 each)
+    location: Hashable location key
+    coordinates: (lat, lon), used for travel time when both ends have them
+"""
+
+import math
+import time
+import random
+import bisect
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+TravelTime = Callable[[Dict[str, Any], Dict[str, Any]], float]
+
+
+def _haversine_km(a: Sequence[float], b: Sequence[float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+class _Candidate:
+    __slots__ = ("index", "activity", "earliest", "latest", "duration", "weight", "location", "coordinates")
+
+    def __init__(self, index, activity, earliest, latest, duration, weight):
+        self.index = index
+        self.activity = activity
+        # Minutes from the schedule start; ``latest`` is the latest start
+        self.earliest = earliest
+        self.latest = latest
+        self.duration = duration
+        self.weight = weight
+        self.location: Optional[Hashable] = activity.get("location")
+        self.coordinates = activity.get("coordinates")
+
+
+class ScheduleOptimizer:
+    def __init__(
+        self,
+        travel_time: Optional[TravelTime] = None,
+        default_travel_minutes: float = 15.0,
+        travel_speed_kmh: float = 30.0,
+        time_limit: float = 0.5,
+        seed: int = 0
+    ):
+        """
+        :param travel_time: Minutes between two activities; overrides the defaults below
+        :param default_travel_minutes: Travel between different locations without coordinates
+        :param travel_speed_kmh: Speed used with coordinates
+        :param time_limit: Seconds the heuristic may spend improving a schedule
+        :param seed: Seed for the local search, so results are reproducible
+        """
+        self.travel_time = travel_time
+        self.default_travel_minutes = default_travel_minutes
+        self.travel_speed_kmh = travel_speed_kmh
+        self.time_limit = time_limit
+        self.seed = seed
+        self._travel_cache: Dict[Tuple[int, int], float] = {}
+        self.last_method: Optional[str] = None
+
+    def _travel(self, a: _Candidate, b: _Candidate) -> float:
+        key = (a.index, b.index)
+        cached = self._travel_cache.get(key)
+        if cached is not None:
+            return cached
+        if self.travel_time is not None:
+            minutes = self.travel_time(a.activity, b.activity)
+        elif a.location is not None and a.location == b.location:
+            minutes = 0.0
+        elif a.coordinates and b.coordinates:
+            minutes = _haversine_km(a.coordinates, b.coordinates) / self.travel_speed_kmh * 60
+        elif a.location is None and b.location is None:
+            minutes = 0.0
+        else:
+            minutes = self.default_travel_minutes
+        self._travel_cache[key] = minutes
+        return minutes
+
+    def optimize(
+        self,
+        activities: List[Dict[str, Any]],
+        start: Optional[datetime] = None,
+        budget_minutes: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Build a feasible schedule with the highest total weight found.
+
+        :param activities: Candidate activities
+        :param start: Start of the schedule (default: earliest window start, or now)
+        :param budget_minutes: Total time available from ``start`` (default: unbounded)
+        :return: Chosen activities in order, with ``start_time`` and ``end_time`` set
+        """
+        self._travel_cache = {}
+        if start is None:
+            starts = [
+                a.get("earliest_start") or a.get("recommended_time") for a in activities
+                if a.get("earliest_start") or a.get("recommended_time")
+            ]
+            start = min(starts) if starts else datetime.now()
+        horizon = budget_minutes if budget_minutes is not None else math.inf
+
+        candidates = self._candidates(activities, start, horizon)
+        if not candidates:
+            self.last_method = "empty"
+            return []
+
+        fixed = all(c.earliest == c.latest for c in candidates)
+        locations = {c.location for c in candidates}
+        if fixed and len(locations) == 1 and self._travel(candidates[0], candidates[0]) == 0:
+            self.last_method = "interval_scheduling"
+            route = self._weighted_interval_schedule(candidates)
+            starts = [c.earliest for c in route]
+        else:
+            self.last_method = "heuristic"
+            route, starts = self._heuristic(candidates, horizon)
+
+        return [
+            {
+                **c.activity,
+                "start_time": start + timedelta(minutes=s),
+                "end_time": start + timedelta(minutes=s + c.duration),
+            }
+            for c, s in zip(route, starts)
+        ]
+
+    def _candidates(self, activities: List[Dict[str, Any]], start: datetime, horizon: float) -> List[_Candidate]:
+        """
+        Convert activities to minute offsets, dropping those that cannot fit.
+        """
+        def offset(value: datetime) -> float:
+            return (value - start).total_seconds() / 60
+
+        candidates = []
+        for index, activity in enumerate(activities):
+            duration = float(activity.get("duration") or 0)
+            if duration <= 0:
+                continue
+            if activity.get("earliest_start") or activity.get("latest_end"):
+                earliest = max(0.0, offset(activity["earliest_start"])) if activity.get("earliest_start") else 0.0
+                latest_end = offset(activity["latest_end"]) if activity.get("latest_end") else horizon
+            elif activity.get("recommended_time"):
+                earliest = offset(activity["recommended_time"])
+                latest_end = earliest + duration
+            else:
+                earliest, latest_end = 0.0, horizon
+            latest = min(latest_end, horizon) - duration
+            if earliest < 0 or latest < earliest:
+                continue
+            weight = float(activity.get("priority", 1.0)) * float(activity.get("confidence", 1.0))
+            if weight <= 0:
+                continue
+            candidates.append(_Candidate(index, activity, earliest, latest, duration, weight))
+        return candidates
+
+    def _weighted_interval_schedule(self, candidates: List[_Candidate]) -> List[_Candidate]:
+        """
+        Exact maximum-weight set of non-overlapping fixed intervals, O(n log n).
+        """
+        ordered = sorted(candidates, key=lambda c: c.earliest + c.duration)
+        ends = [c.earliest + c.duration for c in ordered]
+        best = [0.0] * (len(ordered) + 1)
+        for i, c in enumerate(ordered):
+            # Last interval ending no later than this one starts
+            previous = bisect.bisect_right(ends, c.earliest, 0, i)
+            best[i + 1] = max(best[i], best[previous] + c.weight)
+
+        chosen = []
+        i = len(ordered)
+        while i > 0:
+            c = ordered[i - 1]
+            previous = bisect.bisect_right(ends, c.earliest, 0, i - 1)
+            if best[previous] + c.weight >= best[i] and best[i] != best[i - 1]:
+                chosen.append(c)
+                i = previous
+            else:
+                i -= 1
+        chosen.reverse()
+        return chosen
+
+    def _timeline(self, route: List[_Candidate], horizon: float) -> Tuple[List[float], List[float]]:
+        """
+        Start times and forward time slack for each position of a feasible route.
+
+        ``slack[k]`` is how far the start of ``route[k]`` can move later
+        without breaking a window further along the route or the horizon.
+        """
+        starts, waits = [], []
+        end = 0.0
+        for k, c in enumerate(route):
+            arrival = end + self._travel(route[k - 1], c) if k else c.earliest
+            begin = max(c.earliest, arrival)
+            starts.append(begin)
+            waits.append(begin - arrival)
+            end = begin + c.duration
+        slack = [0.0] * len(route)
+        following = horizon - end
+        for k in range(len(route) - 1, -1, -1):
+            slack[k] = min(route[k].latest - starts[k], following)
+            following = waits[k] + slack[k]
+        return starts, slack
+
+    def _best_insertion(
+        self,
+        route: List[_Candidate],
+        starts: List[float],
+        slack: List[float],
+        c: _Candidate,
+        horizon: float
+    ) -> Optional[Tuple[float, int]]:
+        """
+        Cheapest feasible position for ``c`` as (cost, position), or None.
+        """
+        best: Optional[Tuple[float, int]] = None
+        for p in range(len(route) + 1):
+            if p:
+                previous = route[p - 1]
+                begin = max(c.earliest, starts[p - 1] + previous.duration + self._travel(previous, c))
+            else:
+                begin = c.earliest
+            if begin > c.latest:
+                # Later positions only start later
+                break
+            end = begin + c.duration
+            if p < len(route):
+                following = route[p]
+                shifted = max(following.earliest, end + self._travel(c, following))
+                delay = shifted - starts[p]
+                if delay > slack[p]:
+                    continue
+                cost = max(0.0, delay)
+            else:
+                if end > horizon:
+                    continue
+                cost = end - (starts[-1] + route[-1].duration if route else 0.0)
+            if best is None or cost < best[0]:
+                best = (cost, p)
+        return best
+
+    def _fill(
+        self,
+        route: List[_Candidate],
+        order: List[_Candidate],
+        horizon: float
+    ) -> Tuple[List[_Candidate], List[float]]:
+        """
+        Greedily insert candidates (in the given order) wherever they fit best.
+        """
+        starts, slack = self._timeline(route, horizon)
+        scheduled = {c.index for c in route}
+        for c in order:
+            if c.index in scheduled:
+                continue
+            placement = self._best_insertion(route, starts, slack, c, horizon)
+            if placement is None:
+                continue
+            route.insert(placement[1], c)
+            scheduled.add(c.index)
+            starts, slack = self._timeline(route, horizon)
+        return route, starts
+
+    def _heuristic(self, candidates: List[_Candidate], horizon: float) -> Tuple[List[_Candidate], List[float]]:
+        rng = random.Random(self.seed)
+        average_travel = self.default_travel_minutes if len({c.location for c in candidates}) > 1 else 0.0
+
+        def density(c: _Candidate) -> float:
+            return c.weight / (c.duration + average_travel)
+
+        order = sorted(candidates, key=lambda c: (-density(c), c.earliest))
+        best_route, best_starts = self._fill([], order, horizon)
+        best_weight = sum(c.weight for c in best_route)
+
+        deadline = time.perf_counter() + self.time_limit
+        while best_route and time.perf_counter() < deadline:
+            # Ruin: drop a few scheduled activities; recreate with a perturbed order
+            route = list(best_route)
+            for _ in range(min(len(route), rng.randint(1, 3))):
+                route.pop(rng.randrange(len(route)))
+            noisy = sorted(candidates, key=lambda c: -density(c) * rng.uniform(0.7, 1.3))
+            route, starts = self._fill(route, noisy, horizon)
+            weight = sum(c.weight for c in route)
+            span = starts[-1] + route[-1].duration if route else 0.0
+            best_span = best_starts[-1] + best_route[-1].duration
+            if weight > best_weight or (weight == best_weight and span < best_span):
+                best_route, best_starts, best_weight = route, starts, weight
+        return best_route, best_starts
@@ -0,0 +1,140 @@
+"""
+Fit prompts to the model's context window.
+
+Every prompt is built from a fixed template plus one variable part (the text
+to summarize or the context for a question). The variable part is trimmed,
+or for questions ranked by relevance, so that template + content + the
+reserved ``num_predict`` fit in ``max_ctx``; ``num_ctx`` is then sized to
+what the request actually needs. Ollama restarts the model runner when
+``num_ctx`` changes, so sizes are rounded up to a few power-of-two buckets.
+"""
+
+import os
+import re
+import math
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .chunking import estimate_tokens, split_text
+
+logger = logging.getLogger(__name__)
+
+_TERM_RE = re.compile(r"[a-z0-9]{3,}")
+
+
+def _terms(text: str) -> List[str]:
+    return _TERM_RE.findall(text.lower())
+
+
+class PromptBudget:
+    def __init__(
+        self,
+        max_ctx: int = 2048,
+        min_ctx: int = 512,
+        safety: float = 1.1,
+        segment_tokens: int = 96
+    ):
+        self.max_ctx = max_ctx
+        self.min_ctx = min(min_ctx, max_ctx)
+        # Headroom for the estimator undercounting
+        self.safety = safety
+        # Size of the context segments that are ranked and kept or dropped
+        self.segment_tokens = segment_tokens
+        self.counters = {"fitted": 0, "trimmed": 0}
+
+    @classmethod
+    def from_env(cls) -> "PromptBudget":
+        return cls(
+            max_ctx=int(os.getenv("LLM_MAX_CTX", "2048")),
+            min_ctx=int(os.getenv("LLM_MIN_CTX", "512"))
+        )
+
+    def prompt_tokens(self, prompt: str) -> int:
+        return math.ceil(estimate_tokens(prompt) * self.safety)
+
+    def available(self, template: str, num_predict: int) -> int:
+        """
+        Tokens left for the variable part of a prompt.
+        """
+        room = (self.max_ctx - num_predict) / self.safety - estimate_tokens(template)
+        return max(0, int(room))
+
+    def num_ctx(self, prompt: str, num_predict: int) -> int:
+        """
+        Smallest context bucket that holds the prompt and the reserved output.
+        """
+        needed = self.prompt_tokens(prompt) + num_predict
+        size = self.min_ctx
+        while size < needed and size < self.max_ctx:
+            size *= 2
+        return min(size, self.max_ctx)
+
+    def select(self, text: str, max_tokens: int, query: Optional[str] = None) -> str:
+        """
+        Reduce text to at most ``max_tokens``.
+
+        Without a query the leading segments are kept. With a query, segments
+        sharing the most terms with it are kept first; the survivors stay in
+        their original order.
+        """
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        segments = split_text(text, min(self.segment_tokens, max_tokens))
+
+        order = list(range(len(segments)))
+        if query:
+            query_terms = set(_terms(query))
+            if query_terms:
+                def relevance(index: int) -> float:
+                    terms = _terms(segments[index])
+                    hits = sum(1 for term in terms if term in query_terms)
+                    # Distinct matches matter most; repeated ones break ties
+                    return len(query_terms.intersection(terms)) + hits / (len(terms) + 1)
+                scores = {index: relevance(index) for index in order}
+                order.sort(key=lambda index: (-scores[index], index))
+
+        kept, used = [], 0
+        for index in order:
+            tokens = estimate_tokens(segments[index])
+            if used + tokens > max_tokens:
+                continue
+            kept.append(index)
+            used += tokens
+        return "\n\n".join(segments[index] for index in sorted(kept))
+
+    def fit(
+        self,
+        build: Callable[[str], str],
+        content: str,
+        num_predict: int,
+        query: Optional[str] = None
+    ) -> Tuple[str, Dict[str, int]]:
+        """
+        Build a prompt whose content fits the context window.
+
+        Args:
+            build: Returns the full prompt for a given content string
+            content: The variable part of the prompt (text or context)
+            num_predict: Tokens reserved for the response
+            query: Rank content segments by relevance to this text
+
+        Returns:
+            The prompt and the ``num_ctx`` / ``num_predict`` parameters for it
+        """
+        num_predict = min(num_predict, self.max_ctx // 2)
+        # A blank placeholder makes builders choose their with-content template
+        budget = self.available(build(" "), num_predict)
+        fitted = self.select(content, budget, query=query) if content else content
+        self.counters["fitted"] += 1
+        if fitted != content:
+            self.counters["trimmed"] += 1
+            logger.info(
+                f"Trimmed prompt content from ~{estimate_tokens(content)} to ~{estimate_tokens(fitted)} tokens"
+            )
+        prompt = build(fitted)
+        return prompt, {"num_ctx": self.num_ctx(prompt, num_predict), "num_predict": num_predict}
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_ctx": self.max_ctx, "min_ctx": self.min_ctx, **self.counters}
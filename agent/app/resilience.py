@@ -0,0 +1,165 @@
+"""
+Deadlines, circuit breaking and latency tracking for calls to Ollama.
+"""
+
+import time
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Optional
+
+from .scheduler import LLMOverloadedError
+
+
+class DeadlineExceededError(LLMOverloadedError):
+    """
+    Raised when a request's end-to-end deadline leaves no time for another attempt.
+    """
+
+    def __init__(self, message: str):
+        super().__init__(message, status_code=504, retry_after=1)
+
+
+class CircuitOpenError(LLMOverloadedError):
+    """
+    Raised without contacting Ollama while every backend's circuit is open.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message, status_code=503, retry_after=retry_after)
+
+
+class Deadline:
+    def __init__(self, timeout: float):
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def new_deadline(timeout: float) -> Deadline:
+    """
+    A deadline ``timeout`` seconds from now, or the current one if it is tighter.
+    """
+    outer = _current_deadline.get()
+    deadline = Deadline(timeout)
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        return outer
+    return deadline
+
+
+@contextmanager
+def deadline_scope(timeout: float) -> Iterator[Deadline]:
+    """
+    Set the deadline for the enclosed calls. A tighter outer deadline wins.
+    """
+    deadline = new_deadline(timeout)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after ``failure_threshold`` consecutive failures; after
+    ``reset_timeout`` it is half-open and lets a single trial request through,
+    which closes it on success or re-opens it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def can_attempt(self) -> bool:
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def on_attempt(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def open_for(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> bool:
+        """
+        Returns True if this success closed the circuit.
+        """
+        was_open = self.opened_at is not None
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        return was_open
+
+    def record_failure(self) -> bool:
+        """
+        Returns True if this failure opened the circuit.
+        """
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None:
+            # Failed trial: stay open for another full period
+            self.opened_at = time.monotonic()
+            return False
+        if self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def release_trial(self) -> None:
+        """
+        Free the half-open trial slot when an attempt ends without a verdict.
+        """
+        self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent latencies for percentile estimates.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
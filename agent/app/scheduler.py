@@ -0,0 +1,263 @@
+"""
+Admission control and priority scheduling for requests to Ollama.
+
+Only ``max_concurrency`` generations run at once (matching the backend's
+parallel slots). Waiting requests are served by priority class, each class
+has its own queue limit, and requests that cannot be admitted fail fast
+with a Retry-After hint instead of timing out. A request never waits past
+its own deadline, if it has one.
+
+With several worker processes, ``max_concurrency`` is enforced for the whole
+machine instead: each request waits for a lease from the shared state, and
+the leases go out by priority class across all workers, so a batch request
+in one worker does not take Ollama ahead of a Slack request in another.
+"""
+
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from .utils.metrics import STAGE_LATENCY
+from .utils.shared_state import SharedSemaphore, shared_state
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITIES = {
+    "slack": 0,
+    "ask": 1,
+    "summarize": 2,
+    "batch": 3,
+    # Embeddings for the semantic cache, which is skipped if none runs soon
+    "embed": 4,
+}
+
+
+class LLMOverloadedError(Exception):
+    """
+    Raised when a request is not admitted to the LLM backend.
+    """
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def http_exception(self) -> HTTPException:
+        return HTTPException(
+            status_code=self.status_code,
+            detail={"error": str(self), "retry_after": self.retry_after},
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+
+class _Waiter:
+    def __init__(self, priority_class: str, future: asyncio.Future):
+        self.priority_class = priority_class
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.abandoned = False
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        queue_limits: Optional[Dict[str, int]] = None,
+        max_wait: float = 20.0,
+        max_waits: Optional[Dict[str, float]] = None,
+        shared_slots: Optional[SharedSemaphore] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_limits = queue_limits or {}
+        self.max_wait = max_wait
+        # Per-class overrides of max_wait
+        self.max_waits = max_waits or {}
+        # Slots counted across all worker processes, if running more than one
+        self.shared_slots = shared_slots
+        self._active = 0
+        self._heap: List[Any] = []
+        self._seq = itertools.count()
+        self._queued = {name: 0 for name in PRIORITIES}
+        # Moving average of how long a request holds a slot
+        self._service_time = 5.0
+        self.counters = {
+            name: {"admitted": 0, "rejected": 0, "timed_out": 0}
+            for name in PRIORITIES
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+        return cls(
+            max_concurrency=max_concurrency,
+            queue_limits={
+                name: int(os.getenv(f"LLM_QUEUE_LIMIT_{name.upper()}", str(default)))
+                for name, default in (("slack", 50), ("ask", 20), ("summarize", 10), ("batch", 500), ("embed", 20))
+            },
+            max_wait=float(os.getenv("LLM_QUEUE_MAX_WAIT", "20")),
+            # Offline batches can wait much longer than interactive requests
+            max_waits={
+                "batch": float(os.getenv("LLM_QUEUE_MAX_WAIT_BATCH", "600")),
+                "embed": float(os.getenv("LLM_QUEUE_MAX_WAIT_EMBED", "2")),
+            },
+            shared_slots=(
+                SharedSemaphore(shared_state, "ollama", max_concurrency) if shared_state is not None else None
+            )
+        )
+
+    def _retry_after(self, position: int) -> int:
+        """
+        Rough time until a queued request at this position would start.
+        """
+        return max(1, math.ceil(self._service_time * (position + 1) / self.max_concurrency))
+
+    def check_admission(self, priority_class: str) -> None:
+        """
+        Raise LLMOverloadedError if a request of this class would be rejected now.
+
+        Lets streaming endpoints fail with a proper status before the response starts.
+        """
+        if priority_class not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {priority_class}")
+        if self._active < self.max_concurrency:
+            return
+        limit = self.queue_limits.get(priority_class)
+        if limit is not None and self._queued[priority_class] >= limit:
+            self.counters[priority_class]["rejected"] += 1
+            raise LLMOverloadedError(
+                f"LLM queue for {priority_class} requests is full",
+                status_code=429,
+                retry_after=self._retry_after(sum(self._queued.values()))
+            )
+
+    def _max_wait(self, priority_class: str, deadline: Optional[Any]) -> Tuple[float, bool]:
+        """
+        How long a request may wait, and whether its deadline is what limits it.
+        """
+        max_wait = self.max_waits.get(priority_class, self.max_wait)
+        if deadline is not None and deadline.remaining() < max_wait:
+            return deadline.remaining(), True
+        return max_wait, False
+
+    def _wait_timed_out(self, priority_class: str, max_wait: float, by_deadline: bool, what: str) -> LLMOverloadedError:
+        self.counters[priority_class]["timed_out"] += 1
+        if by_deadline:
+            return LLMOverloadedError(
+                f"Request deadline passed while waiting for {what}", status_code=504, retry_after=1
+            )
+        return LLMOverloadedError(
+            f"Timed out after {max_wait:.0f}s waiting for {what}",
+            status_code=503,
+            retry_after=self._retry_after(self._queued_total())
+        )
+
+    async def acquire(self, priority_class: str, deadline: Optional[Any] = None) -> None:
+        """
+        Take a slot, waiting in priority order for at most the class's max wait
+        or until ``deadline`` (a ``resilience.Deadline``) passes.
+        """
+        self.check_admission(priority_class)
+        if self._active < self.max_concurrency and not self._queued_total():
+            self._active += 1
+            self.counters[priority_class]["admitted"] += 1
+            return
+
+        waiter = _Waiter(priority_class, asyncio.get_running_loop().create_future())
+        with STAGE_LATENCY.time(stage="queue_wait"):
+            await self._wait(waiter, priority_class, deadline)
+        self.counters[priority_class]["admitted"] += 1
+
+    async def _wait(self, waiter: _Waiter, priority_class: str, deadline: Optional[Any] = None) -> None:
+        heapq.heappush(self._heap, (PRIORITIES[priority_class], next(self._seq), waiter))
+        self._queued[priority_class] += 1
+        max_wait, by_deadline = self._max_wait(priority_class, deadline)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed to us just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.abandoned = True
+                waiter.future.cancel()
+                self._queued[priority_class] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._wait_timed_out(priority_class, max_wait, by_deadline, "an LLM slot")
+            raise
+
+    def release(self) -> None:
+        self._active -= 1
+        while self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.abandoned:
+                continue
+            self._queued[waiter.priority_class] -= 1
+            # Hand the slot directly to the next waiter
+            self._active += 1
+            waiter.future.set_result(None)
+            return
+
+    def _queued_total(self) -> int:
+        return sum(self._queued.values())
+
+    @asynccontextmanager
+    async def slot(self, priority_class: str = "ask", deadline: Optional[Any] = None) -> AsyncIterator[None]:
+        """
+        Hold one backend slot for the duration of the block.
+        """
+        holder = None
+        if self.shared_slots is not None:
+            holder = await self._acquire_shared(priority_class, deadline)
+        else:
+            await self.acquire(priority_class, deadline)
+        try:
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                elapsed = time.monotonic() - started
+                self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+        finally:
+            if holder is not None:
+                self._active -= 1
+                await self.shared_slots.release(holder)
+            else:
+                self.release()
+
+    async def _acquire_shared(self, priority_class: str, deadline: Optional[Any] = None) -> str:
+        """
+        Take a machine-wide slot, queued by priority with the waiters of all
+        worker processes. Nothing is held locally while waiting.
+        """
+        self.check_admission(priority_class)
+        max_wait, by_deadline = self._max_wait(priority_class, deadline)
+        self._queued[priority_class] += 1
+        try:
+            with STAGE_LATENCY.time(stage="queue_wait"):
+                holder = await self.shared_slots.acquire(timeout=max_wait, priority=PRIORITIES[priority_class])
+        finally:
+            self._queued[priority_class] -= 1
+        if holder is None:
+            raise self._wait_timed_out(priority_class, max_wait, by_deadline, "an LLM slot")
+        self._active += 1
+        self.counters[priority_class]["admitted"] += 1
+        return holder
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": dict(self._queued),
+            "queue_limits": dict(self.queue_limits),
+            "avg_service_time": round(self._service_time, 3),
+            "shared": self.shared_slots is not None,
+            "classes": self.counters,
+        }
@@ -0,0 +1,460 @@
+"""
+In-process activity search index.
+
+Activities from the search API are kept in an inverted index and ranked
+with BM25, with exact-match filters on selected fields (category, location,
+...). A background task pulls a full snapshot periodically and the changes
+since the last sync in between, so queries never leave the process. Until
+the first full sync has succeeded the index is cold and callers fall back
+to the remote API.
+
+With several worker processes the index is still kept by each of them, but
+only one syncs it at a time (under a lease in the shared state) and writes
+the documents to a snapshot file that the other workers load, so upstream
+sees one sync per interval for the whole machine.
+
+The sync expects ``GET {SEARCH_API_URL}/activities`` to return
+``{"results": [...], "next_cursor": ...}`` pages, accepting ``cursor``,
+``page_size`` and ``updated_since`` (epoch seconds); documents with
+``"deleted": true`` are removed.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import heapq
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .utils.config import get_settings
+from .utils.http import http_clients
+from .utils.metrics import STAGE_LATENCY, UPSTREAM_REQUESTS
+from .utils.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or the to with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens without stopwords; a trailing plural 's' is dropped.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _filter_values(value: Any) -> Iterable[str]:
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple, set)):
+        return [str(v).lower() for v in value]
+    return [str(value).lower()]
+
+
+class InvertedIndex:
+    """
+    BM25 over title (counted twice) and description, plus field filters.
+    """
+
+    def __init__(self, filter_fields: Iterable[str] = (), k1: float = 1.2, b: float = 0.75):
+        self.filter_fields = tuple(filter_fields)
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._filters: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        # BM25 length normalization per document, rebuilt lazily after changes
+        self._norms: Optional[Dict[str, float]] = None
+
+    @staticmethod
+    def doc_id(doc: Dict[str, Any]) -> str:
+        return str(doc.get("id") or doc.get("url") or doc.get("title"))
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._postings)
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        doc_id = self.doc_id(doc)
+        self.remove(doc_id)
+
+        terms: Dict[str, int] = {}
+        title_tokens = tokenize(doc.get("title") or "")
+        for token in title_tokens * 2 + tokenize(doc.get("description") or ""):
+            terms[token] = terms.get(token, 0) + 1
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = terms
+        self._lengths[doc_id] = length
+        self._total_length += length
+        for field in self.filter_fields:
+            for value in _filter_values(doc.get(field)):
+                self._filters[(field, value)].add(doc_id)
+        self.docs[doc_id] = doc
+        self._norms = None
+
+    def remove(self, doc_id: str) -> None:
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+        self._norms = None
+        for field in self.filter_fields:
+            for value in _filter_values(doc.get(field)):
+                members = self._filters.get((field, value))
+                if members is not None:
+                    members.discard(doc_id)
+                    if not members:
+                        del self._filters[(field, value)]
+
+    def _allowed(self, filters: Dict[str, Any]) -> Optional[Set[str]]:
+        """
+        Documents matching every filter, or None when nothing is filtered.
+        """
+        allowed: Optional[Set[str]] = None
+        for field, value in filters.items():
+            wanted = set(_filter_values(value))
+            if field in self.filter_fields:
+                matches = set()
+                for item in wanted:
+                    matches |= self._filters.get((field, item), set())
+            else:
+                # Not indexed: check the documents directly
+                matches = {
+                    doc_id for doc_id in (allowed if allowed is not None else self.docs)
+                    if wanted.intersection(_filter_values(self.docs[doc_id].get(field)))
+                }
+            allowed = matches if allowed is None else allowed & matches
+            if not allowed:
+                break
+        return allowed
+
+    def _length_norms(self) -> Dict[str, float]:
+        if self._norms is None:
+            avg_length = self._total_length / len(self._lengths) if self._lengths else 1.0
+            k1, b = self.k1, self.b
+            self._norms = {
+                doc_id: k1 * (1 - b + b * length / avg_length) for doc_id, length in self._lengths.items()
+            }
+        return self._norms
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        allowed = self._allowed(filters) if filters else None
+        if allowed is not None and not allowed:
+            return []
+
+        terms = set(tokenize(query))
+        if not terms:
+            # Filter-only query
+            doc_ids = sorted(allowed)[:limit] if allowed is not None else []
+            return [{**self.docs[doc_id], "score": 0.0} for doc_id in doc_ids]
+
+        count = len(self.docs)
+        norms = self._length_norms()
+        k1 = self.k1
+        scores: Dict[str, float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (k1 + 1)
+            if allowed is not None and len(allowed) < len(postings):
+                # Walk the smaller side
+                matches = ((doc_id, postings[doc_id]) for doc_id in allowed if doc_id in postings)
+            elif allowed is not None:
+                matches = ((doc_id, tf) for doc_id, tf in postings.items() if doc_id in allowed)
+            else:
+                matches = postings.items()
+            for doc_id, tf in matches:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf / (tf + norms[doc_id])
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [{**self.docs[doc_id], "score": round(score, 4)} for doc_id, score in top]
+
+
+class ActivityIndex:
+    def __init__(
+        self,
+        base_url: str,
+        sync_interval: float = 300.0,
+        full_sync_interval: float = 86400.0,
+        page_size: int = 500,
+        filter_fields: Iterable[str] = ("category", "location", "type"),
+        shared: Optional[SharedState] = None,
+        snapshot_path: Optional[str] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.page_size = page_size
+        self.filter_fields = tuple(filter_fields)
+        self.index = InvertedIndex(self.filter_fields)
+        self.ready = False
+        self._last_sync: Optional[float] = None
+        self._last_full_sync = 0.0
+        self._sync_task: Optional[asyncio.Task] = None
+        # Consecutive failed syncs; retries back off from retry_delay up to sync_interval
+        self._failures = 0
+        self.retry_delay = 5.0
+        # With shared state, workers sync through a snapshot file instead of each on their own
+        self.shared = shared if snapshot_path else None
+        self.snapshot_path = snapshot_path
+        self._snapshot_version: Optional[int] = None
+        self.counters = {
+            "queries": 0, "full_syncs": 0, "incremental_syncs": 0, "sync_failures": 0, "snapshot_loads": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "ActivityIndex":
+        fields = os.getenv("SEARCH_INDEX_FILTER_FIELDS", "category,location,type")
+        return cls(
+            base_url=os.getenv("SEARCH_API_URL", "https://api.search.service/v1"),
+            sync_interval=float(os.getenv("SEARCH_INDEX_SYNC_INTERVAL", "300")),
+            full_sync_interval=float(os.getenv("SEARCH_INDEX_FULL_SYNC_INTERVAL", "86400")),
+            page_size=int(os.getenv("SEARCH_INDEX_PAGE_SIZE", "500")),
+            filter_fields=[f.strip() for f in fields.split(",") if f.strip()],
+            shared=shared_state,
+            snapshot_path=os.getenv("SEARCH_INDEX_SNAPSHOT_PATH", ".cache/search_index.json") or None
+        )
+
+    async def _fetch_all(self, updated_since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Page through the upstream activity listing.
+        """
+        client = http_clients.get("search")
+        headers = {"Authorization": f"Bearer {get_settings().search_api_key}"}
+        params: Dict[str, Any] = {"page_size": self.page_size}
+        if updated_since is not None:
+            params["updated_since"] = updated_since
+        documents: List[Dict[str, Any]] = []
+        while True:
+            try:
+                response = await client.get(f"{self.base_url}/activities", params=params, headers=headers)
+                response.raise_for_status()
+            except Exception:
+                UPSTREAM_REQUESTS.inc(upstream="search", outcome="error")
+                raise
+            UPSTREAM_REQUESTS.inc(upstream="search", outcome="success")
+            data = response.json()
+            documents.extend(data.get("results", []))
+            cursor = data.get("next_cursor")
+            if not cursor:
+                return documents
+            params["cursor"] = cursor
+
+    def _build(self, documents: List[Dict[str, Any]]) -> InvertedIndex:
+        index = InvertedIndex(self.filter_fields)
+        for doc in documents:
+            if not doc.get("deleted"):
+                index.upsert(doc)
+        return index
+
+    async def full_sync(self) -> None:
+        """
+        Rebuild the index from a complete snapshot and swap it in.
+        """
+        started = time.time()
+        with STAGE_LATENCY.time(stage="search_index_full_sync"):
+            documents = await self._fetch_all()
+        # The new index is private until swapped in, so it can be built off the event loop
+        with STAGE_LATENCY.time(stage="search_index_build"):
+            index = await asyncio.to_thread(self._build, documents)
+        self.index = index
+        self._last_sync = started
+        self._last_full_sync = started
+        self.ready = True
+        self.counters["full_syncs"] += 1
+        logger.info(f"Activity index rebuilt with {len(index)} documents")
+
+    async def incremental_sync(self) -> None:
+        """
+        Apply changes made upstream since the last sync.
+        """
+        started = time.time()
+        with STAGE_LATENCY.time(stage="search_index_sync"):
+            # Overlap a little so changes racing the previous sync are not missed
+            documents = await self._fetch_all(updated_since=self._last_sync - 5)
+        for doc in documents:
+            if doc.get("deleted"):
+                self.index.remove(InvertedIndex.doc_id(doc))
+            else:
+                self.index.upsert(doc)
+        self._last_sync = started
+        self.counters["incremental_syncs"] += 1
+        if documents:
+            logger.debug(f"Applied {len(documents)} activity index changes")
+
+    async def sync(self) -> None:
+        full_due = time.time() - self._last_full_sync >= self.full_sync_interval
+        if not self.ready or self._last_sync is None or full_due:
+            await self.full_sync()
+        else:
+            await self.incremental_sync()
+
+    def _sync_due(self) -> bool:
+        return self._last_sync is None or time.time() - self._last_sync >= self.sync_interval
+
+    def _read_snapshot(self) -> Tuple[Dict[str, Any], InvertedIndex]:
+        with open(self.snapshot_path) as f:
+            snapshot = json.load(f)
+        return snapshot, self._build(snapshot["documents"])
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        partial = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(partial, "w") as f:
+            json.dump(snapshot, f)
+        # Readers see either the old or the new file, never half of one
+        os.replace(partial, self.snapshot_path)
+        self._snapshot_version = os.stat(self.snapshot_path).st_mtime_ns
+
+    async def _load_snapshot(self) -> None:
+        """
+        Swap in the snapshot written by another worker, if it changed since we last looked.
+        """
+        try:
+            version = os.stat(self.snapshot_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if version == self._snapshot_version:
+            return
+        try:
+            with STAGE_LATENCY.time(stage="search_index_build"):
+                snapshot, index = await asyncio.to_thread(self._read_snapshot)
+        except (OSError, ValueError, KeyError) as e:
+            # Skip it; the next worker to sync replaces it
+            self._snapshot_version = version
+            logger.warning(f"Ignoring unreadable activity index snapshot {self.snapshot_path}: {str(e)}")
+            return
+        self._snapshot_version = version
+        if self._last_sync is not None and snapshot["synced_at"] <= self._last_sync:
+            return
+        self.index = index
+        self._last_sync = snapshot["synced_at"]
+        self._last_full_sync = snapshot["full_synced_at"]
+        self.ready = True
+        self.counters["snapshot_loads"] += 1
+        logger.info(f"Activity index loaded from snapshot with {len(index)} documents")
+
+    async def shared_sync(self) -> None:
+        """
+        Sync once for all worker processes: load a newer snapshot if there is
+        one, and if a sync is still due, sync and write the next snapshot
+        unless another worker is already doing so.
+        """
+        await self._load_snapshot()
+        if not self._sync_due():
+            return
+        holder = await self.shared.try_acquire("search_sync")
+        if holder is None:
+            return
+        try:
+            # Another worker may have finished a sync just before we took the lease
+            await self._load_snapshot()
+            if not self._sync_due():
+                return
+            await self.sync()
+            snapshot = {
+                "synced_at": self._last_sync,
+                "full_synced_at": self._last_full_sync,
+                "documents": list(self.index.docs.values()),
+            }
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+        finally:
+            await self.shared.release("search_sync", holder)
+
+    def _next_delay(self) -> float:
+        if self._failures:
+            # Jittered, so workers that failed together do not retry in step
+            delay = min(self.sync_interval, self.retry_delay * 2 ** (self._failures - 1))
+            return delay * random.uniform(0.5, 1.0)
+        if self.shared is not None and not self.ready:
+            # Pick up the first snapshot soon after the syncing worker writes it
+            return min(self.sync_interval, self.retry_delay)
+        return self.sync_interval
+
+    async def _sync_loop(self) -> None:
+        while True:
+            try:
+                if self.shared is not None:
+                    await self.shared_sync()
+                else:
+                    await self.sync()
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                self.counters["sync_failures"] += 1
+                logger.warning(f"Activity index sync failed: {str(e)}")
+            await asyncio.sleep(self._next_delay())
+
+    def start(self) -> None:
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Search the local index; None while it is cold.
+        """
+        if not self.ready:
+            return None
+        self.counters["queries"] += 1
+        return self.index.search(query, limit=limit, filters=filters)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "documents": len(self.index),
+            "terms": self.index.term_count,
+            "last_sync_age": round(time.time() - self._last_sync, 1) if self._last_sync else None,
+            "shared": self.shared is not None,
+            **self.counters
+        }
+
+
+# Global index, synced from the FastAPI lifespan
+activity_index = ActivityIndex.from_env()
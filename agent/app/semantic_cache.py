@@ -0,0 +1,302 @@
+"""
+Semantic answer cache.
+
+Questions are embedded and kept as rows of a preallocated float32 matrix
+with unit-length rows, so a lookup is a single matrix-vector product over
+the live rows followed by an ``argpartition`` top-k. A cached answer is
+returned when the best match in the same scope (e.g. a Slack channel) is at
+least ``threshold`` cosine similarity. The oldest-used rows are reused when
+the matrix is full, and the index is persisted as one ``.npz`` file holding
+the matrix together with the answers, so the two can never get out of step.
+
+With several worker processes each keeps its own index in memory, but new
+entries are appended to a log in the shared state that every worker replays,
+so an answer cached by one worker is a hit in all of them. The shared log is
+then also what persists the cache, instead of the file.
+"""
+
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .utils.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 5000,
+        ttl: float = 86400.0,
+        path: Optional[str] = None,
+        top_k: int = 3,
+        save_every: int = 50,
+        shared: Optional[SharedState] = None
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.top_k = top_k
+        self.save_every = save_every
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        # Per-row metadata, aligned with the matrix rows
+        self._scope_ids = np.full(max_entries, -1, dtype=np.int32)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._answers: List[Optional[Tuple[str, str]]] = [None] * max_entries
+        self._scopes: Dict[str, int] = {}
+        self._unsaved = 0
+        self._save_task: Optional[asyncio.Task] = None
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "replayed": 0}
+        # Entries from other workers; the log is read at most every refresh_interval
+        self.shared = shared
+        self.refresh_interval = 1.0
+        self._log_position = 0
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        if path:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticCache"]:
+        """
+        Build the cache from SEMANTIC_CACHE_* variables, or None if it is disabled.
+        """
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() != "true":
+            return None
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+            # The shared log persists the entries when there is one
+            path=None if shared_state is not None else os.getenv("SEMANTIC_CACHE_PATH", ".cache/semantic") or None,
+            shared=shared_state
+        )
+
+    def _scope_id(self, scope: str, create: bool = False) -> Optional[int]:
+        scope_id = self._scopes.get(scope)
+        if scope_id is None and create:
+            scope_id = len(self._scopes)
+            self._scopes[scope] = scope_id
+        return scope_id
+
+    def _normalize(self, vector: Sequence[float]) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        if array.ndim != 1 or norm == 0.0:
+            return None
+        return array / norm
+
+    def _live(self, now: float) -> np.ndarray:
+        return (self._scope_ids >= 0) & (now - self._created < self.ttl)
+
+    def lookup(self, vector: Sequence[float], scope: str) -> Optional[str]:
+        """
+        Return the cached answer most similar to the question, if any is close enough.
+        """
+        query = self._normalize(vector)
+        scope_id = self._scope_id(scope)
+        if query is None or scope_id is None or self._vectors is None or query.shape[0] != self._dim:
+            self.counters["misses"] += 1
+            return None
+
+        now = time.time()
+        candidates = np.flatnonzero(self._live(now) & (self._scope_ids == scope_id))
+        if candidates.size == 0:
+            self.counters["misses"] += 1
+            return None
+
+        similarities = self._vectors[candidates] @ query
+        k = min(self.top_k, candidates.size)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        best = top[np.argmax(similarities[top])]
+        if similarities[best] < self.threshold:
+            self.counters["misses"] += 1
+            return None
+
+        row = int(candidates[best])
+        self._last_used[row] = now
+        self.counters["hits"] += 1
+        question, answer = self._answers[row]
+        logger.info(f"Semantic cache hit ({similarities[best]:.3f}) for a paraphrase of: {question[:80]}")
+        return answer
+
+    def add(self, vector: Sequence[float], question: str, answer: str, scope: str) -> None:
+        if not self._put(vector, question, answer, scope, time.time()):
+            return
+        self.counters["stores"] += 1
+        self._unsaved += 1
+        if self.path and self._unsaved >= self.save_every:
+            self._save_in_background()
+
+    def _put(self, vector: Sequence[float], question: str, answer: str, scope: str, created: float) -> bool:
+        row_vector = self._normalize(vector)
+        if row_vector is None:
+            return False
+        if self._vectors is None or row_vector.shape[0] != self._dim:
+            # First entry, or the embedding model changed: start a new matrix
+            self._reset(row_vector.shape[0])
+
+        now = time.time()
+        live = self._live(now)
+        # Reuse a free or expired row first, else the least recently used one
+        row = int(np.argmin(np.where(live, self._last_used, -np.inf)))
+        if live[row]:
+            self.counters["evictions"] += 1
+
+        self._vectors[row] = row_vector
+        self._scope_ids[row] = self._scope_id(scope, create=True)
+        self._created[row] = created
+        self._last_used[row] = now
+        self._answers[row] = (question, answer)
+        return True
+
+    async def store(self, vector: Sequence[float], question: str, answer: str, scope: str) -> None:
+        """
+        Add an entry, and share it with the other workers if there are any.
+        """
+        self.add(vector, question, answer, scope)
+        if self.shared is None:
+            return
+        entry = {
+            "vector": base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii"),
+            "question": question,
+            "answer": answer,
+            "scope": scope,
+            "created": time.time(),
+        }
+        try:
+            await self.shared.append("semantic_cache", json.dumps(entry), self.max_entries)
+        except Exception as e:
+            logger.warning(f"Failed to share semantic cache entry: {str(e)}")
+
+    async def refresh(self) -> None:
+        """
+        Add the entries other workers stored since the last refresh.
+        """
+        if self.shared is None or self._refreshing or time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        self._refreshing = True
+        try:
+            while True:
+                rows = await self.shared.read("semantic_cache", after=self._log_position)
+                for entry_id, owner, value in rows:
+                    self._log_position = entry_id
+                    if owner == self.shared.owner:
+                        continue
+                    entry = json.loads(value)
+                    if time.time() - entry["created"] >= self.ttl:
+                        continue
+                    vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+                    if self._put(vector, entry["question"], entry["answer"], entry["scope"], entry["created"]):
+                        self.counters["replayed"] += 1
+                if len(rows) < 500:
+                    return
+        except Exception as e:
+            logger.warning(f"Failed to read shared semantic cache entries: {str(e)}")
+        finally:
+            self._refreshing = False
+            self._refreshed_at = time.monotonic()
+
+    def _reset(self, dim: int) -> None:
+        self._dim = dim
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._scope_ids.fill(-1)
+        self._answers = [None] * self.max_entries
+
+    def _snapshot(self) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        if self._vectors is None:
+            return None
+        rows = np.flatnonzero(self._live(time.time()))
+        arrays = {
+            "vectors": self._vectors[rows].copy(),
+            "scope_ids": self._scope_ids[rows].copy(),
+            "created": self._created[rows].copy(),
+            "last_used": self._last_used[rows].copy(),
+        }
+        meta = {
+            "scopes": self._scopes,
+            "answers": [list(self._answers[row]) for row in rows],
+        }
+        return arrays, json.loads(json.dumps(meta))
+
+    def _write(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # One file, written under a name no other process uses, then swapped in
+        partial = f"{self.path}.{os.getpid()}.npz.tmp"
+        with open(partial, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(partial, f"{self.path}.npz")
+
+    def _save_in_background(self) -> None:
+        if self._save_task is not None and not self._save_task.done():
+            return
+        self._save_task = asyncio.create_task(self.save())
+
+    async def save(self) -> None:
+        """
+        Persist the live entries to disk.
+        """
+        if not self.path:
+            return
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return
+        self._unsaved = 0
+        try:
+            await asyncio.to_thread(self._write, *snapshot)
+        except Exception as e:
+            logger.warning(f"Failed to save semantic cache to {self.path}: {str(e)}")
+
+    def _load(self) -> None:
+        try:
+            with np.load(f"{self.path}.npz") as data:
+                meta = json.loads(str(data["meta"]))
+                vectors = data["vectors"]
+                scope_ids = data["scope_ids"]
+                created = data["created"]
+                last_used = data["last_used"]
+            lengths = {len(vectors), len(scope_ids), len(created), len(last_used), len(meta["answers"])}
+            if len(lengths) != 1:
+                raise ValueError(f"rows and answers do not match ({sorted(lengths)})")
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable semantic cache at {self.path}: {str(e)}")
+            return
+
+        count = min(len(vectors), self.max_entries)
+        if count == 0:
+            return
+        # Keep the most recently used entries if the file holds more than fit
+        keep = np.argsort(-last_used)[:count]
+        self._reset(vectors.shape[1])
+        self._scopes = {scope: int(scope_id) for scope, scope_id in meta["scopes"].items()}
+        self._vectors[:count] = vectors[keep]
+        self._scope_ids[:count] = scope_ids[keep]
+        self._created[:count] = created[keep]
+        self._last_used[:count] = last_used[keep]
+        for row, index in enumerate(keep):
+            self._answers[row] = tuple(meta["answers"][index])
+        logger.info(f"Loaded {count} semantic cache entries from {self.path}")
+
+    def stats(self) -> Dict[str, Any]:
+        live = int(self._live(time.time()).sum()) if self._vectors is not None else 0
+        return {
+            "entries": live,
+            "max_entries": self.max_entries,
+            "dimensions": self._dim,
+            "scopes": len(self._scopes),
+            "threshold": self.threshold,
+            **self.counters
+        }
@@ -0,0 +1,90 @@
+"""
+Startup timing and readiness.
+
+The lifespan only starts the background tasks; slower initialization
+(loading the semantic cache, filling the model list, preloading the model)
+runs in the background after the server is already accepting connections.
+``/`` answers as soon as the process is up (liveness), while ``/ready``
+answers 200 only once that initialization has finished (readiness).
+
+Phase durations are kept for ``/stats`` and ``/metrics``; ``process`` is
+the time from process start (including interpreter start-up and imports)
+until the app became ready.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .utils.shared_state import process_start_ticks
+
+logger = logging.getLogger(__name__)
+
+# Module import time, the fallback when the process start time is unavailable
+_IMPORTED_AT = time.time()
+
+
+def process_started_at() -> float:
+    """
+    Wall-clock start of this process, read from /proc on Linux.
+    """
+    start_ticks = process_start_ticks(os.getpid())
+    if start_ticks is None:
+        return _IMPORTED_AT
+    try:
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return _IMPORTED_AT
+
+
+class Startup:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.failed: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = round(seconds, 3)
+        logger.info(f"Startup phase {phase} took {seconds:.3f}s")
+
+    def begin(self, steps: List[Tuple[str, Callable[[], Awaitable[Any]]]]) -> None:
+        """
+        Run the initialization steps in order, in the background.
+
+        A failing step is logged and recorded but does not stop the others
+        or keep the app from becoming ready.
+        """
+        self.ready = False
+        self._task = asyncio.create_task(self._run(steps))
+
+    async def _run(self, steps: List[Tuple[str, Callable[[], Awaitable[Any]]]]) -> None:
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed.append(name)
+                logger.warning(f"Startup step {name} failed: {str(e)}")
+            self.record(name, time.perf_counter() - started)
+        self.ready = True
+        self.record("process", time.time() - process_started_at())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "phases": dict(self.phases), "failed": list(self.failed)}
+
+
+# Global tracker, driven from the FastAPI lifespan
+startup = Startup()
@@ -1,13 +1,31 @@
 from fastapi import APIRouter, HTTPException
-from app.models import SummarizationRequest, SummarizationResponse, ErrorResponse
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from app.models import (
+    SummarizationRequest,
+    SummarizationResponse,
+    BatchSummarizationRequest,
+    ErrorResponse
+)
 from app.llama import llama
-from app.integrations.slack import slack_client
+from app.scheduler import LLMOverloadedError
+from app.integrations.slack import slack_delivery
+from app.utils.sse import token_events, sse_response
+import os
 import re
+import json
+import asyncio
 import logging
+from typing import Any, Dict
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+SUMMARY_MODES = ("auto", "single", "chunked")
+# Items of one batch summarized at once, unless the request asks for fewer
+BATCH_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_CONCURRENCY", "4"))
+
 def count_words(text: str) -> int:
     return len(re.findall(r'\w+', text))
 
@@ -20,53 +38,205 @@ def format_summary(text: str, format_type: str) -> str:
 @router.post(
     "/summarize",
     response_model=SummarizationResponse,
-    responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
+    responses={
+        400: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+        503: {"model": ErrorResponse}
+    },
     tags=["summarization"]
 )
 async def summarize_text(request: SummarizationRequest) -> SummarizationResponse:
     """
     Summarize the provided text using the Llama model, then post to Slack.
+
+    The Slack post is queued and delivered in the background, so Slack
+    latency and rate limits do not hold up the response.
     """
     try:
-        original_length = count_words(request.text)
-        if original_length == 0:
-            raise HTTPException(status_code=400, detail={"error": "Input text is empty"})
-
-        summary = await llama.summarize(
-            text=request.text,
-            max_length=request.max_length,
-            min_length=request.min_length
-        )
-
-        formatted_summary = format_summary(summary, request.format)
-        summary_length = count_words(formatted_summary)
-
-        compression_ratio = round(summary_length / original_length, 2) if original_length else 0
+        response = await run_summarization(request)
 
         # 🎯 Post to Slack
         slack_channel = "all-whatsbot"  # Or get from config/env or request!
-        await slack_client.post_summary(
+        slack_delivery.post_summary(
             channel=slack_channel,
             original_text=request.text,
-            summary=formatted_summary
+            summary=response.summary
         )
 
-        return SummarizationResponse(
-            summary=formatted_summary,
-            original_length=original_length,
-            summary_length=summary_length,
-            metadata={
-                "format": request.format,
-                "compression_ratio": compression_ratio
-            }
-        )
+        return response
 
     except HTTPException as http_exc:
         raise http_exc
 
+    except LLMOverloadedError as e:
+        raise e.http_exception()
+
     except Exception as e:
         logger.error(f"Summarization failed: {e}")
         raise HTTPException(
             status_code=500,
             detail={"error": "Summarization failed", "details": str(e)}
         )
+
+async def run_summarization(request: SummarizationRequest, priority: str = "summarize") -> SummarizationResponse:
+    """
+    Validate a request and produce its summary, without posting to Slack.
+    """
+    original_length = count_words(request.text)
+    if original_length == 0:
+        raise HTTPException(status_code=400, detail={"error": "Input text is empty"})
+    if request.mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail={"error": f"Unknown mode: {request.mode}"})
+
+    summary = await llama.summarize(
+        text=request.text,
+        max_length=request.max_length,
+        min_length=request.min_length,
+        bypass_cache=request.bypass_cache,
+        mode=request.mode,
+        priority=priority
+    )
+
+    formatted_summary = format_summary(summary, request.format)
+    summary_length = count_words(formatted_summary)
+
+    compression_ratio = round(summary_length / original_length, 2) if original_length else 0
+
+    return SummarizationResponse(
+        summary=formatted_summary,
+        original_length=original_length,
+        summary_length=summary_length,
+        metadata={
+            "format": request.format,
+            "compression_ratio": compression_ratio,
+            "chunked": request.mode == "chunked" or (request.mode == "auto" and llama.needs_chunking(
+                request.text, request.max_length, request.min_length
+            ))
+        }
+    )
+
+@router.post("/summarize/batch", tags=["summarization"])
+async def summarize_batch(request: BatchSummarizationRequest):
+    """
+    Summarize many texts with bounded concurrency, streaming results as NDJSON.
+
+    Each line is ``{"index", "status", "result" | "error"}`` and is sent as
+    soon as that item finishes, so lines arrive out of order. A final line
+    with ``"status": "complete"`` reports totals. A bad item only produces an
+    error line for itself.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail={"error": "No items to summarize"})
+
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+
+    async def summarize_item(index: int, raw: Dict[str, Any], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        try:
+            item = SummarizationRequest(**raw)
+        except (ValidationError, TypeError) as e:
+            return {"index": index, "status": "error", "error": {"error": "Invalid item", "details": str(e)}}
+        try:
+            async with semaphore:
+                response = await run_summarization(item, priority="batch")
+            return {"index": index, "status": "success", "result": response.dict(), "_text": item.text}
+        except HTTPException as e:
+            return {"index": index, "status": "error", "error": e.detail}
+        except LLMOverloadedError as e:
+            return {"index": index, "status": "error", "error": {"error": str(e), "retry_after": e.retry_after}}
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            return {"index": index, "status": "error", "error": {"error": "Summarization failed", "details": str(e)}}
+
+    async def results():
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(summarize_item(index, raw, semaphore))
+            for index, raw in enumerate(request.items)
+        ]
+        succeeded = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                text = line.pop("_text", None)
+                if line["status"] == "success":
+                    succeeded.append((line["index"], text, line["result"]["summary"]))
+                yield json.dumps(line) + "\n"
+        finally:
+            # Stop outstanding work if the client went away
+            for task in tasks:
+                task.cancel()
+
+        complete = {
+            "status": "complete",
+            "total": len(request.items),
+            "succeeded": len(succeeded),
+            "failed": len(request.items) - len(succeeded)
+        }
+        if request.post_to_slack and succeeded:
+            succeeded.sort()
+            complete["slack_queued"] = slack_delivery.post_summary_digest(
+                channel=request.slack_channel,
+                entries=[(text, summary) for _, text, summary in succeeded]
+            )
+        yield json.dumps(complete) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.post(
+    "/summarize/stream",
+    responses={400: {"model": ErrorResponse}, 429: {"model": ErrorResponse}},
+    tags=["summarization"]
+)
+async def summarize_text_stream(request: SummarizationRequest):
+    """
+    Stream a summary as Server-Sent Events, then post the final summary to Slack.
+
+    Tokens arrive as ``data: {"token": ...}`` frames; the final ``done`` event
+    carries the formatted summary and the same fields as ``/summarize``.
+    """
+    original_length = count_words(request.text)
+    if original_length == 0:
+        raise HTTPException(status_code=400, detail={"error": "Input text is empty"})
+    if request.mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail={"error": f"Unknown mode: {request.mode}"})
+
+    # Reject before the stream starts if the summarization queue is full
+    try:
+        llama.scheduler.check_admission("summarize")
+    except LLMOverloadedError as e:
+        raise e.http_exception()
+
+    completed = {}
+
+    async def on_complete(summary: str):
+        formatted_summary = format_summary(summary, request.format)
+        summary_length = count_words(formatted_summary)
+        completed["summary"] = formatted_summary
+        return SummarizationResponse(
+            summary=formatted_summary,
+            original_length=original_length,
+            summary_length=summary_length,
+            metadata={
+                "format": request.format,
+                "compression_ratio": round(summary_length / original_length, 2)
+            }
+        ).dict()
+
+    async def post_to_slack():
+        if "summary" not in completed:
+            return
+        slack_delivery.post_summary(
+            channel="all-whatsbot",
+            original_text=request.text,
+            summary=completed["summary"]
+        )
+
+    tokens = llama.summarize_stream(
+        text=request.text,
+        max_length=request.max_length,
+        min_length=request.min_length,
+        bypass_cache=request.bypass_cache,
+        mode=request.mode
+    )
+    return sse_response(token_events(tokens, on_complete), background=BackgroundTask(post_to_slack))
@@ -1,15 +1,12 @@
 from pydantic import BaseSettings
 from functools import lru_cache
 import os
-from dotenv import load_dotenv
-
-# Load .env file
-load_dotenv()
 
 class Settings(BaseSettings):
-    search_api_key: str
+    # Checked by load_config, so importing or reading settings never fails
+    search_api_key: str = ""
     ollama_api_url: str = "http://localhost:11434"
-    mcp_api_key: str
+    mcp_api_key: str = ""
     log_level: str = "INFO"
     port: int = 8000
 
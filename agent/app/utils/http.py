@@ -0,0 +1,161 @@
+"""
+Shared, pooled HTTP clients for the upstream services (Ollama, Slack, search API).
+
+One ``httpx.AsyncClient`` is kept per upstream so that keep-alive connections
+are reused across requests and retries instead of paying a fresh TCP+TLS
+handshake on every call. The clients are created lazily on first use and
+closed from the FastAPI lifespan on shutdown.
+"""
+
+import os
+import logging
+import importlib.util
+from typing import Dict, Any, Optional
+
+import httpx
+
+from .logs import REQUEST_ID_HEADER, current_request_id
+
+logger = logging.getLogger(__name__)
+
+# Default request timeouts (seconds) per upstream
+DEFAULT_TIMEOUTS = {
+    "ollama": 30.0,
+    "slack": 10.0,
+    "search": 10.0,
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class HTTPClientPool:
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._limits: Dict[str, httpx.Limits] = {}
+
+    def _build_limits(self, name: str) -> httpx.Limits:
+        """
+        Read pool limits for an upstream, e.g. ``OLLAMA_HTTP_MAX_CONNECTIONS``
+        overrides the global ``HTTP_MAX_CONNECTIONS``.
+        """
+        prefix = name.upper()
+        max_connections = _env_int(
+            f"{prefix}_HTTP_MAX_CONNECTIONS", _env_int("HTTP_MAX_CONNECTIONS", 20)
+        )
+        max_keepalive = _env_int(
+            f"{prefix}_HTTP_MAX_KEEPALIVE", _env_int("HTTP_MAX_KEEPALIVE", 10)
+        )
+        keepalive_expiry = _env_float(
+            f"{prefix}_HTTP_KEEPALIVE_EXPIRY", _env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+        )
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+    def _http2_enabled(self, name: str) -> bool:
+        enabled = _env_bool(f"{name.upper()}_HTTP2", _env_bool("HTTP2_ENABLED", False))
+        if enabled and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                f"HTTP/2 requested for {name} but the 'h2' package is not installed; using HTTP/1.1"
+            )
+            return False
+        return enabled
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Return the shared client for an upstream, creating it on first use.
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            limits = self._build_limits(name)
+            http2 = self._http2_enabled(name)
+            timeout = _env_float(
+                f"{name.upper()}_HTTP_TIMEOUT", DEFAULT_TIMEOUTS.get(name, 30.0)
+            )
+            client = httpx.AsyncClient(
+                limits=limits,
+                http2=http2,
+                timeout=timeout,
+                event_hooks={"request": [_add_request_id]}
+            )
+            self._clients[name] = client
+            self._limits[name] = limits
+            logger.info(
+                f"Created HTTP client for {name} (max_connections={limits.max_connections}, "
+                f"keepalive={limits.max_keepalive_connections}, http2={http2})"
+            )
+        return client
+
+    async def aclose(self) -> None:
+        """
+        Close every client and release pooled connections.
+        """
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing HTTP client for {name}: {str(e)}")
+        self._clients.clear()
+        logger.info("Closed shared HTTP clients")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report connection pool usage per upstream.
+
+        Reads the underlying httpcore pool, so the numbers are best effort.
+        """
+        result = {}
+        for name, client in self._clients.items():
+            limits = self._limits[name]
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            idle = sum(1 for c in connections if _safe_call(c, "is_idle"))
+            active = len(connections) - idle
+            pending = len(getattr(pool, "_requests", []) or [])
+            max_connections: Optional[int] = limits.max_connections
+            result[name] = {
+                "connections": len(connections),
+                "active": active,
+                "idle": idle,
+                "queued": max(0, pending - active),
+                "max_connections": max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                "saturation": round(active / max_connections, 2) if max_connections else None,
+                "closed": client.is_closed,
+            }
+        return result
+
+
+async def _add_request_id(request: httpx.Request) -> None:
+    # Lets upstream logs be matched with the request that caused the call
+    request_id = current_request_id()
+    if request_id and REQUEST_ID_HEADER not in request.headers:
+        request.headers[REQUEST_ID_HEADER] = request_id
+
+
+def _safe_call(obj: Any, method: str) -> bool:
+    try:
+        return bool(getattr(obj, method)())
+    except Exception:
+        return False
+
+
+# Global instance shared by all integrations
+http_clients = HTTPClientPool()
@@ -0,0 +1,141 @@
+"""
+Logging setup: non-blocking handlers, request correlation IDs and sampled payload logs.
+
+Records are put on an in-memory queue by a ``QueueHandler`` and written by a
+``QueueListener`` thread, so a slow stderr or log collector never blocks
+the event loop. Every record carries the ID of the request it belongs to
+(``X-Request-ID``, or a generated one), which is also sent on outbound
+Ollama, Slack and search calls. Full request payloads are only serialized
+at DEBUG level, and only for a sample of requests.
+"""
+
+import os
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from typing import Any, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# "text" or "json" (one JSON object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Fraction of requests whose payloads are logged at DEBUG
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+# Correlation ID of the request being handled in this task
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Whether this request's payloads are logged (decided once per request)
+payload_sampled_var: ContextVar[bool] = ContextVar("payload_sampled", default=False)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def start_request(request_id: Optional[str] = None, sample_rate: Optional[float] = None) -> str:
+    """
+    Bind a correlation ID (and the payload sampling decision) to the current context.
+    """
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    rate = PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    payload_sampled_var.set(rate > 0 and random.random() < rate)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamp each record with the current request ID while still on the caller's task.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class LazyJson:
+    """
+    Defers ``json.dumps`` of a payload until the log record is actually formatted.
+    """
+
+    def __init__(self, payload: Any, limit: int = 2000):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = json.dumps(self.payload, default=str)
+        return text if len(text) <= self.limit else f"{text[:self.limit]}... ({len(text)} chars)"
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, limit: int = 2000) -> None:
+    """
+    Log a payload at DEBUG for sampled requests; costs one check otherwise.
+    """
+    if payload_sampled_var.get() and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", message, LazyJson(payload, limit))
+
+
+def configure_logging(level: str = "INFO", fmt: Optional[str] = None) -> None:
+    """
+    Route the root logger through a queue to a background writer thread.
+
+    Safe to call more than once; later calls only change the level.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if (fmt or LOG_FORMAT) == "json" else logging.Formatter(TEXT_FORMAT)
+    output = logging.StreamHandler()
+    output.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """
+    Flush queued records and stop the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
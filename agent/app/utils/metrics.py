@@ -0,0 +1,345 @@
+"""
+Minimal Prometheus metrics registry.
+
+Implements counters, gauges and histograms with labels and renders them in
+the Prometheus text exposition format, without an extra dependency.
+
+With several worker processes each keeps its own registry. ``snapshot``
+exports one for the others, and ``render_merged`` renders the whole
+machine: counters and histograms summed over all workers (including ones
+that have exited, so totals never go backwards), and gauges per live
+worker with a ``worker`` label.
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; covers fast cache hits up to long generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merged(self, snapshots: Dict[str, List[Any]], live: Iterable[str]) -> "_Metric":
+        """
+        A copy holding the sum of the workers' ``snapshot()`` values.
+        """
+        metric = type(self)(self.name, self.documentation, self.labelnames)
+        for values in snapshots.values():
+            for key, value in values:
+                key = tuple(key)
+                metric._values[key] = metric._values.get(key, 0.0) + value
+        return metric
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def merged(self, snapshots: Dict[str, List[Any]], live: Iterable[str]) -> "Gauge":
+        """
+        A copy with one series per live worker; gauges of exited workers are dropped.
+        """
+        metric = Gauge(self.name, self.documentation, self.labelnames + ("worker",))
+        for worker in live:
+            for key, value in snapshots.get(worker, ()):
+                metric._values[tuple(key) + (worker,)] = value
+        return metric
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), list(counts), total, count] for key, (counts, total, count) in self._values.items()]
+
+    def merged(self, snapshots: Dict[str, List[Any]], live: Iterable[str]) -> "Histogram":
+        metric = Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+        for values in snapshots.values():
+            for key, counts, total, count in values:
+                if len(counts) != len(self.buckets) + 1:
+                    # Written with other buckets, e.g. by an older version
+                    continue
+                key = tuple(key)
+                merged_counts, merged_total, merged_count = metric._values.get(key) or ([0] * len(counts), 0.0, 0)
+                metric._values[key] = (
+                    [a + b for a, b in zip(merged_counts, counts)], merged_total + total, merged_count + count
+                )
+        return metric
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, List[Any]]:
+        """
+        Current values of every metric, JSON-serializable, for ``render_merged``.
+        """
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def render_merged(self, snapshots: Dict[str, Dict[str, List[Any]]], live: Iterable[str]) -> str:
+        """
+        Render the metrics of several workers, given each worker's ``snapshot()``
+        by worker name and the names of the workers still running.
+        """
+        live = list(live)
+        lines = []
+        for name, metric in self._metrics.items():
+            values = {worker: snapshot.get(name, []) for worker, snapshot in snapshots.items()}
+            lines.extend(metric.merged(values, live).render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and the metrics shared across modules
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "whatsbot_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "whatsbot_http_requests_in_flight", "HTTP requests currently being served", ("route",)
+)
+STAGE_LATENCY = registry.histogram(
+    "whatsbot_stage_duration_seconds",
+    "Latency of internal stages (model_check, generate, generate_stream, slack_post, ...)",
+    ("stage",)
+)
+UPSTREAM_REQUESTS = registry.counter(
+    "whatsbot_upstream_requests_total", "Requests sent to upstream services by outcome", ("upstream", "outcome")
+)
+UPSTREAM_RETRIES = registry.counter(
+    "whatsbot_upstream_retries_total", "Retried upstream requests", ("upstream",)
+)
+UPSTREAM_IN_FLIGHT = registry.gauge(
+    "whatsbot_upstream_in_flight", "Upstream requests currently in flight", ("upstream",)
+)
+UPSTREAM_HEDGES = registry.counter(
+    "whatsbot_upstream_hedged_requests_total",
+    "Hedged Ollama requests: fired, and which attempt answered first",
+    ("outcome",)
+)
+SLACK_DELIVERIES = registry.counter(
+    "whatsbot_slack_deliveries_total",
+    "Queued Slack deliveries by outcome (delivered, retried, rate_limited, failed, dropped)",
+    ("outcome",)
+)
+SLACK_DELIVERY_LAG = registry.histogram(
+    "whatsbot_slack_delivery_lag_seconds",
+    "Time from queueing a Slack message to its delivery",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+)
+JOBS = registry.counter(
+    "whatsbot_jobs_total", "Background jobs by type and outcome", ("kind", "outcome")
+)
+JOB_QUEUE_WAIT = registry.histogram(
+    "whatsbot_job_queue_wait_seconds",
+    "Time background jobs wait in the queue before running",
+    ("kind",),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+JOB_RUN_TIME = registry.histogram(
+    "whatsbot_job_run_seconds",
+    "Time background jobs take to run",
+    ("kind",),
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+LLM_TOKENS = registry.counter(
+    "whatsbot_llm_tokens_total", "Tokens processed by Ollama", ("kind",)
+)
+LLM_TOKENS_PER_SECOND = registry.histogram(
+    "whatsbot_llm_eval_tokens_per_second",
+    "Generation speed reported by Ollama (eval_count / eval_duration)",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+)
+LLM_PROMPT_EVAL = registry.histogram(
+    "whatsbot_llm_prompt_eval_duration_seconds", "Prompt evaluation time reported by Ollama"
+)
+LLM_EVAL = registry.histogram(
+    "whatsbot_llm_eval_duration_seconds", "Generation time reported by Ollama"
+)
+LLM_LOAD = registry.histogram(
+    "whatsbot_llm_load_duration_seconds", "Model load time reported by Ollama"
+)
+
+
+def record_ollama_timings(data: Dict) -> None:
+    """
+    Record the timing fields Ollama returns with a completed generation.
+
+    Durations are reported in nanoseconds.
+    """
+    eval_count = data.get("eval_count") or 0
+    eval_duration = data.get("eval_duration") or 0
+    prompt_eval_count = data.get("prompt_eval_count") or 0
+    if prompt_eval_count:
+        LLM_TOKENS.inc(prompt_eval_count, kind="prompt")
+    if eval_count:
+        LLM_TOKENS.inc(eval_count, kind="generated")
+    if eval_count and eval_duration:
+        LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9))
+    if data.get("prompt_eval_duration"):
+        LLM_PROMPT_EVAL.observe(data["prompt_eval_duration"] / 1e9)
+    if eval_duration:
+        LLM_EVAL.observe(eval_duration / 1e9)
+    if data.get("load_duration"):
+        LLM_LOAD.observe(data["load_duration"] / 1e9)
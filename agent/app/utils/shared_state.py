@@ -0,0 +1,550 @@
+"""
+State shared between the app's worker processes.
+
+With ``WEB_CONCURRENCY`` > 1 uvicorn runs several worker processes, each
+with its own module globals (``llama``, ``slack_client``, ...). The little
+state that has to hold across all of them lives in one local SQLite file in
+WAL mode instead:
+
+- expiring set members, so a Slack event redelivered to another worker is
+  still recognized as a duplicate
+- expiring values, e.g. the Ollama context of a Slack thread, so a
+  follow-up handled by another worker continues the conversation
+- append-only logs, e.g. the answers added to the semantic cache, which
+  each worker replays into its own in-memory index
+- token buckets, so outbound Slack messages are paced for the whole machine
+- counted leases, so the limit on concurrent Ollama generations holds for
+  the whole machine rather than per worker, and so only one worker generates
+  a given uncached prompt while the others wait for it in the response cache.
+  Waiters for a lease queue in one table, so they are served by priority
+  and then arrival no matter which worker they are in
+
+Each lease records the process holding it. Leases of a process that has
+exited are reclaimed as soon as they are in the way, and every lease also
+expires after ``lease_ttl``.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Worker processes started by app-start.sh
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def process_start_ticks(pid: int) -> Optional[int]:
+    """
+    Start time of a process in clock ticks after boot, read from /proc on Linux.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Field 22; the command name (field 2) may contain spaces, so split after it
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def boot_id() -> str:
+    """
+    ID of the current boot of the machine, or "" where it is unavailable.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def process_token(pid: Optional[int] = None) -> str:
+    """
+    Identify a process by boot, PID and start time, so a PID reused later (also
+    after a reboot, when start times repeat) is not mistaken for it.
+    """
+    pid = os.getpid() if pid is None else pid
+    ticks = process_start_ticks(pid)
+    return f"{boot_id()}:{pid}:{ticks if ticks is not None else ''}"
+
+
+def process_alive(token: str) -> bool:
+    """
+    Whether the process identified by a ``process_token`` is still running.
+    """
+    parts = token.split(":")
+    if len(parts) != 3:
+        # Written before tokens carried the boot ID
+        return False
+    boot, pid, ticks = parts
+    if boot != boot_id():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    except ValueError:
+        return False
+    return not ticks or str(process_start_ticks(int(pid))) == ticks
+
+
+class SharedState:
+    def __init__(self, db_path: str, lease_ttl: float = 600.0, poll_interval: float = 0.05):
+        self.db_path = db_path
+        self.lease_ttl = lease_ttl
+        # First delay between attempts to take a lease; doubles up to 4x
+        self.poll_interval = poll_interval
+        # Waiters poll at least every 4 * poll_interval; one silent for this long is dropped
+        self.waiter_timeout = max(5.0, poll_interval * 40)
+        self.owner = process_token()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.counters = {"lease_waits": 0, "lease_timeouts": 0, "reclaimed": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedState"]:
+        """
+        Shared state from SHARED_STATE_* environment variables, or None with a single worker.
+        """
+        default_path = ".cache/shared_state.sqlite3" if WEB_CONCURRENCY > 1 else ""
+        path = os.getenv("SHARED_STATE_PATH", default_path)
+        if not path:
+            return None
+        return cls(path, lease_ttl=float(os.getenv("SHARED_LEASE_TTL", "600")))
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is not None:
+            return self._db
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Autocommit mode; multi-statement changes use explicit transactions
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS log ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " stream TEXT NOT NULL,"
+            " owner TEXT NOT NULL,"
+            " value TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS log_stream ON log (stream, id)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT NOT NULL,"
+            " holder TEXT NOT NULL,"
+            " owner TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (name, holder))"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS waiters ("
+            " name TEXT NOT NULL,"
+            " holder TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " seen_at REAL NOT NULL,"
+            " PRIMARY KEY (name, holder))"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " blocked_until REAL NOT NULL)"
+        )
+        self._db = db
+        logger.info(f"Opened shared state at {self.db_path} (process {self.owner})")
+        return db
+
+    # Expiring sets
+
+    def _add(self, namespace: str, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            # Inserts a new member or takes over an expired one, atomically
+            added = db.execute(
+                "INSERT INTO members (namespace, key, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (namespace, key) DO UPDATE SET expires_at = excluded.expires_at"
+                " WHERE members.expires_at <= ?",
+                (namespace, key, now + ttl, now)
+            ).rowcount
+            if added:
+                db.execute("DELETE FROM members WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+        return bool(added)
+
+    def _discard(self, namespace: str, key: str) -> None:
+        with self._db_lock:
+            self._connect().execute("DELETE FROM members WHERE namespace = ? AND key = ?", (namespace, key))
+
+    async def add(self, namespace: str, key: str, ttl: float) -> bool:
+        """
+        Add a member for all workers. Returns False if it was already present and unexpired.
+        """
+        return await asyncio.to_thread(self._add, namespace, key, ttl)
+
+    async def discard(self, namespace: str, key: str) -> None:
+        await asyncio.to_thread(self._discard, namespace, key)
+
+    # Expiring values
+
+    def _get_value(self, namespace: str, key: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_value(self, namespace: str, key: str, value: Optional[str], ttl: float, max_entries: int) -> None:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if value is None:
+                    db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                else:
+                    db.execute(
+                        "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (namespace, key, value, now + ttl)
+                    )
+                db.execute("DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+                # Every write renews the TTL, so the soonest to expire are the least recently written
+                db.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key NOT IN ("
+                    " SELECT key FROM entries WHERE namespace = ? ORDER BY expires_at DESC LIMIT ?)",
+                    (namespace, namespace, max_entries)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def _values(self, namespace: str) -> Dict[str, str]:
+        with self._db_lock:
+            return dict(self._connect().execute(
+                "SELECT key, value FROM entries WHERE namespace = ? AND expires_at > ?", (namespace, time.time())
+            ).fetchall())
+
+    async def values(self, namespace: str) -> Dict[str, str]:
+        """
+        All unexpired values of a namespace, by key.
+        """
+        return await asyncio.to_thread(self._values, namespace)
+
+    async def get_value(self, namespace: str, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get_value, namespace, key)
+
+    async def set_value(self, namespace: str, key: str, value: Optional[str], ttl: float, max_entries: int) -> None:
+        """
+        Store a value for all workers for ``ttl`` seconds (None deletes it),
+        keeping at most ``max_entries`` in the namespace.
+        """
+        await asyncio.to_thread(self._set_value, namespace, key, value, ttl, max_entries)
+
+    # Append-only logs
+
+    def _append(self, stream: str, value: str, max_entries: int) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("INSERT INTO log (stream, owner, value) VALUES (?, ?, ?)", (stream, self.owner, value))
+                # Keep only the newest max_entries
+                db.execute(
+                    "DELETE FROM log WHERE stream = ? AND id <= ("
+                    " SELECT id FROM log WHERE stream = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (stream, stream, max_entries)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def _read(self, stream: str, after: int, limit: int) -> List[Tuple[int, str, str]]:
+        with self._db_lock:
+            return self._connect().execute(
+                "SELECT id, owner, value FROM log WHERE stream = ? AND id > ? ORDER BY id LIMIT ?",
+                (stream, after, limit)
+            ).fetchall()
+
+    async def append(self, stream: str, value: str, max_entries: int) -> None:
+        """
+        Add an entry to a log read by all workers, keeping the newest ``max_entries``.
+        """
+        await asyncio.to_thread(self._append, stream, value, max_entries)
+
+    async def read(self, stream: str, after: int = 0, limit: int = 500) -> List[Tuple[int, str, str]]:
+        """
+        Entries of a log after the ID ``after``, oldest first, as (ID, writing process, value).
+        """
+        return await asyncio.to_thread(self._read, stream, after, limit)
+
+    # Leases
+
+    def _try_acquire(self, name: str, limit: int, waiter: Optional[Tuple[str, int, float]] = None) -> Optional[str]:
+        """
+        Take a lease if one is free. A ``waiter`` (holder ID, priority,
+        enqueue time) also joins the queue for ``name`` and only gets a lease
+        once no better-placed waiter is still waiting for it.
+        """
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            # IMMEDIATE takes the write lock up front, so the counts cannot change under us
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM leases WHERE name = ? AND expires_at <= ?", (name, now))
+                held = db.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (name,)).fetchone()[0]
+                if held >= limit:
+                    held -= self._reclaim(db, name)
+                ahead = 0
+                if waiter is not None:
+                    holder, priority, enqueued_at = waiter
+                    # A waiter that stopped polling (its process hung or exited) loses its place
+                    db.execute(
+                        "DELETE FROM waiters WHERE name = ? AND seen_at < ?", (name, now - self.waiter_timeout)
+                    )
+                    db.execute(
+                        "INSERT OR REPLACE INTO waiters (name, holder, priority, enqueued_at, seen_at)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (name, holder, priority, enqueued_at, now)
+                    )
+                    ahead = db.execute(
+                        "SELECT COUNT(*) FROM waiters WHERE name = ? AND (priority < ?"
+                        " OR (priority = ? AND (enqueued_at < ? OR (enqueued_at = ? AND holder < ?))))",
+                        (name, priority, priority, enqueued_at, enqueued_at, holder)
+                    ).fetchone()[0]
+                else:
+                    holder = uuid.uuid4().hex
+                granted = held + ahead < limit
+                if granted:
+                    db.execute(
+                        "INSERT INTO leases (name, holder, owner, expires_at) VALUES (?, ?, ?, ?)",
+                        (name, holder, self.owner, now + self.lease_ttl)
+                    )
+                    db.execute("DELETE FROM waiters WHERE name = ? AND holder = ?", (name, holder))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return holder if granted else None
+
+    def _reclaim(self, db: sqlite3.Connection, name: str) -> int:
+        """
+        Drop the leases on ``name`` held by processes that have exited.
+        """
+        owners = [row[0] for row in db.execute(
+            "SELECT DISTINCT owner FROM leases WHERE name = ? AND owner != ?", (name, self.owner)
+        )]
+        reclaimed = 0
+        for owner in owners:
+            if not process_alive(owner):
+                reclaimed += db.execute(
+                    "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)
+                ).rowcount
+        if reclaimed:
+            self.counters["reclaimed"] += reclaimed
+            logger.warning(f"Reclaimed {reclaimed} {name} leases from exited processes")
+        return reclaimed
+
+    def _release(self, name: str, holder: str) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+            db.execute("DELETE FROM waiters WHERE name = ? AND holder = ?", (name, holder))
+
+    async def _attempt(self, name: str, limit: int, waiter: Optional[Tuple[str, int, float]] = None) -> Optional[str]:
+        attempt = asyncio.ensure_future(asyncio.to_thread(self._try_acquire, name, limit, waiter))
+        try:
+            return await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            # The query still finishes in its thread; give back what it took
+            attempt.add_done_callback(lambda done: self._release_abandoned(name, done))
+            raise
+
+    def _release_abandoned(self, name: str, attempt: asyncio.Future) -> None:
+        if not attempt.cancelled() and attempt.exception() is None and attempt.result() is not None:
+            asyncio.ensure_future(self.release(name, attempt.result()))
+
+    async def try_acquire(self, name: str, limit: int = 1) -> Optional[str]:
+        """
+        Take one of ``limit`` leases on ``name`` without waiting; returns the holder ID or None.
+        """
+        return await self._attempt(name, limit)
+
+    async def acquire(self, name: str, limit: int, timeout: float, priority: int = 0) -> Optional[str]:
+        """
+        Wait up to ``timeout`` seconds for a lease, in order of priority (lower
+        first) and then arrival, across all worker processes.
+
+        Returns the holder ID to release, or None if no lease freed up in time.
+        """
+        holder = uuid.uuid4().hex
+        waiter = (holder, priority, time.time())
+        deadline = time.monotonic() + timeout
+        delay = self.poll_interval
+        granted = None
+        try:
+            while True:
+                granted = await self._attempt(name, limit, waiter)
+                if granted is not None:
+                    return granted
+                if delay == self.poll_interval:
+                    self.counters["lease_waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["lease_timeouts"] += 1
+                    return None
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.poll_interval * 4)
+        finally:
+            if granted is None:
+                # Leave the queue; also drops a lease a cancelled attempt may still take
+                await asyncio.shield(self.release(name, holder))
+
+    async def release(self, name: str, holder: str) -> None:
+        await asyncio.to_thread(self._release, name, holder)
+
+    # Token buckets
+
+    def _take_token(self, name: str, rate: float, burst: float, pause: float = 0.0) -> float:
+        """
+        Take a token from the bucket ``name``, or with ``pause`` > 0 empty it and
+        block it for that many seconds instead. Returns 0 if a token was taken,
+        otherwise how long to wait before trying again.
+        """
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT tokens, updated, blocked_until FROM buckets WHERE name = ?", (name,)).fetchone()
+                tokens, updated, blocked_until = row if row is not None else (burst, now, 0.0)
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+                if pause > 0:
+                    tokens = min(tokens, 0.0)
+                    blocked_until = max(blocked_until, now + pause)
+                    wait = pause
+                elif now >= blocked_until and tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = max(blocked_until - now, (1 - tokens) / rate)
+                db.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated, blocked_until) VALUES (?, ?, ?, ?)",
+                    (name, tokens, now, blocked_until)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return wait
+
+    async def take_token(self, name: str, rate: float, burst: float) -> float:
+        return await asyncio.to_thread(self._take_token, name, rate, burst)
+
+    async def pause_bucket(self, name: str, rate: float, burst: float, seconds: float) -> None:
+        await asyncio.to_thread(self._take_token, name, rate, burst, seconds)
+
+    def close(self) -> None:
+        """
+        Give up this process's leases and close the database.
+        """
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db_lock:
+            db = self._connect()
+            leases = dict(db.execute(
+                "SELECT CASE WHEN name LIKE 'generate:%' THEN 'generate' ELSE name END, COUNT(*)"
+                " FROM leases WHERE expires_at > ? GROUP BY 1", (time.time(),)
+            ).fetchall())
+            members = dict(db.execute(
+                "SELECT namespace, COUNT(*) FROM members GROUP BY namespace"
+            ).fetchall())
+            waiting = dict(db.execute("SELECT name, COUNT(*) FROM waiters GROUP BY name").fetchall())
+            entries = dict(db.execute(
+                "SELECT namespace, COUNT(*) FROM entries WHERE expires_at > ? GROUP BY namespace", (time.time(),)
+            ).fetchall())
+        return {
+            "enabled": True,
+            "path": self.db_path,
+            "process": self.owner,
+            "leases": leases,
+            "waiting": waiting,
+            "members": members,
+            "entries": entries,
+            **self.counters,
+        }
+
+
+class SharedSemaphore:
+    """
+    A limit on concurrent holders across all worker processes.
+    """
+
+    def __init__(self, state: SharedState, name: str, limit: int):
+        self.state = state
+        self.name = name
+        self.limit = limit
+
+    async def acquire(self, timeout: float, priority: int = 0) -> Optional[str]:
+        return await self.state.acquire(self.name, self.limit, timeout, priority)
+
+    async def release(self, holder: str) -> None:
+        await self.state.release(self.name, holder)
+
+
+class SharedTokenBucket:
+    """
+    A rate limit of ``rate`` calls per second, with bursts of up to ``burst``,
+    across all worker processes.
+    """
+
+    def __init__(self, state: SharedState, name: str, rate: float, burst: float):
+        self.state = state
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    async def pause(self, seconds: float) -> None:
+        await self.state.pause_bucket(self.name, self.rate, self.burst, seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            wait = await self.state.take_token(self.name, self.rate, self.burst)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+# Process-wide shared state; None when running a single worker
+shared_state = SharedState.from_env()
@@ -0,0 +1,64 @@
+"""
+Request coalescing: concurrent calls with the same key share one execution.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one in-flight call per key.
+
+    Callers that arrive while a call is running await the same task. A caller
+    that is cancelled only stops waiting; the shared call is cancelled once
+    no caller is left waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.counters = {"executed": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, key=key, call=call: self._finish(key, call, task))
+            self.counters["executed"] += 1
+        else:
+            self.counters["coalesced"] += 1
+            logger.debug(f"Coalescing request onto in-flight call ({call.waiters} waiting)")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Last interested caller went away; stop the shared work
+                call.task.cancel()
+                self.counters["abandoned"] += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _finish(self, key: Hashable, call: _Call, task: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every caller left
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "in_flight": len(self._calls)}
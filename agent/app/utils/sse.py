@@ -0,0 +1,56 @@
+"""
+Server-Sent Events helpers for streaming LLM output to HTTP clients.
+"""
+
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, Optional
+
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Encode one SSE frame.
+    """
+    frame = f"event: {event}\n" if event else ""
+    return f"{frame}data: {json.dumps(data)}\n\n"
+
+
+async def token_events(
+    tokens: AsyncIterator[str],
+    on_complete: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None
+) -> AsyncIterator[str]:
+    """
+    Turn a token stream into SSE frames.
+
+    Each token is sent as a ``data`` frame; the stream ends with a ``done``
+    event carrying whatever ``on_complete`` returns for the full text, or an
+    ``error`` event if generation fails part way.
+    """
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield format_event({"token": token})
+        text = "".join(parts)
+        result = await on_complete(text) if on_complete else {"text": text}
+        yield format_event(result, event="done")
+    except Exception as e:
+        logger.error(f"Streaming failed: {str(e)}")
+        yield format_event({"error": str(e)}, event="error")
+
+
+def sse_response(events: AsyncIterator[str], background: Optional[BackgroundTask] = None) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering
+        },
+        background=background
+    )
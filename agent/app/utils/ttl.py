@@ -0,0 +1,46 @@
+"""
+Bounded set whose members expire after a TTL.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TTLSet:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def _expire(self, now: float) -> None:
+        # Items are kept in insertion order, so expired ones are at the front
+        while self._items:
+            key, expires_at = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            self._items.popitem(last=False)
+
+    def add(self, key: Hashable) -> bool:
+        """
+        Add a member. Returns False if it was already present and unexpired.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._items:
+            return False
+        self._items[key] = now + self.ttl
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        self._expire(time.monotonic())
+        return key in self._items
+
+    def __len__(self) -> int:
+        self._expire(time.monotonic())
+        return len(self._items)
@@ -0,0 +1,93 @@
+"""
+In-process worker pool for handling work off the request path.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .logs import current_request_id, request_id_var
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = 4,
+        queue_size: int = 100
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.counters = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} {self.name} workers (queue size {self.queue_size})")
+
+    async def stop(self) -> None:
+        """
+        Cancel the workers; queued items that have not started are dropped.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._queue is not None and not self._queue.empty():
+            logger.warning(f"Dropping {self._queue.qsize()} queued {self.name} items on shutdown")
+        self._queue = None
+
+    def submit(self, item: Any) -> bool:
+        """
+        Queue an item without waiting. Returns False if the queue is full.
+        """
+        if not self.running:
+            self.start()
+        try:
+            # Keep the submitting request's ID so the worker logs under it
+            self._queue.put_nowait((item, current_request_id()))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            logger.warning(f"{self.name} queue is full, rejecting item")
+            return False
+        self.counters["submitted"] += 1
+        return True
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            item, request_id = await self._queue.get()
+            request_id_var.set(request_id)
+            try:
+                await self.handler(item)
+                self.counters["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error(f"{self.name} worker {index} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "workers": len(self._tasks),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+        }
@@ -0,0 +1,3 @@
+"""
+Offline benchmark harness for WhatsBot
+"""
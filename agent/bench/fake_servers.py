@@ -0,0 +1,156 @@
+"""
+Stand-in Ollama and Slack servers for offline benchmarking.
+
+Both servers simulate latency with asyncio sleeps, so they use no GPU and
+handle many concurrent requests. All randomness comes from a seeded RNG to
+keep runs comparable.
+"""
+
+import json
+import time
+import zlib
+import random
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeOllamaConfig:
+    model: str = "llama3:latest"
+    # Time before the first token, plus prompt evaluation per 1000 characters
+    base_latency: float = 0.05
+    prompt_latency_per_kchar: float = 0.02
+    # Generation speed and length
+    tokens_per_second: float = 200.0
+    response_tokens: int = 48
+    # Fraction of generate calls that fail with a 500
+    error_rate: float = 0.0
+    # Number of generations served at once, like OLLAMA_NUM_PARALLEL
+    parallel: int = 4
+    seed: int = 1234
+
+
+@dataclass
+class FakeSlackConfig:
+    latency: float = 0.03
+    error_rate: float = 0.0
+    # Fraction of calls answered with 429 and Retry-After
+    rate_limit_rate: float = 0.0
+    seed: int = 4321
+    stats: Dict[str, Any] = field(default_factory=lambda: {"postMessage": 0, "update": 0, "errors": 0, "rate_limited": 0})
+
+
+def _eval_fields(prompt: str, tokens: int, started: float, first_token_at: float) -> Dict[str, Any]:
+    now = time.perf_counter()
+    return {
+        "done": True,
+        "prompt_eval_count": max(1, len(prompt) // 4),
+        "prompt_eval_duration": int((first_token_at - started) * 1e9),
+        "eval_count": tokens,
+        "eval_duration": int((now - first_token_at) * 1e9),
+        "total_duration": int((now - started) * 1e9),
+        "context": list(range(min(tokens + len(prompt) // 4, 256))),
+    }
+
+
+def create_fake_ollama(config: FakeOllamaConfig) -> FastAPI:
+    app = FastAPI(title="fake-ollama")
+    rng = random.Random(config.seed)
+    slots = asyncio.Semaphore(config.parallel)
+    stats = {"generate": 0, "stream": 0, "tags": 0, "embeddings": 0, "errors": 0}
+    app.state.stats = stats
+
+    def options(body: Dict[str, Any]) -> Dict[str, Any]:
+        return {**body, **(body.get("options") or {})}
+
+    def token_count(body: Dict[str, Any]) -> int:
+        return max(1, min(config.response_tokens, int(options(body).get("num_predict") or config.response_tokens)))
+
+    def prompt_delay(prompt: str) -> float:
+        return config.base_latency + config.prompt_latency_per_kchar * len(prompt) / 1000
+
+    @app.get("/api/tags")
+    async def tags():
+        stats["tags"] += 1
+        return {"models": [{"name": config.model, "model": config.model}]}
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["embeddings"] += 1
+        await asyncio.sleep(config.base_latency / 2)
+        # Deterministic pseudo-embedding from the prompt's words
+        vector = [0.0] * 64
+        for word in str(body.get("prompt", "")).lower().split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return {"embedding": vector}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        tokens = token_count(body)
+        per_token = 1.0 / config.tokens_per_second
+
+        if not body.get("stream", True):
+            stats["generate"] += 1
+            async with slots:
+                started = time.perf_counter()
+                await asyncio.sleep(prompt_delay(prompt))
+                first_token_at = time.perf_counter()
+                await asyncio.sleep(per_token * tokens)
+                words = " ".join(f"word{i}" for i in range(tokens))
+                return {"model": config.model, "response": words, **_eval_fields(prompt, tokens, started, first_token_at)}
+
+        stats["stream"] += 1
+
+        async def chunks():
+            async with slots:
+                started = time.perf_counter()
+                await asyncio.sleep(prompt_delay(prompt))
+                first_token_at = time.perf_counter()
+                for i in range(tokens):
+                    await asyncio.sleep(per_token)
+                    yield json.dumps({"model": config.model, "response": f"word{i} ", "done": False}) + "\n"
+                yield json.dumps({"model": config.model, "response": "", **_eval_fields(prompt, tokens, started, first_token_at)}) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+def create_fake_slack(config: FakeSlackConfig) -> FastAPI:
+    app = FastAPI(title="fake-slack")
+    rng = random.Random(config.seed)
+    counter = itertools.count(1)
+    app.state.stats = config.stats
+
+    async def respond(kind: str, body: Dict[str, Any]):
+        await asyncio.sleep(config.latency)
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            config.stats["rate_limited"] += 1
+            return JSONResponse({"ok": False, "error": "ratelimited"}, status_code=429, headers={"Retry-After": "1"})
+        if roll < config.rate_limit_rate + config.error_rate:
+            config.stats["errors"] += 1
+            return {"ok": False, "error": "internal_error"}
+        config.stats[kind] += 1
+        return {"ok": True, "channel": body.get("channel"), "ts": body.get("ts") or f"{time.time():.0f}.{next(counter):06d}"}
+
+    @app.post("/api/chat.postMessage")
+    async def post_message(request: Request):
+        return await respond("postMessage", await request.json())
+
+    @app.post("/api/chat.update")
+    async def update(request: Request):
+        return await respond("update", await request.json())
+
+    return app
@@ -0,0 +1,332 @@
+"""
+Load test WhatsBot against stand-in Ollama and Slack servers.
+
+Starts the fake servers in-process, runs ``app.main:app`` under uvicorn in a
+subprocess pointed at them, drives a seeded mix of /summarize,
+/questions/ask and /slack/events traffic, and reports throughput and
+latency percentiles per route.
+
+Usage:
+    python -m bench.loadtest --requests 400 --concurrency 16
+    python -m bench.loadtest --output bench/results/current.json --compare bench/results/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+
+from .fake_servers import FakeOllamaConfig, FakeSlackConfig, create_fake_ollama, create_fake_slack
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "team offsite hiking museum concert budget schedule weekend dinner workshop "
+    "planning venue travel tickets weather morning afternoon evening outdoor indoor"
+).split()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        weights.append((name.strip(), float(weight)))
+    return weights
+
+
+class Workload:
+    """
+    Seeded generator of requests. ``repeat_ratio`` controls how often a
+    request reuses an earlier text, which exercises caching and coalescing.
+    """
+
+    def __init__(self, seed: int, mix: List[Tuple[str, float]], repeat_ratio: float, doc_words: int):
+        self.rng = random.Random(seed)
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.repeat_ratio = repeat_ratio
+        self.doc_words = doc_words
+        self.seen: List[str] = []
+        self.event_seq = 0
+
+    def _text(self, words: int) -> str:
+        if self.seen and self.rng.random() < self.repeat_ratio:
+            return self.rng.choice(self.seen)
+        text = " ".join(self.rng.choice(WORDS) for _ in range(words)) + "."
+        self.seen.append(text)
+        return text
+
+    def next(self) -> Tuple[str, str, Dict[str, Any]]:
+        kind = self.rng.choices(self.names, self.weights)[0]
+        if kind == "summarize":
+            return kind, "/api/v1/summarize", {"text": self._text(self.doc_words)}
+        if kind == "ask":
+            return kind, "/api/v1/questions/ask", {"question": self._text(12) + "?", "format": "concise"}
+        if kind == "slack":
+            self.event_seq += 1
+            return kind, "/api/v1/slack/events", {
+                "type": "event_callback",
+                "event_id": f"Ev{self.event_seq:08d}",
+                "event": {
+                    "type": "app_mention",
+                    "text": "<@UBOT> " + self._text(10) + "?",
+                    "channel": "CBENCH",
+                    "ts": f"{1700000000 + self.event_seq}.000100",
+                },
+            }
+        raise ValueError(f"Unknown request kind: {kind}")
+
+
+async def _serve(app, port: int) -> Tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def _start_app(port: int, ollama_port: int, slack_port: int, workers: int, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OLLAMA_API_URL": f"http://127.0.0.1:{ollama_port}",
+        "OLLAMA_MODEL": "llama3",
+        "SLACK_API_URL": f"http://127.0.0.1:{slack_port}/api",
+        "SLACK_BOT_TOKEN": "xoxb-bench",
+        # Start from a cold, non-persistent cache so runs are comparable
+        "RESPONSE_CACHE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+        **extra_env,
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=AGENT_DIR, env=env)
+
+
+async def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"App did not become ready within {timeout}s")
+
+
+async def _drive(base_url: str, workload: Workload, total: int, concurrency: int) -> Tuple[Dict[str, List[float]], Dict[str, Dict[str, int]], float]:
+    requests = [workload.next() for _ in range(total)]
+    latencies: Dict[str, List[float]] = {}
+    outcomes: Dict[str, Dict[str, int]] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+
+        async def worker():
+            while not queue.empty():
+                kind, path, body = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                latencies.setdefault(kind, []).append(elapsed)
+                counts = outcomes.setdefault(kind, {})
+                counts[status] = counts.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, outcomes, wall
+
+
+def _report(latencies: Dict[str, List[float]], outcomes: Dict[str, Dict[str, int]], wall: float) -> Dict[str, Any]:
+    routes = {}
+    for kind, values in sorted(latencies.items()):
+        ordered = sorted(values)
+        ok = outcomes[kind].get("200", 0)
+        routes[kind] = {
+            "requests": len(values),
+            "ok": ok,
+            "errors": len(values) - ok,
+            "statuses": outcomes[kind],
+            "throughput_rps": round(len(values) / wall, 2),
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    total = sum(len(v) for v in latencies.values())
+    return {"wall_seconds": round(wall, 3), "total_requests": total, "throughput_rps": round(total / wall, 2), "routes": routes}
+
+
+def _compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> Tuple[List[str], List[str]]:
+    """
+    List regressions beyond ``tolerance`` (a fraction) versus a baseline run,
+    and warnings that make the comparison less meaningful.
+    """
+    regressions, warnings = [], []
+    if baseline.get("config") != current.get("config"):
+        warnings.append("benchmark configuration differs from the baseline")
+    for kind, stats in current["results"]["routes"].items():
+        base = baseline["results"]["routes"].get(kind)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if base[key] and stats[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{kind} {key}: {base[key]} -> {stats[key]}")
+        if base["throughput_rps"] and stats["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{kind} throughput_rps: {base['throughput_rps']} -> {stats['throughput_rps']}")
+        if stats["errors"] > base["errors"]:
+            regressions.append(f"{kind} errors: {base['errors']} -> {stats['errors']}")
+    return regressions, warnings
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    ollama_config = FakeOllamaConfig(
+        base_latency=args.ollama_latency,
+        tokens_per_second=args.token_rate,
+        response_tokens=args.response_tokens,
+        error_rate=args.ollama_error_rate,
+        parallel=args.ollama_parallel,
+        seed=args.seed,
+    )
+    slack_config = FakeSlackConfig(
+        latency=args.slack_latency,
+        error_rate=args.slack_error_rate,
+        rate_limit_rate=args.slack_rate_limit_rate,
+        seed=args.seed,
+    )
+    fake_ollama = create_fake_ollama(ollama_config)
+    fake_slack = create_fake_slack(slack_config)
+    ollama_port, slack_port, app_port = _free_port(), _free_port(), _free_port()
+
+    ollama_server, ollama_task = await _serve(fake_ollama, ollama_port)
+    slack_server, slack_task = await _serve(fake_slack, slack_port)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    process = _start_app(app_port, ollama_port, slack_port, args.workers, extra_env)
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        await _wait_ready(base_url)
+        workload = Workload(args.seed, _parse_mix(args.mix), args.repeat_ratio, args.doc_words)
+        if args.warmup:
+            await _drive(base_url, Workload(args.seed + 1, _parse_mix(args.mix), 0.0, args.doc_words), args.warmup, args.concurrency)
+        latencies, outcomes, wall = await _drive(base_url, workload, args.requests, args.concurrency)
+        # Give acknowledged Slack events time to finish in the background
+        await asyncio.sleep(args.drain)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        for server in (ollama_server, slack_server):
+            server.should_exit = True
+        await asyncio.gather(ollama_task, slack_task, return_exceptions=True)
+
+    config = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "compare", "tolerance", "drain")
+    }
+    return {
+        "config": config,
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": _report(latencies, outcomes, wall),
+        "upstreams": {"ollama": fake_ollama.state.stats, "slack": fake_slack.state.stats},
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests sent first")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client connections")
+    parser.add_argument("--mix", default="summarize=0.3,ask=0.5,slack=0.2", help="Traffic mix weights")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="Fraction of requests reusing an earlier text")
+    parser.add_argument("--doc-words", type=int, default=300, help="Words per summarization document")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the app")
+    parser.add_argument("--env", action="append", default=[], help="Extra KEY=VALUE environment for the app")
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Fake tokens per second")
+    parser.add_argument("--response-tokens", type=int, default=48, help="Tokens per fake completion")
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Generations the fake Ollama serves at once")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0)
+    parser.add_argument("--slack-latency", type=float, default=0.03)
+    parser.add_argument("--slack-error-rate", type=float, default=0.0)
+    parser.add_argument("--slack-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to wait for background work after the run")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression as a fraction")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+
+    print(f"{'route':<10} {'reqs':>6} {'errors':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for kind, stats in report["results"]["routes"].items():
+        print(
+            f"{kind:<10} {stats['requests']:>6} {stats['errors']:>6} {stats['throughput_rps']:>8} "
+            f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}"
+        )
+    print(f"total: {report['results']['total_requests']} requests in {report['results']['wall_seconds']}s "
+          f"({report['results']['throughput_rps']} rps)")
+    print(f"upstream calls: {json.dumps(report['upstreams'])}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions, warnings = _compare(report, baseline, args.tolerance)
+        for line in warnings:
+            print(f"warning: {line}")
+        if regressions:
+            print("Regressions versus baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions versus baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark the schedule optimizer against catalog size.
+
+Generates seeded synthetic catalogs and reports, per size, the solve time
+and the total weight of the chosen schedule for two scenarios:
+
+    fixed    every activity has a fixed start at one location, solved exactly
+             with weighted interval scheduling
+    general  time windows, several locations with travel time and a time
+             budget, solved with the heuristic (greedy-only weight shown for
+             comparison)
+
+Usage:
+    python -m bench.schedule_bench --sizes 100,1000,5000 --time-limit 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.plugins.schedule_optimizer import ScheduleOptimizer
+
+DAY_START = datetime(2025, 6, 1, 8, 0)
+LOCATIONS = ["hotel", "old town", "museum district", "harbour", "park", "market", "stadium", "beach"]
+
+
+def _catalog(size: int, scenario: str, rng: random.Random, day_minutes: int) -> List[Dict[str, Any]]:
+    activities = []
+    for i in range(size):
+        duration = rng.randint(20, 120)
+        opens = DAY_START + timedelta(minutes=rng.randint(0, day_minutes - duration))
+        activity = {
+            "id": i,
+            "duration": duration,
+            "priority": rng.randint(1, 5),
+            "confidence": round(rng.uniform(0.3, 1.0), 2),
+        }
+        if scenario == "fixed":
+            activity.update({"recommended_time": opens, "location": "venue"})
+        else:
+            activity.update({
+                "earliest_start": opens,
+                "latest_end": opens + timedelta(minutes=duration + rng.randint(0, 180)),
+                "location": rng.choice(LOCATIONS),
+            })
+        activities.append(activity)
+    return activities
+
+
+def _weight(schedule: List[Dict[str, Any]]) -> float:
+    return round(sum(a["priority"] * a["confidence"] for a in schedule), 2)
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    rows = []
+    for size in args.sizes:
+        for scenario in ("fixed", "general"):
+            catalog = _catalog(size, scenario, random.Random(args.seed + size), args.day_minutes)
+            budget = None if scenario == "fixed" else args.budget_minutes
+            optimizer = ScheduleOptimizer(time_limit=args.time_limit, seed=args.seed)
+            started = time.perf_counter()
+            schedule = optimizer.optimize(catalog, start=DAY_START, budget_minutes=budget)
+            elapsed = time.perf_counter() - started
+            row = {
+                "size": size,
+                "scenario": scenario,
+                "method": optimizer.last_method,
+                "seconds": round(elapsed, 4),
+                "scheduled": len(schedule),
+                "weight": _weight(schedule),
+            }
+            if scenario == "general":
+                greedy = ScheduleOptimizer(time_limit=0, seed=args.seed)
+                started = time.perf_counter()
+                row["greedy_weight"] = _weight(greedy.optimize(catalog, start=DAY_START, budget_minutes=budget))
+                row["greedy_seconds"] = round(time.perf_counter() - started, 4)
+            rows.append(row)
+    return rows
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--sizes", type=lambda value: [int(v) for v in value.split(",")], default=[100, 500, 1000, 2500, 5000],
+        help="Comma-separated catalog sizes"
+    )
+    parser.add_argument("--time-limit", type=float, default=0.5, help="Heuristic improvement time per solve")
+    parser.add_argument("--budget-minutes", type=float, default=600, help="Time budget for the general scenario")
+    parser.add_argument("--day-minutes", type=int, default=720, help="Span over which activities are spread")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    rows = run(args)
+
+    print(f"{'size':>6} {'scenario':<8} {'method':<20} {'seconds':>8} {'chosen':>6} {'weight':>8} {'greedy':>8}")
+    for row in rows:
+        print(
+            f"{row['size']:>6} {row['scenario']:<8} {row['method']:<20} {row['seconds']:>8} "
+            f"{row['scheduled']:>6} {row['weight']:>8} {row.get('greedy_weight', ''):>8}"
+        )
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"time_limit": args.time_limit, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,42 +4,41 @@
 echo "Starting WhatsBot Application"
 echo "==========================="
 
-# Print system information
-echo -e "\nSystem Information:"
-echo "=================="
-echo -e "\nNetwork Interfaces:"
-ip addr show
+# Diagnostics and connectivity probes add seconds to every cold start, so
+# they only run when asked for; readiness is reported by GET /ready instead
+if [ "${STARTUP_CHECKS:-false}" = "true" ]; then
+    OLLAMA_CHECK_URL="${OLLAMA_API_URL:-https://3vsrtr8cbw2o8t-11434.proxy.runpod.net}"
 
-echo -e "\nListening Ports:"
-netstat -tulpn
+    # Print system information
+    echo -e "\nSystem Information:"
+    echo "=================="
+    echo -e "\nNetwork Interfaces:"
+    ip addr show
 
-# Check Ollama connectivity
-echo -e "\nChecking Ollama connectivity:"
-for i in {1..5}; do
-    if nc -z 3vsrtr8cbw2o8t-11434.proxy.runpod.net 443; then
-        echo "✅ Successfully connected to Ollama service"
-        break
-    fi
-    if [ $i -eq 5 ]; then
-        echo "❌ Failed to connect to Ollama service after 5 attempts"
-        echo "Please check if the Ollama service is running and network configuration is correct"
-        exit 1
-    fi
-    echo "Attempt $i: Waiting for Ollama service to become available..."
-    sleep 5
-done
+    echo -e "\nListening Ports:"
+    netstat -tulpn
 
-# Test Ollama API
-echo -e "\nTesting Ollama API:"
-curl -s "https://3vsrtr8cbw2o8t-11434.proxy.runpod.net/api/tags" > /dev/null
-if [ $? -eq 0 ]; then
-    echo "✅ Ollama API is responding"
-else
-    echo "❌ Ollama API is not responding"
-    echo "Please check if the Ollama service is running correctly"
-    exit 1
+    # Check Ollama API
+    echo -e "\nChecking Ollama API at $OLLAMA_CHECK_URL:"
+    for i in {1..5}; do
+        if curl -sf --max-time 5 "$OLLAMA_CHECK_URL/api/tags" > /dev/null; then
+            echo "✅ Ollama API is responding"
+            break
+        fi
+        if [ $i -eq 5 ]; then
+            echo "❌ Ollama API is not responding after 5 attempts"
+            echo "Please check if the Ollama service is running and network configuration is correct"
+            exit 1
+        fi
+        echo "Attempt $i: Waiting for Ollama service to become available..."
+        sleep 5
+    done
 fi
 
-echo -e "\nStarting FastAPI application..."
+# One worker process per WEB_CONCURRENCY; state that must hold across them
+# (event dedupe, Ollama slots, in-flight generations) lives in SHARED_STATE_PATH
+WORKERS="${WEB_CONCURRENCY:-1}"
+
+echo -e "\nStarting FastAPI application with $WORKERS worker(s)..."
 # Start the FastAPI application
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000 
\ No newline at end of file
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
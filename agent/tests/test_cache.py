@@ -0,0 +1,38 @@
+import asyncio
+
+from app.cache import ResponseCache
+
+
+def test_disk_tier_keeps_running_totals_and_evicts_least_recently_used(tmp_path):
+    async def scenario():
+        cache = ResponseCache(db_path=str(tmp_path / "responses.sqlite3"), max_entries=1, max_disk_bytes=350)
+        for key in ("a", "b", "c"):
+            await cache.set(key, "x" * 100)
+        # Read "a" from disk so that "b" is the least recently used
+        cache.access_batch = 1
+        assert await cache.get("a") == "x" * 100
+        await cache.set("d", "x" * 100)
+
+        disk = (await cache.stats())["disk"]
+        assert disk["bytes"] <= 350
+        with cache._db_lock:
+            keys = {row[0] for row in cache._db.execute("SELECT key FROM responses")}
+            assert disk["bytes"] == cache._db.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+        assert keys == {"a", "c", "d"}
+        assert disk["entries"] == 3
+        cache.close()
+
+    asyncio.run(scenario())
+
+
+def test_disk_hits_batch_last_access_updates(tmp_path):
+    async def scenario():
+        cache = ResponseCache(db_path=str(tmp_path / "responses.sqlite3"), max_entries=1)
+        await cache.set("a", "first")
+        await cache.set("b", "second")
+        assert await cache.get("a") == "first"
+        assert set(cache._pending_access) == {"a"}
+        cache.close()
+        assert cache._pending_access == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from app.jobs import CANCELED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+from app.utils.shared_state import process_token
+
+
+async def _wait_for_status(queue: JobQueue, job_id: str, status: str, timeout: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while (await queue.get(job_id))["status"] != status:
+        assert loop.time() < deadline, f"job {job_id} never became {status}"
+        await asyncio.sleep(0.01)
+
+
+def _queue(tmp_path, started: asyncio.Event = None) -> JobQueue:
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), concurrency=1, poll_interval=0.05)
+
+    async def slow(payload):
+        if started is not None:
+            started.set()
+        await asyncio.sleep(3600)
+
+    async def fast(payload):
+        return {"echo": payload}
+
+    queue.register("slow", slow)
+    queue.register("fast", fast)
+    return queue
+
+
+def test_stop_requeues_running_job(tmp_path):
+    async def scenario():
+        started = asyncio.Event()
+        queue = _queue(tmp_path, started)
+        await queue.start()
+        job_id = await queue.submit("slow", {})
+        await asyncio.wait_for(started.wait(), timeout=5)
+        assert (await queue.get(job_id))["status"] == RUNNING
+
+        await asyncio.wait_for(queue.stop(), timeout=5)
+
+        restarted = _queue(tmp_path)
+        assert (await restarted.get(job_id))["status"] == QUEUED
+
+    asyncio.run(scenario())
+
+
+def test_cancel_running_job_keeps_worker_running(tmp_path):
+    async def scenario():
+        started = asyncio.Event()
+        queue = _queue(tmp_path, started)
+        await queue.start()
+        try:
+            slow_id = await queue.submit("slow", {})
+            await asyncio.wait_for(started.wait(), timeout=5)
+            assert (await queue.cancel(slow_id))["status"] == CANCELED
+
+            fast_id = await queue.submit("fast", {"n": 1})
+            await _wait_for_status(queue, fast_id, SUCCEEDED)
+            assert (await queue.get(fast_id))["result"] == {"echo": {"n": 1}}
+            assert (await queue.get(slow_id))["status"] == CANCELED
+        finally:
+            await asyncio.wait_for(queue.stop(), timeout=5)
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_holds_across_processes(tmp_path):
+    async def scenario():
+        started = asyncio.Event()
+        # Two worker processes sharing one jobs database
+        first, second = _queue(tmp_path, started), _queue(tmp_path)
+        second.owner = "other-process"
+        await first.start()
+        try:
+            first_id = await first.submit("slow", {})
+            await asyncio.wait_for(started.wait(), timeout=5)
+            second_id = await second.submit("slow", {})
+            await second.start()
+            await asyncio.sleep(0.3)
+            assert (await second.get(first_id))["status"] == RUNNING
+            assert (await second.get(second_id))["status"] == QUEUED
+        finally:
+            await asyncio.wait_for(second.stop(), timeout=5)
+            await asyncio.wait_for(first.stop(), timeout=5)
+
+    asyncio.run(scenario())
+
+
+def test_recover_requeues_jobs_of_gone_or_silent_processes(tmp_path):
+    queue = _queue(tmp_path)
+    queue.heartbeat_timeout = 60
+    now = time.time()
+    alive = process_token(os.getppid())
+    rows = [
+        # (id, owner, heartbeat_at)
+        ("exited", "0:999999:1", now),
+        ("other-boot", f"not-this-boot:{os.getppid()}:{alive.rsplit(':', 1)[1]}", now),
+        ("legacy-token", f"{os.getppid()}:1", now),
+        ("silent", alive, now - 120),
+        ("alive", alive, now),
+        ("own", queue.owner, now - 120),
+    ]
+    with queue._db_lock:
+        db = queue._connect()
+        for job_id, owner, heartbeat_at in rows:
+            db.execute(
+                "INSERT INTO jobs (id, kind, status, payload, attempts, created_at, run_after, started_at, owner,"
+                " heartbeat_at) VALUES (?, 'fast', ?, '{}', 1, ?, ?, ?, ?, ?)",
+                (job_id, RUNNING, now, now, now, owner, heartbeat_at)
+            )
+
+    assert queue._recover() == 4
+    statuses = dict(queue._query("SELECT id, status FROM jobs"))
+    assert statuses == {
+        "exited": QUEUED, "other-boot": QUEUED, "legacy-token": QUEUED, "silent": QUEUED,
+        "alive": RUNNING, "own": RUNNING,
+    }
+
+
+def test_callback_url_must_be_a_public_http_url(tmp_path):
+    queue = _queue(tmp_path)
+
+    async def rejected(url):
+        try:
+            await queue.check_callback_url(url)
+        except ValueError:
+            return True
+        return False
+
+    async def scenario():
+        for url in (
+            "http://169.254.169.254/latest/meta-data/",
+            "http://localhost:11434/api/generate",
+            "http://10.0.0.5/hook",
+            "http://[::1]/hook",
+            "file:///etc/passwd",
+            "ftp://93.184.216.34/hook",
+        ):
+            assert await rejected(url), url
+        assert not await rejected("https://93.184.216.34/hook")
+
+        with pytest.raises(ValueError):
+            await queue.submit("fast", {}, callback_url="http://127.0.0.1:8000/hook")
+
+        queue.callback_allowed_hosts = {"hooks.internal"}
+        assert not await rejected("http://hooks.internal/done")
+        assert await rejected("https://93.184.216.34/hook")
+
+    asyncio.run(scenario())
@@ -0,0 +1,23 @@
+import asyncio
+
+from app.backends import ModelNotFoundError
+from app.llama import LlamaAPI
+
+
+def test_missing_embed_model_is_not_asked_for_again(monkeypatch):
+    client = LlamaAPI()
+    calls = []
+
+    async def make_request(endpoint, payload, **kwargs):
+        calls.append(endpoint)
+        raise ModelNotFoundError(f"model {payload['model']} not found")
+
+    monkeypatch.setattr(client, "_make_request", make_request)
+
+    async def scenario():
+        assert await client._embed("first question") is None
+        assert await client._embed("second question") is None
+
+    asyncio.run(scenario())
+    assert calls == ["api/embeddings"]
+    assert client.scheduler.counters["embed"]["admitted"] == 1
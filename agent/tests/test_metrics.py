@@ -0,0 +1,30 @@
+import json
+
+from app.utils.metrics import MetricsRegistry
+
+
+def _worker(requests: int, latency: float, in_flight: int) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests", ("route",)).inc(requests, route="/ask")
+    registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(latency)
+    registry.gauge("in_flight", "In flight").set(in_flight)
+    return registry
+
+
+def test_render_merged_sums_counters_and_labels_gauges_by_worker():
+    first, second, exited = _worker(3, 0.5, 2), _worker(4, 2.0, 1), _worker(10, 0.5, 7)
+    # Snapshots travel through the shared state as JSON
+    snapshots = {
+        name: json.loads(json.dumps(registry.snapshot()))
+        for name, registry in (("101", first), ("102", second), ("gone", exited))
+    }
+
+    lines = first.render_merged(snapshots, live=["101", "102"]).splitlines()
+
+    assert 'requests_total{route="/ask"} 17.0' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_count 3" in lines
+    assert 'in_flight{worker="101"} 2' in lines
+    assert 'in_flight{worker="102"} 1' in lines
+    assert not any('worker="gone"' in line for line in lines)
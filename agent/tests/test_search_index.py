@@ -0,0 +1,15 @@
+from app.search_index import ActivityIndex
+
+
+def test_failed_syncs_back_off_until_one_succeeds():
+    index = ActivityIndex("http://search.invalid", sync_interval=300)
+    delays = []
+    for failures in range(1, 9):
+        index._failures = failures
+        delays.append(index._next_delay())
+
+    assert 2.5 <= delays[0] <= 5
+    assert all(delay <= 300 for delay in delays)
+    assert delays[-1] >= 150
+    index._failures = 0
+    assert index._next_delay() == 300
@@ -0,0 +1,51 @@
+import json
+import time
+import asyncio
+
+import numpy as np
+
+from app.semantic_cache import SemanticCache
+from app.utils.shared_state import SharedState
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "semantic")
+    cache = SemanticCache(path=path, max_entries=4)
+    cache.add([1.0, 0.0], "what time is it?", "noon", "C1")
+    cache.add([0.0, 1.0], "where are we?", "home", "C1")
+    asyncio.run(cache.save())
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["semantic.npz"]
+    loaded = SemanticCache(path=path, max_entries=4)
+    assert loaded.lookup([0.0, 1.0], "C1") == "home"
+    assert loaded.lookup([1.0, 0.01], "C1") == "noon"
+
+
+def test_mismatched_file_is_ignored(tmp_path):
+    path = str(tmp_path / "semantic")
+    meta = {"scopes": {"C1": 0}, "answers": [["q", "a"]]}
+    np.savez(
+        f"{path}.npz", meta=np.array(json.dumps(meta)), vectors=np.eye(2, dtype=np.float32),
+        scope_ids=np.zeros(2, dtype=np.int32), created=np.full(2, time.time()), last_used=np.zeros(2)
+    )
+
+    cache = SemanticCache(path=path, max_entries=4)
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_are_shared_between_processes(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "shared.sqlite3")
+        first = SemanticCache(shared=SharedState(path), max_entries=4)
+        second = SemanticCache(shared=SharedState(path), max_entries=4)
+        # As if running in another worker process
+        second.shared.owner = "other-process"
+        await first.store([1.0, 0.0], "what time is it?", "noon", "C1")
+        await first.refresh()
+        await second.refresh()
+        assert second.lookup([1.0, 0.01], "C1") == "noon"
+        assert second.stats()["replayed"] == 1
+        # Entries a worker stored itself are not replayed again
+        assert first.stats()["entries"] == 1 and first.stats()["replayed"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import asyncio
+
+from app.utils.shared_state import SharedState
+
+
+def test_lease_waiters_are_served_by_priority_across_processes(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "shared.sqlite3")
+        # One SharedState per worker process
+        first, second = SharedState(path, poll_interval=0.01), SharedState(path, poll_interval=0.01)
+        held = await first.acquire("ollama", 1, timeout=1)
+        assert held is not None
+
+        order = []
+
+        async def wait(state, priority, name):
+            holder = await state.acquire("ollama", 1, timeout=5, priority=priority)
+            order.append(name)
+            await asyncio.sleep(0.05)
+            await state.release("ollama", holder)
+
+        batch = asyncio.ensure_future(wait(first, 3, "batch"))
+        await asyncio.sleep(0.1)
+        slack = asyncio.ensure_future(wait(second, 0, "slack"))
+        await asyncio.sleep(0.1)
+        assert (await asyncio.to_thread(first.stats))["waiting"] == {"ollama": 2}
+
+        await first.release("ollama", held)
+        await asyncio.wait_for(asyncio.gather(batch, slack), timeout=5)
+        assert order == ["slack", "batch"]
+        assert (await asyncio.to_thread(first.stats))["waiting"] == {}
+
+    asyncio.run(scenario())
+
+
+def test_lease_waiter_leaves_queue_on_timeout(tmp_path):
+    async def scenario():
+        state = SharedState(str(tmp_path / "shared.sqlite3"), poll_interval=0.01)
+        held = await state.acquire("ollama", 1, timeout=1)
+        assert await state.acquire("ollama", 1, timeout=0.1, priority=0) is None
+        await state.release("ollama", held)
+        # A timed-out waiter must not keep a lower priority request out
+        assert await state.acquire("ollama", 1, timeout=0.1, priority=3) is not None
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_is_shared_by_processes(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "shared.sqlite3")
+        first, second = SharedState(path), SharedState(path)
+        assert await first.take_token("slack", rate=1, burst=2) == 0
+        assert await second.take_token("slack", rate=1, burst=2) == 0
+        assert await first.take_token("slack", rate=1, burst=2) > 0.5
+
+        await second.pause_bucket("slack:C1", rate=1, burst=2, seconds=30)
+        assert await first.take_token("slack:C1", rate=1, burst=2) > 29
+
+    asyncio.run(scenario())
+
+
+def test_values_expire_and_keep_the_most_recent(tmp_path):
+    async def scenario():
+        state = SharedState(str(tmp_path / "shared.sqlite3"))
+        for key in ("a", "b", "c"):
+            await state.set_value("threads", key, key.upper(), ttl=60, max_entries=2)
+        await state.set_value("threads", "gone", "X", ttl=-1, max_entries=2)
+        assert [await state.get_value("threads", key) for key in ("a", "b", "c", "gone")] == [None, "B", "C", None]
+        await state.set_value("threads", "b", None, ttl=60, max_entries=2)
+        assert await state.get_value("threads", "b") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import asyncio
+
+from app.integrations import slack_events
+from app.integrations.slack import SlackAPIError, SlackRateLimitedError
+
+
+class FakeSlack:
+    def __init__(self, failures):
+        # Exceptions raised by successive progress edits (None succeeds)
+        self.failures = list(failures)
+        self.edits = []
+
+    async def post_message(self, channel, text, thread_ts=None):
+        return {"ok": True, "ts": "2.0"}
+
+    async def update_message(self, channel, ts, text):
+        self.edits.append(text)
+        if self.failures:
+            failure = self.failures.pop(0)
+            if failure is not None:
+                raise failure
+        return {"ok": True}
+
+
+class FakeLlama:
+    async def answer_question_stream(self, question, final, **kwargs):
+        for token in ("The ", "answer ", "is ", "42."):
+            await asyncio.sleep(0.01)
+            yield token
+        final["context"] = [1, 2, 3]
+
+
+def _mention(monkeypatch, slack):
+    monkeypatch.setattr(slack_events, "slack_client", slack)
+    monkeypatch.setattr(slack_events, "llama", FakeLlama())
+    monkeypatch.setattr(slack_events, "STREAM_UPDATE_INTERVAL", 0.0)
+    monkeypatch.setattr(slack_events, "shared_state", None)
+    event = {"channel": "C1", "ts": "1.0", "text": "<@U1> what is the answer?", "user": "U2"}
+    asyncio.run(slack_events.handle_app_mention(event))
+
+
+def test_failed_progress_edit_keeps_the_answer(monkeypatch):
+    slack = FakeSlack([None, SlackAPIError("message_not_found"), ConnectionError("reset")])
+    _mention(monkeypatch, slack)
+
+    assert slack.edits[-1] == "The answer is 42."
+    assert slack_events.conversations.get("C1:1.0") is not None
+
+
+def test_rate_limited_progress_edit_pauses_edits(monkeypatch):
+    slack = FakeSlack([SlackRateLimitedError("chat.update", 0.05)])
+    _mention(monkeypatch, slack)
+
+    # One rejected edit, none while paused, then the final answer
+    assert slack.edits[0] == "The  ..."
+    assert slack.edits[-1] == "The answer is 42."
+    assert len(slack.edits) < 5